@@ -0,0 +1,205 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _parse_model_limits(value: str) -> dict:
+    """'llama3.2:1b=4, llama3.2=1' -> {"llama3.2:1b": 4, "llama3.2": 1}"""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, _, limit = item.rpartition("=")
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+class AdmissionRejected(Exception):
+    """Request not admitted: status_code is 429 (user limit) or 503 (queue full / waited too long)."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def reply(self) -> str:
+        return f"⏳ Too many people are chatting right now. Please try again in {self.retry_after} seconds."
+
+
+class _ModelQueue:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        # user_id -> waiting futures; users are served round-robin
+        self.waiters = OrderedDict()
+        self.queued = 0
+
+
+class AdmissionController:
+    """
+    Admission in front of Ollama, which only generates a few replies in parallel.
+
+    - Per model, at most `limit` generations run at once (OLLAMA_MAX_CONCURRENT,
+      per-model overrides in OLLAMA_MODEL_CONCURRENCY); the rest wait in a queue.
+    - Waiting requests are served round-robin per user_id, so one client sending many
+      requests cannot hold every slot; each user may have max_per_user requests
+      waiting or running, beyond that -> 429.
+    - The queue holds max_queue requests over all models; when full -> 503. A request
+      that waited queue_timeout seconds gives up with 503. Both carry Retry-After.
+    """
+
+    def __init__(self, max_concurrent: int = 4, model_limits: dict = None, max_queue: int = 64,
+                 max_per_user: int = 4, queue_timeout: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.model_limits = model_limits or {}
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self._models = {}
+        self._per_user = {}                   # user_id -> requests waiting or running
+        self._waits = deque(maxlen=1000)      # recent queue waits (seconds)
+        self._service_time = 5.0              # moving average of generation time, for Retry-After
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_user_limit": 0,
+            "queue_timeouts": 0,
+        }
+
+    @classmethod
+    def from_env(cls, nodes: int = 1) -> "AdmissionController":
+        """OLLAMA_MAX_CONCURRENT is per Ollama node: the limit grows with the pool."""
+        return cls(
+            max_concurrent=_env_int("OLLAMA_MAX_CONCURRENT", 4) * nodes,
+            model_limits={model: limit * nodes
+                          for model, limit in _parse_model_limits(os.getenv("OLLAMA_MODEL_CONCURRENCY", "")).items()},
+            max_queue=_env_int("ADMISSION_MAX_QUEUE", 64),
+            max_per_user=_env_int("ADMISSION_MAX_PER_USER", 4),
+            queue_timeout=_env_float("ADMISSION_QUEUE_TIMEOUT", 30.0),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(q.queued for q in self._models.values())
+
+    def check(self, model: str, user_id: str):
+        """Raise AdmissionRejected right away if acquire() would be rejected now."""
+        q = self._queue(model)
+        if self._per_user.get(user_id, 0) >= self.max_per_user:
+            self.counters["rejected_user_limit"] += 1
+            raise AdmissionRejected(429, "too many requests from this user", self._retry_after(q))
+        if (q.active >= q.limit or q.waiters) and self.queue_depth >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            raise AdmissionRejected(503, "queue full", self._retry_after(q))
+
+    async def acquire(self, model: str, user_id: str):
+        """Wait for a generation slot for this model. Call release() when done."""
+        self.check(model, user_id)
+        q = self._queue(model)
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        if q.active < q.limit and not q.waiters:
+            q.active += 1
+            self._admitted(0.0)
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        q.waiters.setdefault(user_id, deque()).append(fut)
+        q.queued += 1
+        self.counters["queued"] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except BaseException as e:
+            self._dequeue(q, user_id, fut)
+            if fut.done() and not fut.cancelled():
+                # Slot was granted just as we gave up: pass it on
+                self.release(model, user_id)
+            else:
+                self._user_done(user_id)
+            if isinstance(e, asyncio.TimeoutError):
+                self.counters["queue_timeouts"] += 1
+                raise AdmissionRejected(503, "waited too long in queue", self._retry_after(q)) from None
+            raise
+        self._admitted(time.monotonic() - started)
+
+    def release(self, model: str, user_id: str, service_time: float = None):
+        q = self._queue(model)
+        q.active -= 1
+        self._user_done(user_id)
+        if service_time is not None:
+            self._service_time = 0.9 * self._service_time + 0.1 * service_time
+        self._grant(q)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            **self.counters,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "models": {
+                model: {"limit": q.limit, "active": q.active, "queued": q.queued}
+                for model, q in self._models.items()
+            },
+        }
+
+    # ---- internals ----
+
+    def _queue(self, model: str) -> _ModelQueue:
+        q = self._models.get(model)
+        if q is None:
+            q = self._models[model] = _ModelQueue(self.model_limits.get(model, self.max_concurrent))
+        return q
+
+    def _grant(self, q: _ModelQueue):
+        while q.active < q.limit and q.waiters:
+            user_id, waiting = next(iter(q.waiters.items()))
+            fut = waiting.popleft()
+            q.queued -= 1
+            if waiting:
+                q.waiters.move_to_end(user_id)  # next user's turn
+            else:
+                del q.waiters[user_id]
+            if not fut.done():
+                q.active += 1
+                fut.set_result(True)
+
+    def _dequeue(self, q: _ModelQueue, user_id: str, fut):
+        waiting = q.waiters.get(user_id)
+        if waiting and fut in waiting:
+            waiting.remove(fut)
+            q.queued -= 1
+            if not waiting:
+                del q.waiters[user_id]
+
+    def _user_done(self, user_id: str):
+        left = self._per_user.get(user_id, 0) - 1
+        if left > 0:
+            self._per_user[user_id] = left
+        else:
+            self._per_user.pop(user_id, None)
+
+    def _admitted(self, waited: float):
+        self.counters["admitted"] += 1
+        self._waits.append(waited)
+
+    def _retry_after(self, q: _ModelQueue) -> int:
+        """Rough seconds until a slot frees up: queue ahead / parallel slots x average generation time."""
+        estimate = (q.queued + 1) / max(q.limit, 1) * self._service_time
+        return min(60, max(1, math.ceil(estimate)))
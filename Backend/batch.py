@@ -0,0 +1,212 @@
+"""
+Batch question answering (<chat_route>_batch): a JSONL file of stateless questions in,
+one JSONL result per question out, in the order they finish.
+
+Each question is answered like the first turn of a new conversation: same system prompt,
+KB sections, KB fallback and response cache as the chat routes, but nothing is stored in
+the session store. A batch takes at most `concurrency` Ollama slots and queues as a single
+user, so people chatting at the same time still get their turn.
+
+    request (one JSON object per line)
+        {"text": "What is SMIT?", "id": "faq-12", "index": 7}
+        "index" defaults to the line number (0-based); "id" is passed through
+
+    response (application/x-ndjson)
+        {"type": "result", "index", "id", "reply", "fallback", "outcome", "ms"}
+        {"type": "result", "index", "id", "error"}     invalid line, or Ollama failed
+        {"type": "done", "count", "ok", "fallback", "errors", "seconds"}
+
+CLI, resumable (results are appended to the output file; questions whose index already
+has a reply there are skipped on the next run):
+
+    python batch.py questions.jsonl answers.jsonl --persona aasho --url http://localhost:8002
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+counters = {"batches": 0, "questions": 0, "errors": 0, "running": 0}
+
+
+def stats() -> dict:
+    return {"max_concurrency": BATCH_CONCURRENCY, **counters}
+
+
+def item_index(value) -> int:
+    """A question's "index" as an int; ValueError for booleans, fractions, Infinity / NaN and non-numbers."""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"\"index\" must be an integer, not {value!r}")
+    return int(value)
+
+
+def parse_lines(body: bytes) -> list:
+    """[(index, item or None, error)] for each non-empty line of a JSONL body."""
+    parsed = []
+    for position, line in enumerate(body.decode("utf-8", errors="replace").splitlines()):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if not isinstance(item, dict) or not str(item.get("text", "")).strip():
+                raise ValueError("needs a non-empty \"text\"")
+            index = item_index(item.get("index", position))
+        except (TypeError, ValueError, OverflowError) as e:
+            parsed.append((position, None, f"Invalid line: {e}"))
+            continue
+        parsed.append((index, item, ""))
+    return parsed
+
+
+async def run_batch(parsed: list, answer, concurrency: int):
+    """
+    Result dicts in completion order. answer(text) -> {"reply", "fallback", "outcome"}
+    answers one question; at most `concurrency` run at once. Closing the generator (the
+    client went away) cancels the questions still running.
+    """
+    counters["batches"] += 1
+    counters["running"] += 1
+    started = time.perf_counter()
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(concurrency)
+    totals = {"count": 0, "ok": 0, "fallback": 0, "errors": 0}
+
+    async def one(index: int, item: dict):
+        result = {"type": "result", "index": index}
+        if "id" in item:
+            result["id"] = item["id"]
+        asked = time.perf_counter()
+        try:
+            result.update(await answer(str(item["text"])))
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+        finally:
+            slots.release()
+        result["ms"] = round((time.perf_counter() - asked) * 1000)
+        await results.put(result)
+
+    async def feed():
+        tasks = []
+        for index, item, error in parsed:
+            if error:
+                await results.put({"type": "result", "index": index, "error": error})
+                continue
+            await slots.acquire()
+            tasks.append(asyncio.create_task(one(index, item)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await results.put(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            totals["count"] += 1
+            counters["questions"] += 1
+            if "error" in result:
+                totals["errors"] += 1
+                counters["errors"] += 1
+            elif result.get("fallback"):
+                totals["fallback"] += 1
+            else:
+                totals["ok"] += 1
+            yield result
+        yield {"type": "done", **totals, "seconds": round(time.perf_counter() - started, 2)}
+    finally:
+        counters["running"] -= 1
+        feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+
+
+# ---- CLI ----
+
+def answered_indexes(path: str) -> set:
+    """Indexes that already have a reply in an earlier output file (errors are asked again)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # cut off when the last run was interrupted
+            if result.get("type") == "result" and "reply" in result:
+                done.add(result["index"])
+    return done
+
+
+def main():
+    from personas import PERSONAS
+    import httpx
+
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions through a running backend")
+    parser.add_argument("questions", help="JSONL input, one {\"text\": ...} per line")
+    parser.add_argument("answers", help="JSONL output; appended to, and used to resume")
+    parser.add_argument("--persona", choices=sorted(PERSONAS), default="ahmed")
+    parser.add_argument("--url", default="http://localhost:8001", help="backend serving the persona")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--no-cache", action="store_true", help="do not reuse cached replies (fresh answers)")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    done = answered_indexes(args.answers)
+    todo = []
+    for position, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = None
+        if not isinstance(item, dict):
+            print(f"⚠️ Line {position + 1} is not a JSON object, skipped")
+            continue
+        item.setdefault("index", position)
+        try:
+            index = item_index(item["index"])
+        except (TypeError, ValueError, OverflowError):
+            print(f"⚠️ Line {position + 1} has an invalid \"index\", skipped")
+            continue
+        if index not in done:
+            todo.append(json.dumps(item, ensure_ascii=False))
+    print(f"📦 {len(todo)} questions to ask ({len(done)} already answered in {args.answers})")
+    if not todo:
+        return
+
+    url = args.url.rstrip("/") + PERSONAS[args.persona].batch_route
+    headers = {"Content-Type": "application/x-ndjson"}
+    if args.no_cache:
+        headers["X-Cache-Bypass"] = "1"
+    with open(args.answers, "a", encoding="utf-8") as out, httpx.stream(
+        "POST", url, params={"concurrency": args.concurrency}, headers=headers,
+        content="\n".join(todo).encode("utf-8"), timeout=httpx.Timeout(30.0, read=None),
+    ) as response:
+        if response.status_code != 200:
+            response.read()
+            sys.exit(f"❌ {url} answered {response.status_code}: {response.text}")
+        for line in response.iter_lines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            if result["type"] == "done":
+                print(f"✅ {result['count']} answered in {result['seconds']} s "
+                      f"({result['fallback']} from the KB, {result['errors']} errors)")
+                continue
+            out.write(line + "\n")
+            out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Conversation log (conversation_log.py): cost of record() on the request path, writer
+throughput and compression, then a streaming scan of the whole log with the CLI
+(filter + group by persona / outcome) and its peak memory.
+
+Run from the Backend folder:
+    python bench/bench_conversation_log.py --turns 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from conversation_log import ConversationLog, segment_paths  # noqa: E402
+
+QUESTIONS = ("what is saylani", "tell me about smit", "which job can i do after bsit in lahore",
+             "free medical help in pakistan", "hi there", "skills for a developer career")
+REPLY = ("Saylani Welfare runs free dastarkhwan meals across Pakistan, along with ration drives, "
+         "medical camps and the SMIT IT training programme for students. ")
+
+
+def synthetic_turn(i: int, rng: random.Random) -> dict:
+    fallback = rng.random() < 0.08
+    return {
+        "ts": round(time.time(), 3), "request_id": f"{i:016x}", "persona": rng.choice(("ahmed", "aasho")),
+        "route": "/chat_stream", "user_id": f"user-{rng.randrange(5000)}", "model": "llama3.2:1b",
+        "outcome": "fallback" if fallback else rng.choice(("ok", "ok", "ok", "cached")),
+        "fallback": fallback, "latency_ms": int(rng.lognormvariate(6.5, 0.6)), "ollama_ms": 0,
+        "prompt_tokens": rng.randrange(300, 900), "completion_tokens": rng.randrange(20, 120),
+        "kb_sections": rng.randrange(5), "text": rng.choice(QUESTIONS), "reply": REPLY * rng.randrange(1, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation log write / scan benchmark")
+    parser.add_argument("--turns", type=int, default=1_000_000)
+    parser.add_argument("--segment-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    turns = [synthetic_turn(i, rng) for i in range(min(args.turns, 50_000))]
+    with tempfile.TemporaryDirectory() as tmp:
+        log = ConversationLog(tmp, segment_mb=args.segment_mb, max_queue=args.turns)
+        log.start()
+        record_ns = []
+        started = time.perf_counter()
+        for i in range(args.turns):
+            turn = turns[i % len(turns)]
+            before = time.perf_counter_ns()
+            log.record(turn)
+            record_ns.append(time.perf_counter_ns() - before)
+        queued = time.perf_counter() - started
+        log.close(timeout=None)
+        written = time.perf_counter() - started
+        stats = log.stats()
+        record_ns.sort()
+        print(f"record(): p50 {record_ns[len(record_ns) // 2] / 1000:.1f} us, "
+              f"p99 {record_ns[int(len(record_ns) * 0.99)] / 1000:.1f} us, dropped {stats['dropped']}")
+        print(f"writer: {stats['written']} turns in {written:.1f} s ({stats['written'] / written:,.0f} turns/s, "
+              f"queueing took {queued:.1f} s), {stats['batches']} batches, {stats['segments']} segments")
+        print(f"size: {stats['bytes_raw'] / 1e6:.0f} MB JSONL -> {stats['bytes_written'] / 1e6:.1f} MB on disk "
+              f"({stats['bytes_raw'] / max(stats['bytes_written'], 1):.1f}x)")
+
+        del turns, record_ns
+        # Peak memory of the CLI process itself: VmHWM starts over at exec, ru_maxrss would
+        # still include this (large) process, which the child was forked from
+        cli = ("import resource, runpy, sys; sys.argv = ['conversation_log.py'] + sys.argv[1:]; "
+               "runpy.run_path('conversation_log.py', run_name='__main__'); "
+               "status = open('/proc/self/status').read() if sys.platform == 'linux' else ''; "
+               "hwm = [line.split()[1] for line in status.splitlines() if line.startswith('VmHWM')]; "
+               "print(hwm[0] if hwm else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)")
+        times, peaks = [], []
+        for _ in range(2):
+            started = time.perf_counter()
+            done = subprocess.run([sys.executable, "-c", cli, tmp, "--fallback", "--by", "persona,outcome"],
+                                  cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                  text=True)
+            times.append(time.perf_counter() - started)
+            peaks.append(int(done.stderr.split()[-1]) / 1024)
+        peak_mb = max(peaks)
+        scan = statistics.median(times)
+        print(f"scan (CLI, --fallback --by persona,outcome): {len(segment_paths([tmp]))} segments, {scan:.1f} s "
+              f"({stats['written'] / scan:,.0f} turns/s), peak RSS {peak_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
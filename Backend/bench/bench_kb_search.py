@@ -0,0 +1,151 @@
+"""
+Microbenchmark: per-query latency of the BM25 inverted index (kb_index.py) vs the
+original linear substring scan, on a knowledge base 100x the size of the real ones.
+
+Uses Saylani_Welfare_Knowledge_Base.txt and AshuAI_Complete_Training_Data.txt from the
+Backend folder when present (concatenated and repeated --scale times); otherwise a
+synthetic KB of similar shape is generated.
+
+Run from the Backend folder:
+    python bench/bench_kb_search.py --scale 100
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from kb_index import KnowledgeBaseIndex  # noqa: E402
+
+KB_FILES = ("Saylani_Welfare_Knowledge_Base.txt", "AshuAI_Complete_Training_Data.txt")
+
+QUERIES = (
+    "what is saylani welfare",
+    "saylani free food dastarkhwan",
+    "who founded saylani maulana bashir farooqui",
+    "free education smit mass it training",
+    "bscs jobs in karachi software houses",
+    "which job can i do after bsit in lahore",
+    "internship for computer science students",
+    "skills for a developer career",
+    "free medical help in pakistan",
+    "tell me something",
+)
+
+_VOCAB = (
+    "saylani welfare trust charity dastarkhwan ration food meal education medical hospital "
+    "karachi lahore hyderabad sindh pakistan smit course student teacher donation volunteer "
+    "bscs bsit bsse bba degree job career software house developer engineer internship skill "
+    "python javascript react data analyst designer company salary interview university"
+).split()
+
+
+def legacy_search(knowledge: str, query: str) -> str:
+    """The original search_knowledge_base: re-split and substring-scan on every call."""
+    if not knowledge or knowledge.startswith("("):
+        return ""
+    raw = knowledge.replace("\r\n", "\n")
+    sections = []
+    for block in raw.split("\n\n"):
+        block = block.strip()
+        if block and not block.startswith("=" * 20):
+            sections.append(block)
+    if not sections:
+        return knowledge[:2000]
+    words = [w.lower() for w in query.split() if len(w) >= 2]
+    if not words:
+        return "\n\n".join(sections[:8])
+    scored = []
+    for sec in sections:
+        sec_lower = sec.lower()
+        score = sum(1 for w in words if w in sec_lower)
+        if score > 0:
+            scored.append((score, sec))
+    if scored:
+        scored.sort(key=lambda x: -x[0])
+        result = []
+        total = 0
+        for _, sec in scored[:5]:
+            if total + len(sec) > 2500:
+                result.append(sec[: 2500 - total])
+                break
+            result.append(sec)
+            total += len(sec)
+        return "\n\n".join(result)
+    return "\n\n".join(sections[:6])
+
+
+def _synthetic_vocab(rng: random.Random) -> list:
+    """Domain words plus a few thousand filler words, so term frequencies look like real text."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    filler = {"".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(3000)}
+    return _VOCAB + sorted(filler)
+
+
+def load_base_kb() -> str:
+    texts = []
+    for name in KB_FILES:
+        path = os.path.join(BACKEND_DIR, name)
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                texts.append(f.read().strip())
+    if texts:
+        return "\n\n".join(texts)
+    # Synthetic stand-in: ~400 short sections with headings and separators.
+    # Words are drawn with a Zipf-like skew (a few very common, a long tail of rare ones).
+    rng = random.Random(42)
+    vocab = _synthetic_vocab(rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    blocks = []
+    for i in range(400):
+        if i % 25 == 0:
+            blocks.append("=" * 40)
+        words = rng.choices(vocab, weights=weights, k=rng.randint(15, 40))
+        blocks.append(f"Section {i}: {words[0].title()}\n" + " ".join(words) + ".")
+    return "\n\n".join(blocks)
+
+
+def time_queries(fn, queries, repeat: int) -> list:
+    per_query = []
+    for q in queries:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn(q)
+            samples.append(time.perf_counter() - started)
+        per_query.append(statistics.median(samples))
+    return per_query
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 index vs linear scan KB search benchmark")
+    parser.add_argument("--scale", type=int, default=100, help="repeat the KB this many times")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query (median is reported)")
+    args = parser.parse_args()
+
+    base = load_base_kb()
+    knowledge = "\n\n".join([base] * args.scale)
+    print(f"KB size: {len(knowledge) / 1e6:.1f} MB ({args.scale}x {len(base) / 1e3:.0f} KB)")
+
+    started = time.perf_counter()
+    index = KnowledgeBaseIndex(knowledge)
+    build = time.perf_counter() - started
+    print(f"Index build (once at startup): {build * 1000:.0f} ms, {len(index.sections)} sections, "
+          f"{len(index.postings)} terms")
+
+    legacy = time_queries(lambda q: legacy_search(knowledge, q), QUERIES, args.repeat)
+    indexed = time_queries(index.search, QUERIES, args.repeat)
+
+    print(f"{'query':45} {'linear ms':>10} {'index ms':>10} {'speedup':>8}")
+    for q, a, b in zip(QUERIES, legacy, indexed):
+        print(f"{q[:45]:45} {a * 1000:10.2f} {b * 1000:10.2f} {a / b:7.0f}x")
+    print(f"{'median':45} {statistics.median(legacy) * 1000:10.2f} {statistics.median(indexed) * 1000:10.2f} "
+          f"{statistics.median(legacy) / statistics.median(indexed):7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
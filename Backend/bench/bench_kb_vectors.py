@@ -0,0 +1,71 @@
+"""
+Semantic KB retrieval (kb_vectors.py): vector build time, on-disk size, load time from
+disk and per-query latency of bm25 / semantic / hybrid ranking, on the same scaled-up
+KB as bench_kb_search.py. Then the hit@1 / hit@5 of each mode on bench/corpus.jsonl.
+
+Run from the Backend folder:
+    python bench/bench_kb_vectors.py --scale 100 --embedder hashing
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_kb_search import QUERIES, load_base_kb, time_queries  # noqa: E402
+from eval_bench import kb_check, kb_dir, load_corpus  # noqa: E402
+from kb_index import KnowledgeBaseIndex  # noqa: E402
+from kb_vectors import SectionVectors, load_embedder  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic / hybrid KB retrieval benchmark")
+    parser.add_argument("--scale", type=int, default=100, help="repeat the KB this many times")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query (median is reported)")
+    parser.add_argument("--embedder", default="auto", help="KB_EMBEDDER: auto, hashing or fastembed")
+    parser.add_argument("--model", default="", help="KB_EMBED_MODEL")
+    parser.add_argument("--dim", type=int, default=1024, help="KB_EMBED_DIM (hashing)")
+    args = parser.parse_args()
+
+    embedder = load_embedder(args.embedder, args.model, args.dim)
+    if embedder is None:
+        sys.exit("numpy is not installed")
+    base = load_base_kb()
+    knowledge = "\n\n".join([base] * args.scale)
+    index = KnowledgeBaseIndex(knowledge)
+    print(f"KB size: {len(knowledge) / 1e6:.1f} MB, {len(index.sections)} sections, embedder {embedder.name}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.txt.vectors.npz")
+        built = SectionVectors.load_or_build(index.sections, embedder, path)
+        loaded = SectionVectors.load_or_build(index.sections, embedder, path)
+        size = os.path.getsize(path)
+    print(f"Vectors: build {built.build_ms:.0f} ms, load from disk {loaded.build_ms:.1f} ms, "
+          f"{size / 1024 / 1024:.2f} MB on disk ({built.vectors.shape[0]} x {built.vectors.shape[1]} float32)")
+
+    latencies = {}
+    for mode in ("bm25", "semantic", "hybrid"):
+        if mode != "bm25":
+            index.use_vectors(built, mode, min_similarity=embedder.min_similarity)
+        latencies[mode] = time_queries(lambda q: index.rank(q, top_k=4), QUERIES, args.repeat)
+
+    print(f"{'query':45} {'bm25 ms':>9} {'semantic':>9} {'hybrid':>9}")
+    for i, q in enumerate(QUERIES):
+        print(f"{q[:45]:45} " + " ".join(f"{latencies[mode][i] * 1000:9.3f}" for mode in latencies))
+    print(f"{'median':45} " + " ".join(f"{statistics.median(v) * 1000:9.3f}" for v in latencies.values()))
+
+    corpus = load_corpus(os.path.join(BENCH_DIR, "corpus.jsonl"))
+    print(f"\nRetrieval quality ({os.path.relpath(kb_dir(), os.getcwd())}):")
+    for mode in ("bm25", "semantic", "hybrid"):
+        check = kb_check(corpus, kb_dir(), mode, embedder)
+        rates = "  ".join(f"{name} hit@1 {c['hit_rate_at_1']:.0%} hit@5 {c['hit_rate_at_5']:.0%}"
+                          for name, c in check["per_kb"].items())
+        print(f"  {mode:9} {rates}")
+
+
+if __name__ == "__main__":
+    main()
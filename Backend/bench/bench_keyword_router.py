@@ -0,0 +1,108 @@
+"""
+Microbenchmark: topic detection with KeywordRouter (keyword_router.py, one Aho–Corasick
+pass over the text) vs the original per-topic `any(kw in q for kw in keywords)` scans and
+a word-boundary regex alternation, as the keyword lists grow.
+
+Starts from the real persona keyword lists (Saylani, career, "no knowledge" phrases) and
+pads every topic with generated words / Roman Urdu style phrases up to --sizes keywords.
+
+Run from the Backend folder:
+    python bench/bench_keyword_router.py --sizes 25 100 500 2000
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from chat_app import NO_KNOWLEDGE_PHRASES  # noqa: E402
+from keyword_router import KeywordRouter  # noqa: E402
+from personas import CAREER_ROUTE, SAYLANI_ROUTE  # noqa: E402
+
+TEXTS = (
+    "what is saylani welfare",
+    "bscs jobs in karachi software houses",
+    "tell me something funny about cats",
+    "mujhe batao ke saylani mein free khana kahan milta hai aur kis waqt",
+    "Sorry, I don't have information about that, but I can help with something else!",
+    "Wow! Yay! Saylani Welfare helps people in Pakistan with free food, education and hospitals. "
+    "They also teach computer courses at SMIT so students can become developers. Super cool!",
+)
+
+
+def _pad(keywords: tuple, size: int, rng: random.Random) -> tuple:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    padded = [kw.rstrip("*") for kw in keywords]
+    while len(padded) < size:
+        words = ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(rng.randint(1, 3))]
+        padded.append(" ".join(words))
+    return tuple(padded[:size])
+
+
+def naive(topics: dict):
+    """The original approach: lowercase, then a substring scan per keyword per topic."""
+    def classify(text):
+        q = text.lower().strip()
+        return [name for name, keywords in topics.items() if any(kw in q for kw in keywords)]
+    return classify
+
+
+def regex(topics: dict):
+    """One compiled \\b(?:kw|kw|...)\\b pattern per topic."""
+    patterns = {
+        name: re.compile(r"\b(?:" + "|".join(map(re.escape, sorted(keywords, key=len, reverse=True))) + r")\b")
+        for name, keywords in topics.items()
+    }
+
+    def classify(text):
+        q = text.lower()
+        return [name for name, pattern in patterns.items() if pattern.search(q)]
+    return classify
+
+
+def time_texts(fn, repeat: int) -> float:
+    """Median microseconds to classify one text (over TEXTS)."""
+    samples = []
+    for text in TEXTS:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn(text)
+        samples.append((time.perf_counter() - started) / repeat)
+    return statistics.median(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aho–Corasick keyword router vs substring scans")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 100, 500, 2000],
+                        help="keywords per topic")
+    parser.add_argument("--repeat", type=int, default=2000, help="runs per text")
+    args = parser.parse_args()
+
+    base = {
+        "saylani": SAYLANI_ROUTE.keywords,
+        "career": CAREER_ROUTE.keywords,
+        "no_knowledge": NO_KNOWLEDGE_PHRASES,
+    }
+    print(f"{'keywords/topic':>14} {'build ms':>9} {'states':>8} {'any(in) us':>11} {'regex us':>9} "
+          f"{'router us':>10} {'vs any(in)':>10}")
+    for size in args.sizes:
+        rng = random.Random(size)
+        topics = {name: _pad(keywords, size, rng) for name, keywords in base.items()}
+
+        started = time.perf_counter()
+        router = KeywordRouter(topics)
+        build = time.perf_counter() - started
+
+        a = time_texts(naive(topics), args.repeat)
+        b = time_texts(regex(topics), args.repeat)
+        c = time_texts(router.topics, args.repeat)
+        print(f"{size:14} {build * 1000:9.1f} {len(router):8} {a:11.2f} {b:9.2f} {c:10.2f} {a / c:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
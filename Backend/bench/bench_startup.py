@@ -0,0 +1,113 @@
+"""
+Worker startup: import time of the app module, then process start -> live (GET /healthz
+answers) -> ready (GET /readyz is 200: KB loaded, system prompts built) for a cold start
+(no saved KB artifacts) and a warm start (the artifacts the cold start saved, see
+KBManager / KB_CACHE_DIR).
+
+The KB files (real ones or bench/fixtures) are repeated --scale times into a temporary
+KB_DIR so indexing takes long enough to see. Ollama is not needed: the backend points at
+a closed port and only its startup is measured.
+
+Run from the Backend folder:
+    python bench/bench_startup.py --scale 100
+    python bench/bench_startup.py --scale 100 --retrieval hybrid --embedder hashing
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from eval_bench import _start, kb_dir  # noqa: E402
+from personas import KB_FILES  # noqa: E402
+
+
+def import_seconds(app: str, runs: int) -> float:
+    """Median time to import the app module in a fresh interpreter."""
+    code = f"import time; t = time.perf_counter(); import {app}; print(time.perf_counter() - t)"
+    times = [float(subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True,
+                                  text=True, check=True).stdout) for _ in range(runs)]
+    return statistics.median(times)
+
+
+def wait_for(url: str, started: float, timeout: float = 120.0) -> tuple:
+    """(seconds since started, JSON) once url answers 200."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            response = httpx.get(url, timeout=1.0)
+            if response.status_code == 200:
+                return time.perf_counter() - started, response.json()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer 200 in {timeout}s")
+
+
+def start_once(args, env: dict) -> dict:
+    url = f"http://127.0.0.1:{args.port}"
+    started = time.perf_counter()
+    backend = _start([sys.executable, "-m", "uvicorn", f"{args.app}:app", "--port", str(args.port),
+                      "--workers", "1", "--log-level", "warning"], env=env)
+    try:
+        live, _ = wait_for(f"{url}/healthz", started)
+        ready, info = wait_for(f"{url}/readyz", started)
+        kb = httpx.get(f"{url}/").json()["knowledge_base"]
+    finally:
+        backend.terminate()
+        backend.wait()
+    sources = sorted({f["index"]["source"] for f in kb["files"].values() if f["available"]})
+    return {"live_s": live, "ready_s": ready, "kb_load_s": info["kb_load_seconds"], "index": "+".join(sources)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-to-ready time of a backend worker, cold vs warm KB artifacts")
+    parser.add_argument("--app", default="server", help="module with the app: server, main_ollama or aashu_ollama")
+    parser.add_argument("--scale", type=int, default=100, help="repeat each KB file this many times")
+    parser.add_argument("--retrieval", default="bm25", help="KB_RETRIEVAL")
+    parser.add_argument("--embedder", default="hashing", help="KB_EMBEDDER (semantic / hybrid)")
+    parser.add_argument("--runs", type=int, default=3, help="starts per mode (median is reported)")
+    parser.add_argument("--port", type=int, default=8113)
+    args = parser.parse_args()
+
+    print(f"import {args.app}: {import_seconds(args.app, args.runs):.3f} s (median of {args.runs})")
+    with tempfile.TemporaryDirectory() as tmp:
+        kb_folder = os.path.join(tmp, "kb")
+        cache_dir = os.path.join(tmp, "cache")
+        os.makedirs(kb_folder)
+        size = 0
+        for file_name, _ in KB_FILES.values():
+            with open(os.path.join(kb_dir(), file_name), encoding="utf-8") as f:
+                text = "\n\n".join([f.read().strip()] * args.scale)
+            with open(os.path.join(kb_folder, file_name), "w", encoding="utf-8") as f:
+                f.write(text)
+            size += len(text)
+        print(f"KB: {size / 1e6:.1f} MB in {len(KB_FILES)} files, retrieval {args.retrieval}")
+        env = dict(os.environ, KB_DIR=kb_folder, KB_CACHE_DIR=cache_dir, KB_RETRIEVAL=args.retrieval,
+                   KB_EMBEDDER=args.embedder, KB_WATCH_INTERVAL="0", OLLAMA_BASE_URL="http://127.0.0.1:9",
+                   OLLAMA_WARMUP="0")
+
+        print(f"{'start':>6} {'live s':>8} {'ready s':>8} {'KB load s':>10}  index")
+        for mode in ("cold", "warm"):
+            results = []
+            for _ in range(args.runs):
+                if mode == "cold":
+                    for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+                        os.remove(os.path.join(cache_dir, name))
+                    os.makedirs(cache_dir, exist_ok=True)
+                results.append(start_once(args, env))
+            median = {key: statistics.median(r[key] for r in results) for key in ("live_s", "ready_s", "kb_load_s")}
+            print(f"{mode:>6} {median['live_s']:8.3f} {median['ready_s']:8.3f} {median['kb_load_s']:10.3f}  "
+                  f"{results[-1]['index']}")
+
+
+if __name__ == "__main__":
+    main()
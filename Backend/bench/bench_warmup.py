@@ -0,0 +1,97 @@
+"""
+Cold vs warm first turns (warmup.py): how long new sessions wait for their first reply
+sentence with and without the startup warm-up.
+
+For each mode (OLLAMA_WARMUP=0, then 1) a fresh stub Ollama is started with a model load
+time and a prefill rate (bench/stub_ollama.py --load-seconds / --prefill-rate), so the
+model starts unloaded, then the Ahmed backend. --users new sessions ask one question
+each, one after the other (cache bypassed), and the time to the first sentence is taken.
+The backend's own classification of those first turns (cold / prefill / warm, from
+Ollama's load_duration and prompt_eval_count) is read from GET /.
+
+Run from the Backend folder:
+    python bench/bench_warmup.py --load-seconds 3 --prefill-rate 300 --users 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from eval_bench import _start, _wait_until_up, kb_dir  # noqa: E402
+
+QUESTIONS = ("hi there", "what is saylani", "tell me about smit", "who founded saylani", "do you like cats")
+
+
+def first_sentence(backend_url: str, text: str, user_id: str) -> float:
+    started = time.perf_counter()
+    first = None
+    # Read to the end: closing the stream early would cancel the turn
+    with httpx.stream("POST", f"{backend_url}/chat_stream", json={"text": text, "user_id": user_id},
+                      headers={"X-Cache-Bypass": "1"}, timeout=120) as r:
+        for line in r.iter_lines():
+            if first is None and line.strip() and json.loads(line)["type"] in ("sentence", "error"):
+                first = time.perf_counter() - started
+    return first if first is not None else time.perf_counter() - started
+
+
+def run(args, warmup: bool) -> dict:
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    backend_url = f"http://127.0.0.1:{args.backend_port}"
+    env = dict(os.environ, OLLAMA_BASE_URL=stub_url, KB_DIR=kb_dir(), OLLAMA_WARMUP="1" if warmup else "0",
+               KB_RACE_DEADLINE="0")
+    stub = _start([
+        sys.executable, "bench/stub_ollama.py", "--port", str(args.stub_port), "--tokens", "20",
+        "--token-rate", "50", "--first-token-delay", "0.05",
+        "--load-seconds", str(args.load_seconds), "--prefill-rate", str(args.prefill_rate),
+    ])
+    backend = _start([sys.executable, "-m", "uvicorn", "main_ollama:app", "--port", str(args.backend_port),
+                      "--workers", "1", "--log-level", "warning"], env=env)
+    try:
+        _wait_until_up(f"{stub_url}/api/tags")
+        _wait_until_up(f"{backend_url}/")
+        if warmup:
+            # Users arrive once the warm-up is done (it runs in the background)
+            deadline = time.time() + 60
+            while httpx.get(f"{backend_url}/").json()["warmup"]["warmups"] < 1 and time.time() < deadline:
+                time.sleep(0.1)
+        times = [first_sentence(backend_url, QUESTIONS[i % len(QUESTIONS)], f"bench-{warmup}-{i}")
+                 for i in range(args.users)]
+        info = httpx.get(f"{backend_url}/").json()["warmup"]
+    finally:
+        backend.terminate()
+        stub.terminate()
+        backend.wait()
+        stub.wait()
+    return {
+        "first_user_s": round(times[0], 3),
+        "median_s": round(statistics.median(times), 3),
+        "first_turns": {k.removeprefix("first_turn_"): v for k, v in info.items() if k.startswith("first_turn_")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="First-turn latency with and without the Ollama warm-up")
+    parser.add_argument("--users", type=int, default=5, help="new sessions per mode")
+    parser.add_argument("--load-seconds", type=float, default=3.0, help="stub model load time")
+    parser.add_argument("--prefill-rate", type=float, default=300.0, help="stub prompt tokens per second")
+    parser.add_argument("--stub-port", type=int, default=11511)
+    parser.add_argument("--backend-port", type=int, default=8112)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'1st user s':>11} {'median s':>9}  first turns (backend)")
+    for warmup in (False, True):
+        result = run(args, warmup)
+        mode = "warm-up" if warmup else "no warm-up"
+        print(f"{mode:>10} {result['first_user_s']:11.3f} {result['median_s']:9.3f}  {result['first_turns']}")
+
+
+if __name__ == "__main__":
+    main()
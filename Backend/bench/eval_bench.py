@@ -0,0 +1,326 @@
+"""
+Offline benchmark / evaluation of the chat backends, no Ollama or GPU needed.
+
+1. KB retrieval check (in-process): for every corpus question with an expected KB
+   section, is that section ranked first (hit@1) or among the sections search()
+   returns (hit@5)? A section is "expected" if it contains all `expect` phrases.
+2. Replay (end to end): starts the stub Ollama (bench/stub_ollama.py) with the given
+   token rate / first-token delay / fault rates and one backend worker, then replays
+   the corpus (--passes times, fresh user_id per question) at --concurrency against
+   /chat, /aasho_chat (or their _stream routes) and reports p50/p95/p99 latency,
+   throughput, error and fallback rates.
+
+Results are written as JSON (--out); --baseline old.json prints the change per metric.
+
+Uses the KB files from the Backend folder when present, otherwise the fixtures in
+bench/fixtures (KB_DIR is passed to the backend accordingly).
+
+Run from the Backend folder:
+    python bench/eval_bench.py --app server --concurrency 16 --passes 3 --out bench/results.json
+    python bench/eval_bench.py --kb-only                         # retrieval check only
+    python bench/eval_bench.py --kb-only --retrieval hybrid      # ... with semantic / hybrid ranking
+    python bench/eval_bench.py --no-info-rate 0.3 --error-rate 0.05 --stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BACKEND_DIR, "bench")
+sys.path.insert(0, BACKEND_DIR)
+
+from kb_index import KnowledgeBaseIndex  # noqa: E402
+from kb_vectors import SectionVectors, load_embedder  # noqa: E402
+from personas import KB_FILES, PERSONAS  # noqa: E402
+
+# Personas served by each entry point
+APPS = {"server": ("ahmed", "aasho"), "main_ollama": ("ahmed",), "aashu_ollama": ("aasho",)}
+
+
+def load_corpus(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def kb_dir() -> str:
+    """Backend folder if it has the real KB files, else the benchmark fixtures."""
+    if all(os.path.isfile(os.path.join(BACKEND_DIR, name)) for name, _ in KB_FILES.values()):
+        return BACKEND_DIR
+    return os.path.join(BENCH_DIR, "fixtures")
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+# ---- KB retrieval ----
+
+def kb_check(corpus: list, directory: str, retrieval: str = "bm25", embedder=None) -> dict:
+    """retrieval: bm25, semantic or hybrid (with KB_HYBRID_WEIGHT / KB_MIN_SIMILARITY from the environment)."""
+    indexes = {}
+    for name, (file_name, _) in KB_FILES.items():
+        with open(os.path.join(directory, file_name), "r", encoding="utf-8") as f:
+            indexes[name] = KnowledgeBaseIndex(f.read())
+        if retrieval != "bm25":
+            vectors = SectionVectors.load_or_build(indexes[name].sections, embedder)
+            indexes[name].use_vectors(vectors, retrieval, float(os.getenv("KB_HYBRID_WEIGHT", "0.5")),
+                                      float(os.getenv("KB_MIN_SIMILARITY") or embedder.min_similarity))
+
+    per_kb = {}
+    misses = []
+    for item in corpus:
+        if not item.get("kb"):
+            continue
+        index = indexes[item["kb"]]
+        expect = [e.lower() for e in item["expect"]]
+        expected = {i for i, sec in enumerate(index.sections) if all(e in sec.lower() for e in expect)}
+        ranked = [idx for _, idx in index.rank(item["text"], top_k=5)]
+        returned = index.search(item["text"]).lower()
+        hit1 = bool(ranked) and ranked[0] in expected
+        hit5 = bool(expected) and all(e in returned for e in expect)
+        counts = per_kb.setdefault(item["kb"], {"questions": 0, "hit_at_1": 0, "hit_at_5": 0})
+        counts["questions"] += 1
+        counts["hit_at_1"] += hit1
+        counts["hit_at_5"] += hit5
+        if not hit1:
+            misses.append({"kb": item["kb"], "text": item["text"], "rank": next(
+                (r + 1 for r, idx in enumerate(ranked) if idx in expected), None)})
+
+    for counts in per_kb.values():
+        counts["hit_rate_at_1"] = round(counts["hit_at_1"] / counts["questions"], 3)
+        counts["hit_rate_at_5"] = round(counts["hit_at_5"] / counts["questions"], 3)
+    return {"kb_dir": os.path.relpath(directory, BACKEND_DIR), "retrieval": retrieval, "per_kb": per_kb,
+            "misses": misses}
+
+
+# ---- replay ----
+
+def _start(cmd, env=None):
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def _wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up in {timeout}s")
+
+
+async def _ask(client: httpx.AsyncClient, item: dict, user_id: str, stream: bool) -> dict:
+    persona = PERSONAS[item["persona"]]
+    route = persona.stream_route if stream else persona.chat_route
+    body = {"text": item["text"], "user_id": user_id}
+    started = time.perf_counter()
+    result = {"persona": persona.key, "kb": item.get("kb"), "status": 0, "first_sentence_s": None,
+              "fallback": False, "error": False, "degraded": False}
+    try:
+        if stream:
+            async with client.stream("POST", route, json=body, headers={"X-Cache-Bypass": "1"}) as r:
+                result["status"] = r.status_code
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event["type"] == "sentence" and result["first_sentence_s"] is None:
+                        result["first_sentence_s"] = time.perf_counter() - started
+                    elif event["type"] == "done":
+                        result["fallback"] = event.get("fallback", False)
+                        result["degraded"] = event.get("degraded", False)
+                    elif event["type"] == "error":
+                        result["error"] = True
+        else:
+            r = await client.post(route, json=body, headers={"X-Cache-Bypass": "1"})
+            result["status"] = r.status_code
+            reply = r.json().get("reply", "") if r.status_code == 200 else ""
+            result["fallback"] = any(reply.startswith(kb_route.reply_prefix) for kb_route in persona.kb_routes)
+            result["error"] = reply.startswith("❌") or reply.startswith("⏱️")
+    except httpx.HTTPError:
+        result["error"] = True
+    result["latency_s"] = time.perf_counter() - started
+    if result["status"] != 200:
+        result["error"] = True
+    return result
+
+
+async def replay(backend_url: str, corpus: list, concurrency: int, passes: int, stream: bool,
+                 timeout: float) -> tuple:
+    limits = httpx.Limits(max_connections=concurrency + 5, max_keepalive_connections=concurrency + 5)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=backend_url, limits=limits, timeout=timeout) as client:
+        async def one(i: int, item: dict):
+            async with semaphore:
+                return await _ask(client, item, f"bench-{i}", stream)
+
+        jobs = [(p * len(corpus) + i, item) for p in range(passes) for i, item in enumerate(corpus)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(i, item) for i, item in jobs))
+        return results, time.perf_counter() - started
+
+
+def summarize(results: list, wall: float) -> dict:
+    def latency_stats(values):
+        return {
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": round(max(values), 3) if values else 0.0,
+        }
+
+    ok = [r for r in results if not r["error"]]
+    kb_questions = [r for r in ok if r["kb"]]
+    summary = {
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "busy_429_503": sum(1 for r in results if r["status"] in (429, 503)),
+        "degraded": sum(1 for r in results if r["degraded"]),
+        "error_rate": round((len(results) - len(ok)) / len(results), 3) if results else 0.0,
+        "fallback_rate": round(sum(r["fallback"] for r in ok) / len(ok), 3) if ok else 0.0,
+        "kb_fallback_rate": round(sum(r["fallback"] for r in kb_questions) / len(kb_questions), 3)
+        if kb_questions else 0.0,
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+        "wall_s": round(wall, 2),
+        "latency_s": latency_stats([r["latency_s"] for r in ok]),
+    }
+    first = [r["first_sentence_s"] for r in ok if r["first_sentence_s"] is not None]
+    if first:
+        summary["first_sentence_s"] = latency_stats(first)
+    summary["per_persona"] = {}
+    for key in sorted({r["persona"] for r in results}):
+        mine = [r for r in ok if r["persona"] == key]
+        summary["per_persona"][key] = {
+            "requests": sum(1 for r in results if r["persona"] == key),
+            "latency_s": latency_stats([r["latency_s"] for r in mine]),
+            "fallback_rate": round(sum(r["fallback"] for r in mine) / len(mine), 3) if mine else 0.0,
+        }
+    return summary
+
+
+def _flatten(data, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: dict, results: dict):
+    """Print every numeric metric that changed against a previous results file."""
+    old = _flatten({k: baseline.get(k, {}) for k in ("kb_retrieval", "replay")})
+    new = _flatten({k: results.get(k, {}) for k in ("kb_retrieval", "replay")})
+    print(f"\n{'metric':55} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name in sorted(set(old) | set(new)):
+        a, b = old.get(name), new.get(name)
+        if a == b:
+            continue
+        change = f"{(b - a) / a * 100:+.0f}%" if a and b is not None else ""
+        print(f"{name:55} {str(a):>10} {str(b):>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat backend benchmark / evaluation against a stub Ollama")
+    parser.add_argument("--app", choices=sorted(APPS), default="server")
+    parser.add_argument("--corpus", default=os.path.join(BENCH_DIR, "corpus.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--passes", type=int, default=3, help="times the corpus is replayed")
+    parser.add_argument("--stream", action="store_true", help="use the _stream routes (adds first-sentence latency)")
+    parser.add_argument("--kb-only", action="store_true", help="only run the KB retrieval check")
+    parser.add_argument("--retrieval", choices=("bm25", "semantic", "hybrid"), default="bm25",
+                        help="KB ranking for the retrieval check (KB_RETRIEVAL)")
+    parser.add_argument("--embedder", default="auto", help="KB_EMBEDDER for semantic / hybrid")
+    parser.add_argument("--tokens", type=int, default=40, help="words per stub reply")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="stub words per second")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--no-info-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request (s)")
+    parser.add_argument("--read-timeout", type=float, default=None, help="OLLAMA_READ_TIMEOUT for the backend")
+    parser.add_argument("--stub-port", type=int, default=11510)
+    parser.add_argument("--backend-port", type=int, default=8111)
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare with")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    directory = kb_dir()
+    results = {"config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}}
+
+    embedder = load_embedder(args.embedder) if args.retrieval != "bm25" else None
+    results["kb_retrieval"] = kb_check(corpus, directory, args.retrieval, embedder)
+    print(f"KB retrieval ({results['kb_retrieval']['kb_dir']}, {args.retrieval}):")
+    for name, counts in results["kb_retrieval"]["per_kb"].items():
+        print(f"  {name:8} {counts['questions']:3} questions  hit@1 {counts['hit_rate_at_1']:.0%}  "
+              f"hit@5 {counts['hit_rate_at_5']:.0%}")
+    for miss in results["kb_retrieval"]["misses"]:
+        print(f"  miss ({miss['kb']}, expected section at rank {miss['rank'] or '>5'}): {miss['text']}")
+
+    if not args.kb_only:
+        served = APPS[args.app]
+        replayed = [item for item in corpus if item["persona"] in served]
+        stub_url = f"http://127.0.0.1:{args.stub_port}"
+        backend_url = f"http://127.0.0.1:{args.backend_port}"
+        env = dict(os.environ, OLLAMA_BASE_URL=stub_url, KB_DIR=directory)
+        if args.read_timeout:
+            env["OLLAMA_READ_TIMEOUT"] = str(args.read_timeout)
+        stub = _start([
+            sys.executable, "bench/stub_ollama.py", "--port", str(args.stub_port), "--tokens", str(args.tokens),
+            "--token-rate", str(args.token_rate), "--first-token-delay", str(args.first_token_delay),
+            "--error-rate", str(args.error_rate), "--hang-rate", str(args.hang_rate),
+            "--no-info-rate", str(args.no_info_rate), "--seed", str(args.seed),
+        ])
+        backend = _start([sys.executable, "-m", "uvicorn", f"{args.app}:app", "--port", str(args.backend_port),
+                          "--workers", "1", "--log-level", "warning"], env=env)
+        try:
+            _wait_until_up(f"{stub_url}/api/tags")
+            _wait_until_up(f"{backend_url}/")
+            print(f"\nReplay: {args.app}, {len(replayed)} questions x {args.passes} passes, "
+                  f"concurrency {args.concurrency}, {'stream' if args.stream else 'chat'} routes")
+            rows, wall = asyncio.run(replay(backend_url, replayed, args.concurrency, args.passes, args.stream,
+                                            args.timeout))
+            results["replay"] = summarize(rows, wall)
+            results["replay"]["stub"] = httpx.get(f"{stub_url}/stats").json()
+        finally:
+            backend.terminate()
+            stub.terminate()
+            backend.wait()
+            stub.wait()
+
+        summary = results["replay"]
+        lat = summary["latency_s"]
+        print(f"  {summary['ok']}/{summary['requests']} ok, {summary['errors']} errors, "
+              f"{summary['throughput_rps']} req/s")
+        print(f"  latency p50 {lat['p50']} s  p95 {lat['p95']} s  p99 {lat['p99']} s")
+        if "first_sentence_s" in summary:
+            first = summary["first_sentence_s"]
+            print(f"  first sentence p50 {first['p50']} s  p95 {first['p95']} s  p99 {first['p99']} s")
+        print(f"  fallback rate {summary['fallback_rate']:.1%} (KB questions {summary['kb_fallback_rate']:.1%})")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.out}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
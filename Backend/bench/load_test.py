@@ -0,0 +1,134 @@
+"""
+Load test: how many concurrent chats can ONE uvicorn worker hold open against Ollama?
+
+Starts the stub Ollama (bench/stub_ollama.py) and one backend worker, then for each
+concurrency level fires that many /chat requests at once (distinct user_ids). While
+they are generating it probes GET / and POST /clear to check the light endpoints do
+not stall behind the chats, and reads the stub's peak number of in-flight generations.
+With --nodes N, N stubs are started and the backend spreads the chats over them.
+
+Run from the Backend folder:
+    python bench/load_test.py --app main_ollama --concurrency 50 100 200 400
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_ENDPOINTS = {"main_ollama": "/chat", "aashu_ollama": "/aasho_chat"}
+
+
+def _start(cmd, env=None):
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def _wait_until_up(url: str, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up in {timeout}s")
+
+
+async def _probe(client: httpx.AsyncClient, method: str, path: str) -> float:
+    started = time.perf_counter()
+    await client.request(method, path)
+    return time.perf_counter() - started
+
+
+async def run_level(backend_url: str, stub_urls: list, endpoint: str, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency + 10, max_keepalive_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=backend_url, limits=limits, timeout=600) as client:
+        for stub_url in stub_urls:
+            await client.post(f"{stub_url}/stats/reset")
+
+        async def one_chat(i: int):
+            started = time.perf_counter()
+            r = await client.post(endpoint, json={"text": "what is saylani", "user_id": f"load-{concurrency}-{i}"},
+                                  headers={"X-Cache-Bypass": "1"})  # measure Ollama, not the response cache
+            return r.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        chats = [asyncio.create_task(one_chat(i)) for i in range(concurrency)]
+        await asyncio.sleep(1.0)
+        root_latency = await _probe(client, "GET", "/")
+        clear_latency = await _probe(client, "POST", "/clear?user_id=probe")
+        results = await asyncio.gather(*chats)
+        wall = time.perf_counter() - started
+        peaks = [(await client.get(f"{stub_url}/stats")).json()["peak_in_flight"] for stub_url in stub_urls]
+
+    latencies = sorted(t for _, t in results)
+    ok = sum(1 for code, _ in results if code == 200)
+    busy = sum(1 for code, _ in results if code in (429, 503))
+    return {
+        "concurrency": concurrency,
+        "ok": ok,
+        "busy_429_503": busy,
+        "peak_in_flight_at_ollama": "+".join(map(str, peaks)),
+        "wall_s": round(wall, 2),
+        "chat_p50_s": round(latencies[len(latencies) // 2], 2),
+        "chat_max_s": round(latencies[-1], 2),
+        "root_probe_ms": round(root_latency * 1000, 1),
+        "clear_probe_ms": round(clear_latency * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat load test against a stub Ollama")
+    parser.add_argument("--app", choices=sorted(CHAT_ENDPOINTS), default="main_ollama")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--max-connections", type=int, default=None, help="OLLAMA_MAX_CONNECTIONS for the backend")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="OLLAMA_MAX_CONCURRENT for the backend")
+    parser.add_argument("--max-queue", type=int, default=None, help="ADMISSION_MAX_QUEUE for the backend")
+    parser.add_argument("--nodes", type=int, default=1, help="stub Ollama servers (ports from --stub-port up)")
+    parser.add_argument("--stub-port", type=int, default=11500)
+    parser.add_argument("--backend-port", type=int, default=8101)
+    args = parser.parse_args()
+
+    stub_urls = [f"http://127.0.0.1:{args.stub_port + i}" for i in range(args.nodes)]
+    backend_url = f"http://127.0.0.1:{args.backend_port}"
+    env = dict(os.environ, OLLAMA_BASE_URL=",".join(stub_urls))
+    if args.max_connections:
+        env["OLLAMA_MAX_CONNECTIONS"] = str(args.max_connections)
+    if args.max_concurrent:
+        env["OLLAMA_MAX_CONCURRENT"] = str(args.max_concurrent)
+    if args.max_queue:
+        env["ADMISSION_MAX_QUEUE"] = str(args.max_queue)
+
+    stubs = [_start([sys.executable, "bench/stub_ollama.py", "--port", str(args.stub_port + i),
+                     "--tokens", str(args.tokens), "--token-delay", str(args.token_delay)]) for i in range(args.nodes)]
+    backend = _start([sys.executable, "-m", "uvicorn", f"{args.app}:app", "--port", str(args.backend_port),
+                      "--workers", "1", "--log-level", "warning"], env=env)
+    try:
+        for stub_url in stub_urls:
+            _wait_until_up(f"{stub_url}/api/tags")
+        _wait_until_up(f"{backend_url}/")
+        print(f"Backend {args.app} (1 worker) -> {args.nodes} stub Ollama, {args.tokens} tokens x {args.token_delay}s per reply")
+        header = ("concurrency", "ok", "busy_429_503", "peak_in_flight_at_ollama", "wall_s", "chat_p50_s", "chat_max_s",
+                  "root_probe_ms", "clear_probe_ms")
+        print(" | ".join(header))
+        for level in args.concurrency:
+            row = asyncio.run(run_level(backend_url, stub_urls, CHAT_ENDPOINTS[args.app], level))
+            print(" | ".join(str(row[h]) for h in header))
+    finally:
+        backend.terminate()
+        for stub in stubs:
+            stub.terminate()
+        backend.wait()
+        for stub in stubs:
+            stub.wait()
+
+
+if __name__ == "__main__":
+    main()
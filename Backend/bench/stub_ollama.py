@@ -0,0 +1,253 @@
+"""
+Local stand-in for the Ollama HTTP API, for load tests and benchmarks without a GPU.
+
+Implements /api/chat (streamed and non-streamed) and /api/tags, generates a fixed
+reply word by word with a configurable token rate and first-token delay, and reports
+how many generations were in flight at the same time on GET /stats.
+
+Error injection: a share of requests can fail with HTTP 500 (--error-rate), hang until
+the client gives up (--hang-rate), or answer "I don't have information about that"
+(--no-info-rate, which makes the backend fall back to its knowledge base). The settings
+can be changed while running with POST /config {"error_rate": 0.2, ...}.
+
+Model residency: with --load-seconds, a request for a model that is not loaded (first
+request, or idle longer than its keep_alive) waits that long and reports load_duration.
+With --prefill-rate, prompt processing takes (uncached prompt tokens / rate) seconds; the
+longest prefix shared with the last few prompts counts as cached, as in Ollama.
+
+Run:  python bench/stub_ollama.py --port 11500 --tokens 64 --token-rate 20 --first-token-delay 0.3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY_WORDS = (
+    "Saylani Welfare runs free dastarkhwan meals across Pakistan. "
+    "They also teach IT skills at SMIT for free. Wow, that is super cool!"
+).split()
+NO_INFO_WORDS = "Sorry, I don't have information about that.".split()
+
+config = {
+    "model": "llama3.2:1b",
+    "models": ["llama3.2:1b"],
+    "tokens": 64,
+    "token_delay": 0.05,
+    "first_token_delay": 0.0,
+    "error_rate": 0.0,
+    "hang_rate": 0.0,
+    "no_info_rate": 0.0,
+    "seed": None,
+    "load_seconds": 0.0,
+    "prefill_rate": 0.0,
+}
+stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "errors_injected": 0, "hangs_injected": 0, "no_info": 0,
+         "model_loads": 0, "cached_prompt_tokens": 0}
+_rng = random.Random()
+_loaded_until = {}    # model -> time.monotonic() when it is unloaded (keep_alive)
+_recent_prompts = []  # last prompts, for prefix cache hits
+PROMPT_CACHE_SLOTS = 4
+
+app = FastAPI()
+
+
+def _words(n: int, words: list = REPLY_WORDS):
+    for i in range(n):
+        yield words[i % len(words)] + " "
+
+
+def _pick_fault() -> str:
+    """"error", "hang", "no_info" or "" for this request, per the configured rates."""
+    roll = _rng.random()
+    for fault in ("error", "hang", "no_info"):
+        rate = config[f"{fault}_rate"]
+        if roll < rate:
+            return fault
+        roll -= rate
+    return ""
+
+
+def _keep_alive_seconds(value) -> float:
+    """Ollama keep_alive: seconds, or a duration like "30m" / "1h"; negative = forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    value = str(value).strip()
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    for unit in ("ms", "s", "m", "h"):
+        if value.endswith(unit) and value[:-len(unit)].lstrip("-").replace(".", "", 1).isdigit():
+            seconds = float(value[:-len(unit)]) * units[unit]
+            return float("inf") if seconds < 0 else seconds
+    seconds = float(value)
+    return float("inf") if seconds < 0 else seconds
+
+
+def _prefill(body: dict) -> tuple:
+    """(model load seconds, prompt tokens to process, prompt processing seconds) for this request."""
+    model = body.get("model", config["model"])
+    now = time.monotonic()
+    load = 0.0
+    if config["load_seconds"] and _loaded_until.get(model, 0) < now:
+        load = config["load_seconds"]
+        stats["model_loads"] += 1
+    _loaded_until[model] = now + load + _keep_alive_seconds(body.get("keep_alive"))
+
+    prompt = "".join(f"{m.get('role')}: {m.get('content', '')}\n" for m in body.get("messages", []))
+    cached = 0
+    if not load:
+        for other in _recent_prompts:
+            common = 0
+            for a, b in zip(prompt, other):
+                if a != b:
+                    break
+                common += 1
+            cached = max(cached, common)
+    _recent_prompts.insert(0, prompt)
+    del _recent_prompts[PROMPT_CACHE_SLOTS:]
+    tokens = max(1, (len(prompt) - cached) // 4)
+    stats["cached_prompt_tokens"] += cached // 4
+    seconds = config["first_token_delay"] + (tokens / config["prefill_rate"] if config["prefill_rate"] else 0.0)
+    return load, tokens, seconds
+
+
+def _final_chunk(prefill: tuple, started: float) -> dict:
+    load, prompt_tokens, prompt_seconds = prefill
+    total_ns = int((time.perf_counter() - started) * 1e9)
+    return {
+        "model": config["model"],
+        "done": True,
+        "load_duration": int(load * 1e9),
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(prompt_seconds * 1e9),
+        "eval_count": config["tokens"],
+        "eval_duration": int(config["tokens"] * config["token_delay"] * 1e9),
+        "total_duration": total_ns,
+    }
+
+
+class _InFlight:
+    def __enter__(self):
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+
+    def __exit__(self, *exc):
+        stats["in_flight"] -= 1
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    started = time.perf_counter()
+    if body.get("model", config["model"]) not in config["models"]:
+        return JSONResponse({"error": f"model '{body.get('model')}' not found, try pulling it first"}, status_code=404)
+    fault = _pick_fault()
+    if fault == "error":
+        stats["errors_injected"] += 1
+        return JSONResponse({"error": "injected failure"}, status_code=500)
+    if fault == "hang":
+        stats["hangs_injected"] += 1
+        with _InFlight():
+            await asyncio.sleep(3600)
+    words = NO_INFO_WORDS if fault == "no_info" else REPLY_WORDS
+    tokens = len(NO_INFO_WORDS) if fault == "no_info" else config["tokens"]
+    tokens = min(tokens, body.get("options", {}).get("num_predict") or tokens)
+    if fault == "no_info":
+        stats["no_info"] += 1
+    prefill = _prefill(body)
+    wait = prefill[0] + prefill[2]
+
+    if not body.get("stream", True):
+        with _InFlight():
+            await asyncio.sleep(wait + tokens * config["token_delay"])
+            final = _final_chunk(prefill, started)
+            final["message"] = {"role": "assistant", "content": "".join(_words(tokens, words)).strip()}
+            return JSONResponse(final)
+
+    async def generate():
+        with _InFlight():
+            await asyncio.sleep(wait)
+            for word in _words(tokens, words):
+                await asyncio.sleep(config["token_delay"])
+                chunk = {"model": config["model"], "message": {"role": "assistant", "content": word}, "done": False}
+                yield json.dumps(chunk) + "\n"
+            final = _final_chunk(prefill, started)
+            final["message"] = {"role": "assistant", "content": ""}
+            yield json.dumps(final) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": model} for model in config["models"]]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    stats.update(requests=0, peak_in_flight=0, errors_injected=0, hangs_injected=0, no_info=0,
+                 model_loads=0, cached_prompt_tokens=0)
+    return stats
+
+
+@app.post("/config")
+async def set_config(request: Request):
+    """Change token rate / delays / fault rates of the running stub."""
+    changes = {k: v for k, v in (await request.json()).items() if k in config}
+    config.update(changes)
+    if "seed" in changes:
+        _rng.seed(changes["seed"])
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--model", default=config["model"], help="pulled models, comma-separated")
+    parser.add_argument("--tokens", type=int, default=config["tokens"], help="words per reply")
+    parser.add_argument("--token-delay", type=float, default=config["token_delay"], help="seconds per word")
+    parser.add_argument("--token-rate", type=float, default=None, help="words per second (overrides --token-delay)")
+    parser.add_argument("--first-token-delay", type=float, default=config["first_token_delay"],
+                        help="seconds before the first word (prompt processing)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests that never answer")
+    parser.add_argument("--no-info-rate", type=float, default=0.0,
+                        help="share of replies saying \"I don't have information\"")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the fault injection")
+    parser.add_argument("--load-seconds", type=float, default=0.0,
+                        help="model load time when the model is not loaded (keep_alive expired)")
+    parser.add_argument("--prefill-rate", type=float, default=0.0,
+                        help="prompt tokens processed per second (0 = only --first-token-delay)")
+    args = parser.parse_args()
+    config.update(
+        model=args.model.split(",")[0],
+        models=args.model.split(","),
+        tokens=args.tokens,
+        token_delay=1.0 / args.token_rate if args.token_rate else args.token_delay,
+        first_token_delay=args.first_token_delay,
+        error_rate=args.error_rate,
+        hang_rate=args.hang_rate,
+        no_info_rate=args.no_info_rate,
+        seed=args.seed,
+        load_seconds=args.load_seconds,
+        prefill_rate=args.prefill_rate,
+    )
+    _rng.seed(args.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1284 @@
+"""
+Shared chat backend for the personas in personas.py. create_app() builds the FastAPI
+app; the entry points only pick the personas:
+
+    uvicorn server:app --port 8001            # all personas (/chat, /aasho_chat, ...)
+    uvicorn main_ollama:app --port 8001       # Ahmed only
+    python aashu_ollama.py                    # Aasho only, port 8002
+
+Each persona gets its own chat, streaming, voice and WebSocket routes. KB indexes, the Ollama client,
+conversation sessions and the response cache are shared.
+"""
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request, Response, WebSocket
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel
+import asyncio
+import base64
+import hmac
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+from admission import AdmissionController, AdmissionRejected
+from circuit_breaker import CLOSED, CircuitBreaker
+from conversation_log import ConversationLog
+from history_compactor import HistoryCompactor
+from kb_manager import KBManager, KnowledgeBaseUnavailable
+from kb_prompt import log_prompt_stats, with_kb_context
+from keyword_router import KeywordRouter
+from metrics import (CACHE_LOOKUPS, FALLBACKS, KB_RACES, REGISTRY, ACTIVE_SESSIONS, RequestIdMiddleware, RequestTrace,
+                     on_turn_finished, request_id_var)
+from response_cache import ResponseCache, cache_bypassed
+from ollama_client import is_connect_error, is_timeout_error
+from ollama_pool import OllamaPool
+from personas import KB_FILES, Persona
+from session_store import create_session_store
+from sentence_stream import SentenceChunker, aiter_ollama_deltas, ndjson_event
+from tokens import estimate_message_tokens
+from tts import TTSService
+from warmup import PrefixWarmer
+import batch
+import voice_session
+from voice_session import VoiceSession
+
+# Load environment variables from .env file
+load_dotenv()
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Folder with the knowledge base files (default: the Backend folder)
+KB_DIR = os.getenv("KB_DIR") or BACKEND_DIR
+
+# Knowledge bases used by the served personas (model doesn't have this, so we inject it).
+# Loaded in the background at startup (from the saved index artifacts when the files did
+# not change; GET /readyz says when it is done), reloaded when a file changes
+# (KB_WATCH_INTERVAL) or on POST /admin/reload_kb - no restart needed.
+knowledge = KBManager.from_env()
+
+# How the KB reaches the model:
+#   "retrieval" (default): short persona prompt + only the top KB sections for the current turn
+#   "full": the whole KB inside the system prompt (old behaviour; can overflow num_ctx)
+KB_PROMPT_MODE = os.getenv("KB_PROMPT_MODE", "retrieval").strip().lower()
+KB_TOP_K = int(os.getenv("KB_TOP_K", "4"))                     # max KB sections per turn
+KB_CONTEXT_TOKENS = int(os.getenv("KB_CONTEXT_TOKENS", "600"))  # token budget for retrieved sections
+KB_MIN_SCORE = float(os.getenv("KB_MIN_SCORE", "1.0"))          # BM25 score below this is not relevant
+
+# Token budget for conversation turns; 0 = what is left of the persona's num_ctx after
+# the system prompt, retrieved KB sections and the reply (num_predict)
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "0"))
+
+# Ollama configuration (several servers: comma-separated URLs, see ollama_pool.py)
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:1b")  # Faster model; use llama3.2 for better quality
+
+# One pooled keep-alive client per Ollama server, shared by all requests (limits/timeouts
+# from OLLAMA_* env vars). Conversations stick to one server; health checked in the background.
+ollama = OllamaPool.from_env(OLLAMA_BASE_URL)
+
+# Admission in front of Ollama: per-model concurrency limit, bounded fair queue,
+# 429/503 + Retry-After when busy (OLLAMA_MAX_CONCURRENT per server, ADMISSION_* env vars)
+admission = AdmissionController.from_env(len(ollama.nodes))
+
+# Keeps each persona's model loaded (keep_alive) and its system prompt in Ollama's prompt
+# cache, primed at startup and after KB reloads (OLLAMA_KEEP_ALIVE, OLLAMA_WARMUP)
+warmer = PrefixWarmer.from_env(ollama, admission.acquire, admission.release)
+ollama.on_node_up(lambda node: warmer.rewarm())
+
+# Stops calling Ollama while it is down or too slow; meanwhile KB questions are answered
+# from the knowledge base and others get a short "try again" reply (BREAKER_* env vars)
+breaker = CircuitBreaker.from_env()
+
+# Conversation history per persona + user (SESSION_BACKEND: memory, or sqlite/redis so
+# several uvicorn workers share it). Limits from SESSION_* env vars; each persona's
+# system prompt is stored once.
+sessions = create_session_store()
+
+# Older turns over the history budget are left out of the prompt and folded into a
+# rolling per-session summary in the background (HISTORY_* env vars)
+SUMMARY_PROMPT = (
+    "You keep a short running summary of a chat between a user and an assistant. "
+    "Merge the previous summary with the new messages. Keep names, facts the user shared about "
+    "themselves, what they asked for and anything still open. At most {words} words, plain text, no preamble."
+)
+
+
+async def _summarize_history(persona_key: str, previous: str, turns: list) -> str:
+    """Rolling summary for the history compactor; queued for Ollama like a chat turn."""
+    persona = _served[persona_key]
+    model = _model(persona)
+    transcript = "\n".join(
+        f"{t['role']}: {t['content'].removesuffix(persona.user_suffix)[:600]}" for t in turns
+    )
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=compactor.summary_tokens * 3 // 4)},
+            {"role": "user", "content": f"Previous summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+        ],
+        "stream": False,
+        "options": {
+            "temperature": 0.2,
+            "num_predict": compactor.summary_tokens,
+            "num_ctx": persona.options.get("num_ctx", 2048),
+        },
+        "keep_alive": warmer.keep_alive,
+    }
+    if breaker.state != CLOSED:
+        return ""  # Ollama is down; tried again on a later turn
+    try:
+        await admission.acquire(model, "__history_summary__")
+    except AdmissionRejected:
+        return ""  # Ollama is busy with chats; tried again on a later turn
+    started = time.monotonic()
+    try:
+        response = await ollama.chat(payload)
+    finally:
+        admission.release(model, "__history_summary__", time.monotonic() - started)
+    if response.status_code != 200:
+        raise RuntimeError(f"Ollama API error: {response.status_code}")
+    return response.json().get("message", {}).get("content", "")
+
+
+compactor = HistoryCompactor.from_env(sessions, _summarize_history)
+
+# Replies to first-turn / KB-routed questions, reused for repeated questions
+# (RESPONSE_CACHE_* env vars). Cleared by _on_kb_reload when a KB file changes.
+response_cache = ResponseCache.from_env()
+
+# Every finished turn (persona, model, latency, tokens, KB fallback, text and reply) is
+# appended to compressed log segments by a background thread (CONVERSATION_LOG_*);
+# read them with `python conversation_log.py`
+conversation_log = ConversationLog.from_env()
+
+# KB-routed questions on the streaming routes: the KB answer is looked up while the model
+# runs, and sent instead if the model has no sentence ready after KB_RACE_DEADLINE seconds
+# (0 = off, always wait for the model). KB_RACE_LATE_ANSWER: what happens to the model's
+# late answer - "cancel" (stop it, frees the Ollama slot) or "cache" (let it finish and
+# keep it in the response cache for the next time the question is asked).
+KB_RACE_DEADLINE = float(os.getenv("KB_RACE_DEADLINE", "0"))
+KB_RACE_LATE_ANSWER = os.getenv("KB_RACE_LATE_ANSWER", "cancel").strip().lower()
+_late_answers = set()   # background tasks finishing late model answers ("cache")
+
+# Optional server-side speech for the <chat_route>_voice routes and POST /tts
+# (TTS_ENGINE / TTS_VOICE; off when no engine is installed)
+tts = TTSService.from_env()
+
+# Phrases that indicate model has no information
+NO_KNOWLEDGE_PHRASES = (
+    "i don't have", "i don't know", "i couldn't find", "i cannot find", "i do not have",
+    "i'm not sure", "i am not sure", "i don't have information", "i have no information",
+    "i couldn't find information", "i don't have access", "i don't have any information",
+    "no information", "don't have details", "couldn't find any", "not in my knowledge",
+    "outside my knowledge", "limited knowledge", "don't have specific"
+)
+
+# Reply while the circuit breaker is open and the question is not answered by a KB
+DEGRADED_REPLY = "😴 {name} can't think right now (the AI model is not responding). Please try again in {seconds} seconds."
+KB_UNAVAILABLE_REPLY = "⚠️ The knowledge base could not be loaded. Please try again later."
+
+# Personas served by this process (key -> Persona), filled by create_app()
+_served = {}
+# Liveness (GET /healthz) vs readiness (GET /readyz): ready once the KB is loaded, until shutdown
+_lifecycle = {"imported_at": time.perf_counter(), "stopping": False}
+
+
+# Request model
+class Message(BaseModel):
+    text: str
+    user_id: str = "default_user"
+
+
+class SpeakRequest(BaseModel):
+    text: str
+
+
+_no_knowledge = KeywordRouter({"no_knowledge": NO_KNOWLEDGE_PHRASES})
+
+
+def _reply_indicates_no_knowledge(reply: str) -> bool:
+    """Check if model's reply says it doesn't have information."""
+    return _no_knowledge.matches(reply)
+
+
+def _on_kb_reload(kbs: dict):
+    """Rebuild the system prompts from the new KB, drop replies based on the old one and re-prime Ollama."""
+    targets = []
+    for persona in _served.values():
+        system_prompt = persona.build_system_prompt(kbs, KB_PROMPT_MODE)
+        sessions.register_persona(persona.key, system_prompt)
+        # Same system message as every turn sends first (session_store), so the prefix matches
+        targets.append((persona.key, _model(persona), {"role": "system", "content": system_prompt},
+                        _ctx_options(persona)))
+    response_cache.clear()
+    warmer.schedule(targets)
+
+
+knowledge.on_reload(_on_kb_reload)
+
+
+def _log_turn(trace: RequestTrace, outcome: str, seconds: float):
+    persona = _served.get(trace.persona)
+    conversation_log.record({
+        "ts": round(time.time(), 3),
+        "request_id": trace.request_id,
+        "persona": trace.persona,
+        "route": trace.route,
+        "user_id": trace.user_id,
+        "model": trace.model or (_model(persona) if persona else ""),
+        "outcome": outcome,
+        "fallback": trace.fallback,
+        "latency_ms": round(seconds * 1000),
+        "ollama_ms": round(trace.stages.get("ollama", 0.0) * 1000),
+        "prompt_tokens": trace.prompt_tokens,
+        "completion_tokens": trace.completion_tokens,
+        "kb_sections": trace.kb_sections,
+        "text": trace.text,
+        "reply": trace.reply,
+    })
+
+
+on_turn_finished(_log_turn)
+
+
+def _model(persona: Persona) -> str:
+    return persona.model or OLLAMA_MODEL
+
+
+def _sticky_key(persona: Persona, user_id: str) -> str:
+    """One conversation stays on one Ollama server, where its prompt prefix is cached."""
+    return f"{persona.key}:{user_id}"
+
+
+def _ctx_options(persona: Persona) -> dict:
+    """Options that must match between requests, or Ollama reloads the model (and loses its prompt cache)."""
+    return {"num_ctx": persona.options.get("num_ctx", 2048)}
+
+
+def _history_budget(persona: Persona, system_message: dict) -> int:
+    """Tokens available for conversation turns (see HISTORY_MAX_TOKENS)."""
+    if HISTORY_MAX_TOKENS:
+        return HISTORY_MAX_TOKENS
+    reserved = estimate_message_tokens([system_message]) + persona.options.get("num_predict", 256) + 32
+    if KB_PROMPT_MODE != "full":
+        reserved += KB_CONTEXT_TOKENS
+    return persona.options.get("num_ctx", 2048) - reserved
+
+
+async def _build_messages(persona: Persona, user_id: str, query: str, kbs: dict, trace: RequestTrace) -> tuple:
+    """
+    Messages to send for this turn: (messages, number of retrieved KB sections,
+    prompt tokens the turn would have had without history compaction).
+    """
+    with trace.span("history"):
+        stored = await sessions.messages(persona.key, user_id)
+        trace.first_turn = len(stored) == 2   # system prompt + this user message
+        # Fold older turns before the session store drops them (SESSION_MAX_TURNS)
+        max_messages = max(compactor.keep_recent, sessions.max_turns - 4)
+        messages = await compactor.compact(persona.key, user_id, stored, _history_budget(persona, stored[0]), max_messages)
+        compacted_away = estimate_message_tokens(stored) - estimate_message_tokens(messages)
+    kb_sections = 0
+    if KB_PROMPT_MODE != "full":
+        with trace.span("kb_search"):
+            messages, kb_sections = with_kb_context(
+                messages, kbs[persona.context_kb].index, query, persona.context_title,
+                top_k=KB_TOP_K, max_tokens=KB_CONTEXT_TOKENS, min_score=KB_MIN_SCORE,
+            )
+    trace.kb_sections = kb_sections
+    return messages, kb_sections, estimate_message_tokens(messages) + compacted_away
+
+
+def _build_payload(persona: Persona, messages: list, stream: bool = False) -> dict:
+    """
+    Ollama /api/chat payload for this turn. messages always start with the persona's
+    system prompt, unchanged, so Ollama can reuse its cached prefix (see warmup.py).
+    """
+    return {
+        "model": _model(persona),
+        "messages": messages,
+        "stream": stream,
+        "options": dict(persona.options),
+        "keep_alive": warmer.keep_alive,
+    }
+
+
+def _error_reply(error: Exception) -> str:
+    """User-facing message for a failed Ollama call."""
+    if is_connect_error(error):
+        error_msg = f"Cannot connect to Ollama at {OLLAMA_BASE_URL}. Is Ollama running?"
+        print(f"❌ {error_msg}")
+        return f"❌ {error_msg}\n\nPlease:\n1. Install Ollama from https://ollama.com\n2. Run: ollama pull {OLLAMA_MODEL}\n3. Make sure Ollama is running"
+    if is_timeout_error(error):
+        error_msg = "Ollama request timed out. The model might be too slow."
+        print(f"❌ {error_msg}")
+        return f"⏳ {error_msg}\n\n1. Run: ollama pull llama3.2:1b\n2. In Backend folder create .env with: OLLAMA_MODEL=llama3.2:1b\n3. Restart backend (Ctrl+C then run uvicorn again)"
+    print(f"❌ Ollama Error: {error}")
+    return f"❌ Error: {error}"
+
+
+def _error_class(error: Exception) -> str:
+    """Label for qyrix_errors_total."""
+    if is_connect_error(error):
+        return "connect"
+    if is_timeout_error(error):
+        return "timeout"
+    return type(error).__name__
+
+
+def _status_error_reply(response) -> str:
+    error_msg = f"Ollama API error: {response.status_code} - {response.text}"
+    print(f"❌ {error_msg}")
+    return f"❌ Error connecting to Ollama. Please make sure Ollama is running on {OLLAMA_BASE_URL}"
+
+
+def _admission_user(user_id: str, conn) -> str:
+    """
+    Whose share of Ollama a request uses (admission control's per-user cap and round-robin).
+    Clients that send no user_id all get "default_user", which is not one user: those are
+    told apart by address instead.
+    """
+    if user_id == "default_user" and conn.client is not None:
+        return f"default_user@{conn.client.host}"
+    return user_id
+
+
+def _tts_unavailable() -> JSONResponse:
+    """503 of the _voice routes and /tts without a TTS engine; "error" tells clients to use their own voice."""
+    return JSONResponse({"detail": "Server-side TTS is not available (TTS_ENGINE)", "error": "tts_unavailable"},
+                        status_code=503)
+
+
+def _busy_response(error: AdmissionRejected, cache_status: str) -> JSONResponse:
+    print(f"⏳ Request not admitted ({error.reason}), retry after {error.retry_after}s")
+    return JSONResponse(
+        {"reply": error.reply, "error": error.reason},
+        status_code=error.status_code,
+        headers={"Retry-After": str(error.retry_after), "X-Cache": cache_status},
+    )
+
+
+async def _check_cache(persona: Persona, user_id: str, text: str, headers, trace: RequestTrace,
+                       routes: list, stateless: bool = False) -> tuple:
+    """
+    Look up the response cache for first-turn or KB-routed questions (call before the
+    user message is added to the session). Returns (X-Cache status, cached reply or None).
+    stateless=True: a question without a session (batch), always looked up.
+    """
+    first_turn = stateless
+    if not routes and not stateless:
+        with trace.span("session_init"):
+            first_turn = not await sessions.turns(persona.key, user_id)
+    if not (routes or first_turn):
+        status, reply = "SKIP", None
+    elif cache_bypassed(headers):
+        response_cache.record_bypass()
+        status, reply = "BYPASS", None
+    else:
+        reply = response_cache.get(persona.key, _model(persona), text)
+        status = "HIT" if reply is not None else "MISS"
+    CACHE_LOOKUPS.inc(persona=persona.key, result=status)
+    return status, reply
+
+
+def _fallback(persona: Persona, text: str, kbs: dict, trace: RequestTrace, routes: list) -> str:
+    """persona.fallback_reply, timed and counted."""
+    with trace.span("fallback"):
+        reply = persona.fallback_reply(text, kbs, routes)
+    if reply:
+        FALLBACKS.inc(persona=persona.key)
+        trace.fallback = True
+    return reply
+
+
+def _degraded_reply(persona: Persona, text: str, kbs: dict, trace: RequestTrace, routes: list) -> tuple:
+    """Answer without Ollama while the breaker is open: (reply, True if it came from a KB)."""
+    kb_reply = _fallback(persona, text, kbs, trace, routes) if routes else ""
+    if kb_reply:
+        return kb_reply, True
+    return DEGRADED_REPLY.format(name=persona.name, seconds=breaker.retry_after), False
+
+
+async def _answer_stateless(persona: Persona, text: str, headers, batch_user: str) -> dict:
+    """
+    One batch question, answered like the first turn of a new session (cache, KB context,
+    breaker, KB fallback) without reading or writing the session store.
+    batch_user queues the whole batch as one user in admission control.
+    """
+    trace = RequestTrace(persona.key, persona.batch_route, batch_user, text)
+    kbs = await knowledge.ready_snapshot()
+    with trace.span("kb_routing"):
+        routes = persona.match_routes(text)
+    cache_status, cached_reply = await _check_cache(persona, batch_user, text, headers, trace, routes, stateless=True)
+    if cached_reply is not None:
+        trace.finish("cached", cached_reply)
+        return {"reply": cached_reply, "fallback": False, "outcome": "cached"}
+    if not breaker.allow():
+        reply, from_kb = _degraded_reply(persona, text, kbs, trace, routes)
+        trace.finish("degraded", reply)
+        return {"reply": reply, "fallback": from_kb, "outcome": "degraded"}
+
+    model = _model(persona)
+    with trace.span("admission_wait"):
+        while True:
+            try:
+                await admission.acquire(model, batch_user)
+                break
+            except AdmissionRejected as e:
+                # Offline work: wait for room instead of failing the question
+                await asyncio.sleep(e.retry_after)
+    started = time.monotonic()
+    try:
+        messages = [{"role": "system", "content": sessions.system_prompts[persona.key]},
+                    {"role": "user", "content": text.strip() + persona.user_suffix}]
+        kb_sections = 0
+        if KB_PROMPT_MODE != "full":
+            with trace.span("kb_search"):
+                messages, kb_sections = with_kb_context(
+                    messages, kbs[persona.context_kb].index, text, persona.context_title,
+                    top_k=KB_TOP_K, max_tokens=KB_CONTEXT_TOKENS, min_score=KB_MIN_SCORE,
+                )
+            trace.kb_sections = kb_sections
+        with trace.span("ollama"):
+            sent = time.perf_counter()
+            response = await ollama.chat(_build_payload(persona, messages))
+        _record_ollama_status(response, time.perf_counter() - sent)
+    except Exception as e:
+        _record_ollama_error(e)
+        trace.error(_error_class(e))
+        kb_reply = _fallback(persona, text, kbs, trace, routes)
+        trace.finish("error", kb_reply)
+        if not kb_reply:
+            raise
+        return {"reply": kb_reply, "fallback": True, "outcome": "error"}
+    finally:
+        admission.release(model, batch_user, time.monotonic() - started)
+
+    if response.status_code != 200:
+        trace.error(f"http_{response.status_code}")
+        kb_reply = _fallback(persona, text, kbs, trace, routes)
+        trace.finish("error", kb_reply)
+        if not kb_reply:
+            raise RuntimeError(f"Ollama API error: {response.status_code}")
+        return {"reply": kb_reply, "fallback": True, "outcome": "error"}
+    data = response.json()
+    trace.ollama_stats(model, data)
+    log_prompt_stats(f"{persona.name} [{trace.request_id} batch]", messages, kb_sections, data)
+    reply = data.get("message", {}).get("content", f"Sorry, {persona.name} did not respond.")
+    outcome = "ok"
+    if _reply_indicates_no_knowledge(reply):
+        kb_reply = _fallback(persona, text, kbs, trace, routes)
+        if kb_reply:
+            reply, outcome = kb_reply, "fallback"
+    if cache_status in ("MISS", "BYPASS"):
+        response_cache.put(persona.key, model, text, reply)
+    trace.finish(outcome, reply)
+    return {"reply": reply, "fallback": outcome == "fallback", "outcome": outcome}
+
+
+async def _record_interrupted(persona: Persona, user_id: str, said: list, trace: RequestTrace):
+    """
+    A streamed reply was cancelled (WebSocket barge-in) or the client went away: keep the
+    sentences that were sent, so the history has no user turn without an answer.
+    """
+    reply = " ".join(said)
+    with trace.span("history_append"):
+        await sessions.append(persona.key, user_id, "assistant", f"{reply} …" if reply else "…")
+    trace.finish("cancelled", reply)
+
+
+async def _record_failed_reply(persona: Persona, user_id: str, trace: RequestTrace, kb_reply: str, said: list = ()):
+    """
+    The model call failed after the user turn was stored: keep the KB answer the client got
+    instead, or what was said before the failure (as for an interrupted reply), so the
+    history has no user turn without an answer.
+    """
+    partial = " ".join(said)
+    with trace.span("history_append"):
+        await sessions.append(persona.key, user_id, "assistant", kb_reply or (f"{partial} …" if partial else "…"))
+
+
+def _record_ollama_error(error: Exception):
+    """Connection failures and timeouts count against the circuit breaker."""
+    if is_connect_error(error) or is_timeout_error(error):
+        breaker.record_failure(_error_class(error))
+
+
+def _record_ollama_status(response, latency: float):
+    """
+    Breaker bookkeeping for an Ollama call; latency = seconds since it was sent. For a
+    complete (non-streamed) reply the generation time Ollama reports is taken off, so only
+    the wait until it started answering counts against BREAKER_LATENCY_SLO.
+    """
+    if response.status_code >= 500:
+        breaker.record_failure(f"HTTP {response.status_code}")
+        return
+    if response.status_code == 200:
+        try:
+            latency -= response.json().get("eval_duration", 0) / 1e9
+        except (ValueError, AttributeError):
+            pass
+    breaker.record_success(max(latency, 0.0))
+
+
+def _sentence_events(text: str) -> list:
+    """Sentence events for a reply that is already complete (cache / KB answers)."""
+    chunker = SentenceChunker()
+    return [{"type": "sentence", "text": s} for s in chunker.feed(text) + [chunker.flush()] if s]
+
+
+async def _replay(text: str, done: dict):
+    for event in _sentence_events(text):
+        yield event
+    yield done
+
+
+class _KBRace:
+    """The KB answer racing the model for one streamed turn (KB_RACE_DEADLINE)."""
+
+    def __init__(self, persona: Persona, query: str, kbs: dict, routes: list):
+        self.persona = persona
+        self.started = time.monotonic()
+        # BM25 search in a worker thread, while the model call starts
+        self.search = asyncio.ensure_future(asyncio.to_thread(persona.fallback_reply, query, kbs, routes))
+        self.reply = ""
+        self.lost = False   # model missed the deadline; the KB answer was sent instead
+
+    def time_left(self) -> float:
+        return max(0.0, KB_RACE_DEADLINE - (time.monotonic() - self.started))
+
+    async def kb_reply(self) -> str:
+        answer = await self.search
+        self.reply = self.persona.race_reply(answer) if answer else ""
+        return self.reply
+
+
+async def _race_kb(events, race: _KBRace, persona: Persona, user_id: str, trace: RequestTrace, add_user_turn):
+    """
+    The model's events if its first sentence (or error) arrives within the deadline,
+    otherwise the KB answer. The model's turn then stops (or, with
+    KB_RACE_LATE_ANSWER=cache, finishes in the background and only fills the response
+    cache); the history gets the KB answer.
+    """
+    buffered = []   # token events before the first sentence
+
+    async def first_sentence():
+        async for event in events:
+            buffered.append(event)
+            if event["type"] != "token":
+                return
+
+    waiter = asyncio.ensure_future(first_sentence())
+    try:
+        await asyncio.wait([waiter], timeout=race.time_left())
+        if waiter.done() or not await race.kb_reply():
+            # In time (or the KB has nothing to say): the model's reply goes out as usual
+            KB_RACES.inc(persona=persona.key, winner="model" if waiter.done() else "no_kb_answer")
+            await waiter
+            for event in buffered:
+                yield event
+            async for event in events:
+                yield event
+            return
+
+        race.lost = True
+        KB_RACES.inc(persona=persona.key, winner="kb")
+        if KB_RACE_LATE_ANSWER == "cache":
+            task = asyncio.create_task(_finish_late_answer(waiter, events))
+            _late_answers.add(task)
+            task.add_done_callback(_late_answers.discard)
+        else:
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        with trace.span("history_append"):
+            await add_user_turn()
+            await sessions.append(persona.key, user_id, "assistant", race.reply)
+        trace.finish("kb_race", race.reply)
+        for event in _sentence_events(race.reply):
+            yield event
+        yield {"type": "done", "reply": race.reply, "fallback": False, "kb_race": True}
+    finally:
+        race.search.cancel()
+        if not race.lost and not waiter.done():
+            waiter.cancel()   # client went away while waiting: the turn is interrupted
+            await asyncio.gather(waiter, return_exceptions=True)
+        if not (race.lost and KB_RACE_LATE_ANSWER == "cache"):
+            await events.aclose()
+
+
+async def _finish_late_answer(waiter: asyncio.Future, events):
+    """Let a model turn that lost the race run to the end (it stores its reply in the cache)."""
+    try:
+        await waiter
+        async for _ in events:
+            pass
+    except Exception as e:
+        print(f"❌ Late model answer failed: {e}")
+    finally:
+        await events.aclose()
+
+
+def _kb_race_stats() -> dict:
+    model, kb = KB_RACES.total(winner="model"), KB_RACES.total(winner="kb")
+    return {
+        "deadline_s": KB_RACE_DEADLINE,
+        "late_answer": KB_RACE_LATE_ANSWER,
+        "model_wins": model,
+        "kb_wins": kb,
+        "no_kb_answer": KB_RACES.total(winner="no_kb_answer"),
+        "kb_win_rate": round(kb / (model + kb), 3) if model + kb else 0.0,
+        "late_answers_running": len(_late_answers),
+    }
+
+
+async def _ndjson(events):
+    async for event in events:
+        yield ndjson_event(event)
+
+
+def _audio_event(index: int, text: str, synthesis: asyncio.Task) -> dict:
+    error = synthesis.exception()
+    if error is not None:
+        print(f"❌ TTS failed: {error}")
+        return {"type": "audio", "index": index, "text": text, "error": str(error) or type(error).__name__}
+    data, duration = synthesis.result()
+    return {"type": "audio", "index": index, "text": text, "format": "wav", "duration_ms": round(duration * 1000),
+            "audio": base64.b64encode(data).decode("ascii")}
+
+
+async def _with_audio(events):
+    """
+    Chat stream events plus an "audio" event per sentence. Sentences go to the TTS worker
+    pool as they arrive and their audio is sent in order as soon as it is ready, while
+    the model keeps generating. If the reply is replaced by a KB answer, the audio so
+    far is dropped ("audio_reset") and the KB answer is spoken instead.
+    """
+    out = asyncio.Queue()
+    order = asyncio.Queue()      # (index, text, synthesis task) or "reset", None = end
+
+    async def read_events():
+        try:
+            async for event in events:
+                await out.put(("event", event))
+        finally:
+            await out.put(("end", "text"))
+
+    async def send_audio():
+        try:
+            while (item := await order.get()) is not None:
+                if item == "reset":
+                    await out.put(("event", {"type": "audio_reset"}))
+                    continue
+                await asyncio.wait([item[2]])
+                if not item[2].cancelled():   # cancelled = replaced by a KB answer
+                    await out.put(("event", _audio_event(*item)))
+        finally:
+            await out.put(("end", "audio"))
+
+    def speak(text: str):
+        index = speak.count
+        speak.count += 1
+        item = (index, text, asyncio.ensure_future(tts.synthesize(text)))
+        queued.append(item)
+        order.put_nowait(item)
+
+    speak.count = 0
+    queued = []
+    reader = asyncio.create_task(read_events())
+    sender = asyncio.create_task(send_audio())
+    try:
+        while True:
+            kind, event = await out.get()
+            if kind == "end":
+                if event == "audio":
+                    break
+                order.put_nowait(None)   # all text is in; send the remaining audio, then stop
+                continue
+            yield event
+            if event["type"] == "sentence":
+                speak(event["text"])
+            elif event["type"] in ("done", "error") and event.get("fallback") and not event.get("degraded"):
+                for _, _, task in queued:
+                    task.cancel()
+                queued.clear()
+                order.put_nowait("reset")
+                for sentence in _sentence_events(event["reply"]):
+                    speak(sentence["text"])
+    finally:
+        for task in [reader, sender] + [task for _, _, task in queued]:
+            task.cancel()
+        await asyncio.gather(reader, sender, return_exceptions=True)
+        await events.aclose()
+
+
+def _is_ready() -> bool:
+    return knowledge.ready and not _lifecycle["stopping"]
+
+
+def _collect_metrics() -> list:
+    """Gauges and component counters for GET /metrics, read from the same stats() as GET /."""
+    session_stats = sessions.stats()
+    admission_stats = admission.stats()
+    cache_stats = response_cache.stats()
+    kb_stats = knowledge.stats()
+    history_stats = compactor.stats()
+    breaker_stats = breaker.stats()
+    tts_stats = tts.stats()
+    voice_stats = voice_session.stats()
+    pool_stats = ollama.stats()
+    log_stats = conversation_log.stats()
+    families = [
+        ("qyrix_ready", "gauge", "Backend is ready for traffic (1): knowledge base loaded, not shutting down",
+         [({}, int(_is_ready()))]),
+        ("qyrix_active_sessions", "gauge", "Sessions that chatted in the last 5 minutes",
+         [({}, ACTIVE_SESSIONS.count())]),
+        ("qyrix_admission_queue_depth", "gauge", "Requests waiting for an Ollama slot",
+         [({}, admission_stats["queue_depth"])]),
+        ("qyrix_admission_active", "gauge", "Ollama generations running per model",
+         [({"model": m}, q["active"]) for m, q in admission_stats["models"].items()]),
+        ("qyrix_admission_limit", "gauge", "Parallel Ollama generations allowed per model",
+         [({"model": m}, q["limit"]) for m, q in admission_stats["models"].items()]),
+        ("qyrix_admission_rejected_total", "counter", "Requests turned away by admission control",
+         [({"reason": "queue_full"}, admission_stats["rejected_queue_full"]),
+          ({"reason": "user_limit"}, admission_stats["rejected_user_limit"]),
+          ({"reason": "queue_timeout"}, admission_stats["queue_timeouts"])]),
+        ("qyrix_ollama_circuit_state", "gauge", "Ollama circuit breaker state (1 = current state)",
+         [({"state": state}, int(breaker.state == state)) for state in ("closed", "half_open", "open")]),
+        ("qyrix_ollama_circuit_opened_total", "counter", "Times the Ollama circuit breaker opened",
+         [({}, breaker_stats["opened"])]),
+        ("qyrix_ollama_circuit_short_circuited_total", "counter", "Requests answered without Ollama "
+         "because the circuit breaker was open", [({}, breaker_stats["short_circuited"])]),
+        ("qyrix_ollama_node_up", "gauge", "Ollama server answered its last health check (1) or not (0)",
+         [({"node": url}, int(node["healthy"])) for url, node in pool_stats["nodes"].items()]),
+        ("qyrix_ollama_node_outstanding", "gauge", "Requests in flight per Ollama server",
+         [({"node": url}, node["outstanding"]) for url, node in pool_stats["nodes"].items()]),
+        ("qyrix_ollama_node_requests_total", "counter", "Requests sent per Ollama server",
+         [({"node": url}, node["requests"]) for url, node in pool_stats["nodes"].items()]),
+        ("qyrix_ollama_failovers_total", "counter", "Requests retried on another Ollama server after a "
+         "connection failure", [({}, pool_stats["failovers"])]),
+        ("qyrix_response_cache_entries", "gauge", "Replies in the response cache",
+         [({}, cache_stats["entries"])]),
+        ("qyrix_kb_reloads_total", "counter", "Knowledge base reloads",
+         [({"result": "ok"}, kb_stats["reloads"]), ({"result": "error"}, kb_stats["reload_errors"])]),
+        ("qyrix_tts_sentences_total", "counter", "Sentences spoken by the server-side TTS",
+         [({"source": "synthesized"}, tts_stats["synthesized"]), ({"source": "cache"}, tts_stats["cache_hits"])]),
+        ("qyrix_kb_race_deadline_seconds", "gauge", "KB_RACE_DEADLINE (0 = KB racing off)",
+         [({}, KB_RACE_DEADLINE)]),
+        ("qyrix_voice_sessions", "gauge", "Open WebSocket voice sessions",
+         [({}, voice_stats["open"])]),
+        ("qyrix_voice_sessions_closed_total", "counter", "WebSocket voice sessions closed by the server",
+         [({"reason": "idle"}, voice_stats["closed_idle"]), ({"reason": "no_heartbeat"}, voice_stats["closed_no_heartbeat"]),
+          ({"reason": "replaced"}, voice_stats["replaced"])]),
+        ("qyrix_voice_replies_cancelled_total", "counter", "Replies cancelled over WebSocket (barge-in)",
+         [({}, voice_stats["cancelled"])]),
+        ("qyrix_conversation_log_turns_total", "counter", "Turns written to the conversation log, or dropped "
+         "because its queue was full", [({"result": "written"}, log_stats["written"]),
+                                        ({"result": "dropped"}, log_stats["dropped"])]),
+        ("qyrix_conversation_log_queued", "gauge", "Turns waiting for the conversation log writer",
+         [({}, log_stats["queued"])]),
+        ("qyrix_history_summaries_total", "counter", "Rolling conversation summaries written, or dropped "
+         "because they no longer matched the history", [({"result": "made"}, history_stats["summaries_made"]),
+                                                        ({"result": "dropped"}, history_stats["summaries_dropped"])]),
+    ]
+    if "sessions" in session_stats:
+        families.append(("qyrix_stored_sessions", "gauge", "Sessions in the session store",
+                         [({"backend": session_stats["backend"]}, session_stats["sessions"])]))
+    return families
+
+
+REGISTRY.add_collector(_collect_metrics)
+
+
+def _add_persona_routes(app: FastAPI, persona: Persona):
+    """POST <chat_route> and <chat_route>_stream for one persona."""
+
+    async def chat(msg: Message, request: Request, http_response: Response):
+        user_id = msg.user_id or "default_user"
+        trace = RequestTrace(persona.key, persona.chat_route, user_id, msg.text)
+        kbs = await knowledge.ready_snapshot()  # same KB version for the whole request, even if it is reloaded meanwhile
+        with trace.span("kb_routing"):
+            routes = persona.match_routes(msg.text)  # once per turn, reused by the fallback
+        cache_status, cached_reply = await _check_cache(persona, user_id, msg.text, request.headers, trace, routes)
+        http_response.headers["X-Cache"] = cache_status
+        user_content = msg.text.strip() + persona.user_suffix
+
+        if cached_reply is not None:
+            with trace.span("history_append"):
+                await sessions.append(persona.key, user_id, "user", user_content)
+                await sessions.append(persona.key, user_id, "assistant", cached_reply)
+            trace.finish("cached", cached_reply)
+            return {"reply": cached_reply}
+
+        # Ollama is down: answer right away from the KB (or ask to try again later)
+        if not breaker.allow():
+            reply, from_kb = _degraded_reply(persona, msg.text, kbs, trace, routes)
+            if from_kb:
+                with trace.span("history_append"):
+                    await sessions.append(persona.key, user_id, "user", user_content)
+                    await sessions.append(persona.key, user_id, "assistant", reply)
+            trace.finish("degraded", reply)
+            return {"reply": reply}
+
+        # Wait for a free Ollama slot (429/503 right away when too busy)
+        model = _model(persona)
+        admission_user = _admission_user(user_id, request)
+        try:
+            with trace.span("admission_wait"):
+                await admission.acquire(model, admission_user)
+        except AdmissionRejected as e:
+            trace.finish("busy")
+            return _busy_response(e, cache_status)
+        started = time.monotonic()
+
+        try:
+            with trace.span("session_init"):
+                await sessions.append(persona.key, user_id, "user", user_content)
+
+            # Call Ollama API
+            messages, kb_sections, tokens_before = await _build_messages(persona, user_id, msg.text, kbs, trace)
+            with trace.span("ollama"):
+                sent = time.perf_counter()
+                response = await ollama.chat(_build_payload(persona, messages), key=_sticky_key(persona, user_id))
+            _record_ollama_status(response, time.perf_counter() - sent)
+
+            if response.status_code == 200:
+                data = response.json()
+                trace.ollama_stats(model, data)
+                if trace.first_turn:
+                    warmer.record_first_turn(persona.key, data, messages)
+                log_prompt_stats(f"{persona.name} [{trace.request_id}]", messages, kb_sections, data, tokens_before)
+                reply_text = data.get("message", {}).get("content", f"Sorry, {persona.name} did not respond.")
+
+                # Fallback: if model says it doesn't have info and the question matches one
+                # of the persona's KB routes, get the answer from that knowledge base instead
+                outcome = "ok"
+                if _reply_indicates_no_knowledge(reply_text):
+                    kb_reply = _fallback(persona, msg.text, kbs, trace, routes)
+                    if kb_reply:
+                        reply_text = kb_reply
+                        outcome = "fallback"
+
+                # Save AI reply
+                with trace.span("history_append"):
+                    await sessions.append(persona.key, user_id, "assistant", reply_text)
+                if cache_status in ("MISS", "BYPASS"):
+                    response_cache.put(persona.key, model, msg.text, reply_text)
+
+                trace.finish(outcome, reply_text)
+                return {"reply": reply_text}
+            else:
+                trace.error(f"http_{response.status_code}")
+                kb_reply = _fallback(persona, msg.text, kbs, trace, routes)
+                await _record_failed_reply(persona, user_id, trace, kb_reply)
+                reply = kb_reply or _status_error_reply(response)
+                trace.finish("error", reply)
+                return {"reply": reply}
+
+        except Exception as e:
+            _record_ollama_error(e)
+            trace.error(_error_class(e))
+            kb_reply = _fallback(persona, msg.text, kbs, trace, routes)
+            await _record_failed_reply(persona, user_id, trace, kb_reply)
+            reply = kb_reply or _error_reply(e)
+            trace.finish("error", reply)
+            return {"reply": reply}
+        finally:
+            admission.release(model, admission_user, time.monotonic() - started)
+
+    async def stream_reply(msg: Message, conn, route: str, tokens: bool = False, precheck: bool = True):
+        """
+        Events of a streamed turn (dicts), or a Response if it is answered right away (busy;
+        precheck=False leaves that to the stream's own "error" event). tokens=True adds a
+        {"type": "token"} event per Ollama delta. conn: the Request or WebSocket.
+        """
+        headers = conn.headers
+        user_id = msg.user_id or "default_user"
+        admission_user = _admission_user(user_id, conn)
+        trace = RequestTrace(persona.key, route, user_id, msg.text)
+        kbs = await knowledge.ready_snapshot()
+        with trace.span("kb_routing"):
+            routes = persona.match_routes(msg.text)  # once per turn, reused by the fallback
+        cache_status, cached_reply = await _check_cache(persona, user_id, msg.text, headers, trace, routes)
+        model = _model(persona)
+        if cached_reply is None and not breaker.allow():
+            # Ollama is down: stream the KB answer (or "try again") right away
+            reply, from_kb = _degraded_reply(persona, msg.text, kbs, trace, routes)
+            if from_kb:
+                with trace.span("history_append"):
+                    await sessions.append(persona.key, user_id, "user", msg.text.strip() + persona.user_suffix)
+                    await sessions.append(persona.key, user_id, "assistant", reply)
+            trace.finish("degraded", reply)
+            return _replay(reply, {"type": "done", "reply": reply, "fallback": from_kb, "degraded": True}), cache_status
+        if cached_reply is None and precheck:
+            # Answer 429/503 before the stream starts if Ollama is too busy
+            try:
+                admission.check(model, admission_user)
+            except AdmissionRejected as e:
+                trace.finish("busy")
+                return _busy_response(e, cache_status), cache_status
+
+        user_turn_added = False
+
+        async def add_user_turn():
+            """The user turn goes into the history once it is answered or has an Ollama slot."""
+            nonlocal user_turn_added
+            if not user_turn_added:
+                user_turn_added = True
+                await sessions.append(persona.key, user_id, "user", msg.text.strip() + persona.user_suffix)
+
+        race = None
+        if cached_reply is None and routes and KB_RACE_DEADLINE > 0:
+            race = _KBRace(persona, msg.text, kbs, routes)
+
+        async def generate():
+            parts = []
+            said = []   # sentences yielded so far, kept in the history if the reply is cancelled
+            chunker = SentenceChunker()
+            if cached_reply is not None:
+                for event in _sentence_events(cached_reply):
+                    yield event
+                with trace.span("history_append"):
+                    await add_user_turn()
+                    await sessions.append(persona.key, user_id, "assistant", cached_reply)
+                trace.finish("cached", cached_reply)
+                yield {"type": "done", "reply": cached_reply, "fallback": False}
+                return
+            try:
+                with trace.span("admission_wait"):
+                    await admission.acquire(model, admission_user)
+            except AdmissionRejected as e:
+                trace.finish("busy")
+                yield {"type": "error", "reply": e.reply, "fallback": False, "retry_after": e.retry_after}
+                return
+            except asyncio.CancelledError:
+                if race is None or not race.lost:
+                    trace.finish("cancelled")   # nothing in the history yet
+                raise
+            started = time.monotonic()
+            try:
+                with trace.span("session_init"):
+                    await add_user_turn()
+                messages, kb_sections, tokens_before = await _build_messages(persona, user_id, msg.text, kbs, trace)
+                with trace.span("ollama"):
+                    sent = time.perf_counter()
+                    async with ollama.stream_chat(_build_payload(persona, messages, stream=True),
+                                                  key=_sticky_key(persona, user_id)) as response:
+                        if response.status_code != 200:
+                            await response.aread()
+                            _record_ollama_status(response, time.perf_counter() - sent)
+                            trace.error(f"http_{response.status_code}")
+                            kb_reply = _fallback(persona, msg.text, kbs, trace, routes)
+                            if race is None or not race.lost:
+                                await _record_failed_reply(persona, user_id, trace, kb_reply)
+                            reply = kb_reply or _status_error_reply(response)
+                            trace.finish("error", reply)
+                            yield {"type": "error", "reply": reply, "fallback": bool(kb_reply)}
+                            return
+                        async for delta, chunk in aiter_ollama_deltas(response):
+                            if not parts:
+                                trace.first_token(model, sent)
+                                breaker.record_success(time.perf_counter() - sent)
+                            if chunk.get("done"):
+                                trace.ollama_stats(model, chunk)
+                                if trace.first_turn:
+                                    warmer.record_first_turn(persona.key, chunk, messages)
+                                log_prompt_stats(f"{persona.name} [{trace.request_id}]", messages, kb_sections, chunk, tokens_before)
+                            parts.append(delta)
+                            if tokens and delta:
+                                yield {"type": "token", "text": delta}
+                            for sentence in chunker.feed(delta):
+                                said.append(sentence)
+                                yield {"type": "sentence", "text": sentence}
+                rest = chunker.flush()
+                if rest:
+                    said.append(rest)
+                    yield {"type": "sentence", "text": rest}
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cancelled or the client left: leaving `async with` above closed the Ollama
+                # stream, so the model stops generating and its slot is free right away
+                if race is None or not race.lost:
+                    await _record_interrupted(persona, user_id, said, trace)
+                raise
+            except Exception as e:
+                _record_ollama_error(e)
+                trace.error(_error_class(e))
+                kb_reply = _fallback(persona, msg.text, kbs, trace, routes)
+                if race is None or not race.lost:
+                    await _record_failed_reply(persona, user_id, trace, kb_reply, said)
+                reply = kb_reply or _error_reply(e)
+                trace.finish("error", reply)
+                yield {"type": "error", "reply": reply, "fallback": bool(kb_reply)}
+                return
+            finally:
+                admission.release(model, admission_user, time.monotonic() - started)
+
+            reply_text = "".join(parts).strip() or f"Sorry, {persona.name} did not respond."
+            if race is not None and race.lost:
+                # The KB answer went out instead (KB_RACE_LATE_ANSWER=cache): keep this one for next time
+                if cache_status in ("MISS", "BYPASS") and not _reply_indicates_no_knowledge(reply_text):
+                    response_cache.put(persona.key, model, msg.text, reply_text)
+                return
+            fallback = False
+            if _reply_indicates_no_knowledge(reply_text):
+                kb_reply = _fallback(persona, msg.text, kbs, trace, routes)
+                if kb_reply:
+                    reply_text = kb_reply
+                    fallback = True
+
+            with trace.span("history_append"):
+                await sessions.append(persona.key, user_id, "assistant", reply_text)
+            if cache_status in ("MISS", "BYPASS"):
+                response_cache.put(persona.key, model, msg.text, reply_text)
+            trace.finish("fallback" if fallback else "ok", reply_text)
+            yield {"type": "done", "reply": reply_text, "fallback": fallback}
+
+        if race is not None:
+            return _race_kb(generate(), race, persona, user_id, trace, add_user_turn), cache_status
+        return generate(), cache_status
+
+    async def chat_stream(msg: Message, request: Request):
+        events, cache_status = await stream_reply(msg, request, persona.stream_route)
+        if isinstance(events, Response):
+            return events
+        return StreamingResponse(_ndjson(events), media_type="application/x-ndjson", headers={"X-Cache": cache_status})
+
+    async def chat_voice(msg: Message, request: Request):
+        if not tts.available:
+            return _tts_unavailable()
+        events, cache_status = await stream_reply(msg, request, persona.voice_route)
+        if isinstance(events, Response):
+            return events
+        return StreamingResponse(_ndjson(_with_audio(events)), media_type="application/x-ndjson",
+                                 headers={"X-Cache": cache_status})
+
+    chat_stream.__doc__ = f"""
+    Same as {persona.chat_route}, but streams the reply as newline-delimited JSON while Ollama generates it.
+    Events: {{"type": "sentence", "text"}} for every finished sentence, then one
+    {{"type": "done", "reply", "fallback"}} with the final reply (KB answer if fallback fired;
+    "degraded": true while Ollama is down and the reply was made without it),
+    or {{"type": "error", "reply", "fallback"}} if Ollama could not be reached.
+    """
+    chat_voice.__doc__ = f"""
+    Same as {persona.stream_route}, plus the reply as speech from the server's TTS engine:
+    {{"type": "audio", "index", "text", "format": "wav", "duration_ms", "audio" (base64)}}
+    per sentence, in order, as soon as it is synthesized ("error" instead of "audio" if
+    that sentence failed). {{"type": "audio_reset"}} means: stop and drop the audio so far,
+    the reply was replaced (KB fallback). 503 if TTS is not configured.
+    """
+    app.post(persona.chat_route, name=f"{persona.key}_chat")(chat)
+    app.post(persona.stream_route, name=f"{persona.key}_chat_stream")(chat_stream)
+    app.post(persona.voice_route, name=f"{persona.key}_chat_voice")(chat_voice)
+
+    async def chat_ws(websocket: WebSocket, user_id: str = "default_user", voice: bool = False):
+        """
+        Voice session over a WebSocket (see voice_session.py): user turns in, token /
+        sentence (and with ?voice=1 audio) events out, cancel on barge-in.
+        """
+        voice = voice and tts.available
+
+        async def start_turn(text: str):
+            request_id_var.set(uuid.uuid4().hex[:16])  # one id per turn, as for HTTP requests
+            try:
+                events, _ = await stream_reply(Message(text=text, user_id=user_id), websocket,
+                                               persona.ws_route, tokens=True, precheck=False)
+            except KnowledgeBaseUnavailable:
+                return _replay("", {"type": "error", "reply": KB_UNAVAILABLE_REPLY, "fallback": False})
+            return _with_audio(events) if voice else events
+
+        # Clients without an id of their own all share "default_user": never replace those sessions
+        await VoiceSession(websocket, persona.key, user_id, start_turn, voice=voice,
+                           replace=user_id != "default_user").run()
+
+    app.websocket(persona.ws_route, name=f"{persona.key}_chat_ws")(chat_ws)
+
+    async def chat_batch(request: Request, concurrency: int = batch.BATCH_CONCURRENCY):
+        """
+        Stateless questions in bulk (see batch.py): JSONL body of {"text", "id", "index"},
+        JSONL results in completion order. Nothing is kept in the conversation history.
+        """
+        parsed = batch.parse_lines(await request.body())
+        await knowledge.ready_snapshot()   # 503 for the whole batch if the KB is not available
+        # Within the per-user admission limit: the batch queues as one user
+        concurrency = max(1, min(concurrency, batch.BATCH_CONCURRENCY, admission.max_per_user))
+        batch_user = f"__batch__:{uuid.uuid4().hex[:8]}"
+        headers = request.headers
+
+        async def answer(text: str) -> dict:
+            return await _answer_stateless(persona, text, headers, batch_user)
+
+        return StreamingResponse(_ndjson(batch.run_batch(parsed, answer, concurrency)),
+                                 media_type="application/x-ndjson")
+
+    app.post(persona.batch_route, name=f"{persona.key}_chat_batch")(chat_batch)
+
+
+def create_app(personas: list) -> FastAPI:
+    """
+    FastAPI app serving the given personas, plus /, /healthz, /readyz, /tts, /metrics, /models,
+    /clear and /admin/reload_kb.
+    """
+    for persona in personas:
+        _served[persona.key] = persona
+        for name in persona.kb_names:
+            file_name, missing_text = KB_FILES[name]
+            knowledge.add(name, os.path.join(KB_DIR, file_name), missing_text)
+    keys = [persona.key for persona in personas]
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # In the background: the server answers /healthz right away, /readyz once the KB is in.
+        # Chat requests that arrive earlier wait for it (knowledge.ready_snapshot).
+        knowledge.start_loading()
+        conversation_log.start()
+        await ollama.start()
+        warmer.start()
+        await sessions.start()
+        tts.start()
+        if tts.available:
+            # Fallback headers and the "try again" reply are spoken often: synthesize them now
+            phrases = [route.reply_prefix for p in personas for route in p.kb_routes]
+            phrases += [DEGRADED_REPLY.split(".")[0].format(name=p.name) + "." for p in personas]
+            warm_up = asyncio.create_task(tts.warm(dict.fromkeys(phrases)))
+        yield
+        _lifecycle["stopping"] = True
+        if tts.available:
+            warm_up.cancel()
+        tts.close()
+        for task in list(_late_answers):
+            task.cancel()
+        await warmer.close()
+        await compactor.close()
+        await sessions.close()
+        await ollama.close()
+        await knowledge.close()
+        await asyncio.to_thread(conversation_log.close)
+
+    app = FastAPI(lifespan=lifespan)
+
+    # Enable CORS so frontend can talk to backend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Cache", "Retry-After", "X-Request-ID"],
+    )
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.exception_handler(KnowledgeBaseUnavailable)
+    async def kb_unavailable(request: Request, error: KnowledgeBaseUnavailable):
+        print(f"❌ Request refused, knowledge base not loaded: {error}")
+        return JSONResponse({"reply": KB_UNAVAILABLE_REPLY, "error": "kb_unavailable"}, status_code=503,
+                            headers={"Retry-After": "30"})
+
+    # Serve Live2D Hiyori model files (for index_hiyori.html)
+    hiyori_runtime = os.path.join(BACKEND_DIR, "hiyori_pro_en", "runtime")
+    if os.path.isdir(hiyori_runtime):
+        app.mount("/hiyori", StaticFiles(directory=hiyori_runtime), name="hiyori")
+
+    for persona in personas:
+        _add_persona_routes(app, persona)
+
+    @app.get("/")
+    async def root():
+        info = {
+            "ready": _is_ready(),
+            "ollama_url": OLLAMA_BASE_URL,
+            "ollama_pool": ollama.stats(),
+            "model": OLLAMA_MODEL,
+            "sessions": sessions.stats(),
+            "response_cache": response_cache.stats(),
+            "knowledge_base": knowledge.stats(),
+            "admission": admission.stats(),
+            "circuit_breaker": breaker.stats(),
+            "history": compactor.stats(),
+            "tts": tts.stats(),
+            "voice_sessions": voice_session.stats(),
+            "kb_race": _kb_race_stats(),
+            "warmup": warmer.stats(),
+            "batch": batch.stats(),
+            "conversation_log": conversation_log.stats(),
+        }
+        if len(personas) == 1:
+            return {"status": personas[0].status, **info, "note": personas[0].note}
+        return {
+            "status": "Qyrix backend is live 🚀",
+            **info,
+            "personas": {
+                p.key: {"chat": p.chat_route, "stream": p.stream_route, "ws": p.ws_route, "batch": p.batch_route,
+                        "model": _model(p)} for p in personas
+            },
+            "note": "Make sure Ollama is running locally",
+        }
+
+    @app.get("/healthz")
+    async def liveness():
+        """Liveness: the process is up and its event loop answers (does not wait for the KB or Ollama)."""
+        return {"status": "alive"}
+
+    @app.get("/readyz")
+    async def readiness():
+        """Readiness: 200 once the knowledge base is loaded and the system prompts are built, else 503."""
+        ready = _is_ready()
+        if knowledge.ready:
+            kb_state = "ready"
+        else:
+            kb_state = f"failed: {knowledge.load_error}" if knowledge.load_error else "loading"
+        info = {
+            "ready": ready,
+            "stopping": _lifecycle["stopping"],
+            "knowledge_base": kb_state,
+            "kb_load_seconds": round(knowledge.load_seconds, 3) if knowledge.ready else None,
+            # From importing this module (worker start) to the KB being loaded
+            "seconds_to_ready": round(knowledge.ready_at - _lifecycle["imported_at"], 3) if knowledge.ready else None,
+            "ollama_nodes_up": sum(node.healthy for node in ollama.nodes),
+        }
+        if not ready:
+            return JSONResponse(info, status_code=503, headers={"Retry-After": "1"})
+        return info
+
+    @app.post("/tts")
+    async def speak(msg: SpeakRequest):
+        """Any text as speech, sentence by sentence: the "audio" events of the _voice routes (503 without TTS)."""
+        if not tts.available:
+            return _tts_unavailable()
+        events = _replay(msg.text, {"type": "done", "reply": msg.text, "fallback": False})
+        return StreamingResponse(_ndjson(_with_audio(events)), media_type="application/x-ndjson")
+
+    @app.get("/metrics")
+    async def metrics():
+        """Prometheus metrics: request counts, per-stage and Ollama latencies, queue depth, cache."""
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/models")
+    async def get_models():
+        """Models pulled on the Ollama servers (from their last health check, not fetched per call)"""
+        models = await ollama.models()
+        if not models and not any(node.healthy for node in ollama.nodes):
+            return {"models": [], "error": "Ollama not running"}
+        return {"models": models}
+
+    @app.post("/clear")
+    async def clear_history(user_id: str = "default_user", persona: str = ""):
+        """Clear conversation history for a user (one persona, or every persona of this server)"""
+        if persona and persona not in keys:
+            raise HTTPException(status_code=404, detail=f"Unknown persona: {persona}")
+        for key in [persona] if persona else keys:
+            await sessions.clear(key, user_id)
+            compactor.clear(key, user_id)
+        return {"status": "Conversation history cleared"}
+
+    @app.post("/admin/reload_kb")
+    async def reload_kb(x_admin_token: str = Header(default="")):
+        """Reload the knowledge base files now (changed files are also picked up automatically)."""
+        admin_token = os.getenv("ADMIN_TOKEN", "")
+        if not admin_token:
+            # Off unless configured: any web page could otherwise make a visitor's browser call it
+            raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+        if not hmac.compare_digest(x_admin_token.encode("utf-8"), admin_token.encode("utf-8")):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+        reloaded = await knowledge.reload(force=True)
+        return {"status": "Knowledge base reloaded", "reloaded": reloaded, "knowledge_base": knowledge.stats()}
+
+    return app
+
@@ -0,0 +1,126 @@
+import os
+import time
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to Ollama while it is down or far too slow.
+
+    - closed: requests go through. After `failure_threshold` bad calls in a row (cannot
+      connect, timeout, 5xx, or slower than `latency_slo` seconds to start answering)
+      the breaker opens.
+    - open: allow() is False, callers answer without Ollama (KB answer or a short
+      "try again" reply). After `open_seconds` the breaker half-opens.
+    - half_open: up to `probes` requests are let through as probes. A good probe closes
+      the breaker, a bad one opens it again. A probe that never reports back (client
+      went away) frees its slot after `open_seconds`.
+    """
+
+    def __init__(self, failure_threshold: int = 3, latency_slo: float = 30.0, open_seconds: float = 30.0,
+                 probes: int = 1, enabled: bool = True):
+        self.failure_threshold = failure_threshold
+        self.latency_slo = latency_slo
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.enabled = enabled
+        self.state = CLOSED
+        self._bad_in_a_row = 0
+        self._opened_at = 0.0
+        self._probe_starts = []
+        self.counters = {
+            "failures": 0,
+            "slow_calls": 0,
+            "opened": 0,
+            "short_circuited": 0,
+            "probes": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        """BREAKER_ENABLED, BREAKER_FAILURES, BREAKER_LATENCY_SLO, BREAKER_OPEN_SECONDS, BREAKER_PROBES."""
+        return cls(
+            failure_threshold=_env_int("BREAKER_FAILURES", 3),
+            latency_slo=_env_float("BREAKER_LATENCY_SLO", 30.0),
+            open_seconds=_env_float("BREAKER_OPEN_SECONDS", 30.0),
+            probes=_env_int("BREAKER_PROBES", 1),
+            enabled=os.getenv("BREAKER_ENABLED", "1").strip().lower() not in ("0", "false", "no"),
+        )
+
+    def allow(self) -> bool:
+        """May a request be sent to Ollama now? Call record_success/record_failure after it."""
+        if not self.enabled or self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self.open_seconds:
+                self.counters["short_circuited"] += 1
+                return False
+            self.state = HALF_OPEN
+            self._probe_starts = []
+            print("🔌 Ollama circuit half-open: sending a probe request")
+        self._probe_starts = [t for t in self._probe_starts if now - t < self.open_seconds]
+        if len(self._probe_starts) >= self.probes:
+            self.counters["short_circuited"] += 1
+            return False
+        self._probe_starts.append(now)
+        self.counters["probes"] += 1
+        return True
+
+    def record_success(self, latency: float):
+        """Ollama answered; latency = seconds until it started answering."""
+        if latency > self.latency_slo:
+            self.counters["slow_calls"] += 1
+            self._bad(f"slow answer ({latency:.1f} s > {self.latency_slo:g} s)")
+            return
+        self._bad_in_a_row = 0
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self._probe_starts = []
+            print("🔌 Ollama circuit closed: Ollama is answering again")
+
+    def record_failure(self, reason: str = ""):
+        self.counters["failures"] += 1
+        self._bad(reason or "error")
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds until the breaker tries Ollama again."""
+        if self.state != OPEN:
+            return 1
+        return max(1, round(self.open_seconds - (time.monotonic() - self._opened_at)))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "state": self.state,
+            "failures_in_a_row": self._bad_in_a_row,
+            "retry_in_s": self.retry_after if self.state == OPEN else 0,
+            **self.counters,
+        }
+
+    # ---- internals ----
+
+    def _bad(self, reason: str):
+        self._bad_in_a_row += 1
+        if not self.enabled:
+            return
+        if self.state == HALF_OPEN or (self.state == CLOSED and self._bad_in_a_row >= self.failure_threshold):
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self.counters["opened"] += 1
+            print(f"🔌 Ollama circuit open for {self.open_seconds:g} s after {reason}: answering from the knowledge base only")
@@ -0,0 +1,392 @@
+"""
+Append-only conversation log: one JSON line per finished chat turn, gzip-compressed, in
+segments under CONVERSATION_LOG_DIR (default Backend/conversation_logs).
+
+    {"ts": 1760671200.123, "request_id": "3f9c2a1b7d4e8f60", "persona": "ahmed", "route": "/chat",
+     "user_id": "u1", "model": "llama3.2:1b", "outcome": "ok", "fallback": false, "latency_ms": 812,
+     "ollama_ms": 790, "prompt_tokens": 798, "completion_tokens": 41, "kb_sections": 3,
+     "text": "What is SMIT?", "reply": "..."}
+
+- record() only puts the turn on a queue; a writer thread writes batches (every
+  CONVERSATION_LOG_FLUSH_MS, or sooner once CONVERSATION_LOG_BATCH turns are queued), so a
+  request never waits for the disk. If the queue is full the turn is dropped and counted.
+- Each batch is one gzip member appended to the current segment, so a segment is readable
+  up to its last complete batch even while it is being written or after a crash.
+- A new segment starts after CONVERSATION_LOG_SEGMENT_MB (uncompressed) or
+  CONVERSATION_LOG_SEGMENT_SECONDS. Segment names carry the start time and the process id,
+  so several workers can share the folder.
+- Nothing is ever rewritten; POST /clear does not touch the log.
+
+CLI, streaming (memory does not grow with the number of turns):
+
+    python conversation_log.py conversation_logs --by persona,outcome
+    python conversation_log.py conversation_logs --persona aasho --fallback --export bad.jsonl
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SEGMENT_SUFFIX = ".jsonl.gz"
+_STOP = object()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class ConversationLog:
+    """Background writer of compressed, segment-rotated JSONL turn records."""
+
+    def __init__(self, directory: str, enabled: bool = True, segment_mb: int = 64, segment_seconds: int = 3600,
+                 flush_ms: int = 1000, batch_size: int = 1000, max_queue: int = 10000):
+        self.directory = directory
+        self.enabled = enabled
+        self.segment_bytes = segment_mb * 1024 * 1024
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_ms / 1000
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._file = None
+        self._segment = ""
+        self._segment_started = 0.0
+        self._segment_raw = 0
+        self.counters = {"recorded": 0, "written": 0, "dropped": 0, "batches": 0, "segments": 0,
+                         "bytes_raw": 0, "bytes_written": 0, "write_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "ConversationLog":
+        """
+        CONVERSATION_LOG (1 = on), CONVERSATION_LOG_DIR, CONVERSATION_LOG_SEGMENT_MB,
+        CONVERSATION_LOG_SEGMENT_SECONDS, CONVERSATION_LOG_FLUSH_MS, CONVERSATION_LOG_BATCH,
+        CONVERSATION_LOG_QUEUE.
+        """
+        return cls(
+            os.getenv("CONVERSATION_LOG_DIR") or os.path.join(BACKEND_DIR, "conversation_logs"),
+            enabled=os.getenv("CONVERSATION_LOG", "1") == "1",
+            segment_mb=_env_int("CONVERSATION_LOG_SEGMENT_MB", 64),
+            segment_seconds=_env_int("CONVERSATION_LOG_SEGMENT_SECONDS", 3600),
+            flush_ms=_env_int("CONVERSATION_LOG_FLUSH_MS", 1000),
+            batch_size=_env_int("CONVERSATION_LOG_BATCH", 1000),
+            max_queue=_env_int("CONVERSATION_LOG_QUEUE", 10000),
+        )
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            print(f"❌ Conversation log disabled, cannot create {self.directory}: {e}")
+            self.enabled = False
+            return
+        self._thread = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+        self._thread.start()
+        print(f"📝 Conversation log: {self.directory}")
+
+    def close(self, timeout: float = 10.0):
+        """Write what is queued and close the segment (blocking; run it off the event loop)."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️ Conversation log: {self._queue.qsize()} turns still queued after {timeout} s, not written")
+        self._thread = None
+
+    def record(self, turn: dict):
+        """Queue one turn (never blocks)."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(turn)
+            self.counters["recorded"] += 1
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "segment": os.path.basename(self._segment),
+            "queued": self._queue.qsize(),
+            **self.counters,
+        }
+
+    # ---- writer thread ----
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                timeout = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(batch)
+                except (OSError, TypeError, ValueError) as e:
+                    self.counters["write_errors"] += 1
+                    print(f"❌ Conversation log write failed ({len(batch)} turns lost): {e}")
+                    self._close_segment()
+        self._close_segment()
+
+    def _write(self, batch: list):
+        data = "".join(json.dumps(turn, ensure_ascii=False, separators=(",", ":")) + "\n" for turn in batch)
+        data = data.encode("utf-8")
+        if (self._file is None or time.time() - self._segment_started >= self.segment_seconds
+                or (self._segment_raw and self._segment_raw + len(data) > self.segment_bytes)):
+            self._open_segment()
+        member = gzip.compress(data, compresslevel=6)
+        self._file.write(member)
+        self._file.flush()
+        self._segment_raw += len(data)
+        self.counters["written"] += len(batch)
+        self.counters["batches"] += 1
+        self.counters["bytes_raw"] += len(data)
+        self.counters["bytes_written"] += len(member)
+
+    def _open_segment(self):
+        self._close_segment()
+        self._segment_started = time.time()
+        stamp = datetime.fromtimestamp(self._segment_started, timezone.utc).strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"turns-{stamp}-{os.getpid()}{SEGMENT_SUFFIX}")
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = os.path.join(self.directory, f"turns-{stamp}-{os.getpid()}-{n}{SEGMENT_SUFFIX}")
+        self._file = open(path, "ab")
+        self._segment = path
+        self._segment_raw = 0
+        self.counters["segments"] += 1
+
+    def _close_segment(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+# ---- reading ----
+
+def segment_paths(paths: list) -> list:
+    """Segment files from files and folders, oldest first (by name: start time, then pid)."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(SEGMENT_SUFFIX)]
+        else:
+            found.append(path)
+    return sorted(found, key=os.path.basename)
+
+
+def iter_turns(paths: list, problems: dict = None):
+    """
+    Turn dicts from the segments, one at a time. A segment that ends in a cut-off batch
+    (writer killed mid-write) is read up to the cut; unreadable lines are skipped.
+    problems, if given, counts both.
+    """
+    problems = problems if problems is not None else {}
+    for path in segment_paths(paths):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        problems["bad_lines"] = problems.get("bad_lines", 0) + 1
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            problems["truncated_segments"] = problems.get("truncated_segments", 0) + 1
+            print(f"⚠️ {path}: ends in a cut-off batch, read up to there ({e})", file=sys.stderr)
+
+
+class _LatencyHistogram:
+    """Fixed log-spaced buckets (5% wide) for percentiles in constant memory."""
+
+    _RATIO = math.log(1.05)
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, ms: float):
+        bucket = int(math.log(ms) / self._RATIO) if ms >= 1 else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, p: float) -> float:
+        total = sum(self.buckets.values())
+        if not total:
+            return 0.0
+        rank = p / 100 * total
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return math.exp((bucket + 1) * self._RATIO) if bucket else 1.0
+        return 0.0
+
+
+class TurnStats:
+    """Counts, fallback rate, latency percentiles and token totals of a stream of turns."""
+
+    def __init__(self):
+        self.turns = 0
+        self.fallbacks = 0
+        self.outcomes = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = _LatencyHistogram()
+
+    def add(self, turn: dict):
+        self.turns += 1
+        self.fallbacks += bool(turn.get("fallback"))
+        outcome = turn.get("outcome", "")
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.prompt_tokens += turn.get("prompt_tokens") or 0
+        self.completion_tokens += turn.get("completion_tokens") or 0
+        self.latency.add(turn.get("latency_ms") or 0)
+
+    def summary(self) -> dict:
+        return {
+            "turns": self.turns,
+            "fallback_rate": round(self.fallbacks / self.turns, 4) if self.turns else 0.0,
+            "p50_ms": round(self.latency.percentile(50)),
+            "p95_ms": round(self.latency.percentile(95)),
+            "p99_ms": round(self.latency.percentile(99)),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "outcomes": dict(sorted(self.outcomes.items())),
+        }
+
+
+def _group_value(turn: dict, field: str) -> str:
+    if field == "day":
+        return datetime.fromtimestamp(turn.get("ts", 0), timezone.utc).strftime("%Y-%m-%d")
+    if field == "hour":
+        return datetime.fromtimestamp(turn.get("ts", 0), timezone.utc).strftime("%Y-%m-%d %H:00")
+    return str(turn.get(field, ""))
+
+
+def _timestamp(value: str) -> float:
+    """Epoch seconds or an ISO date/time (UTC if no zone is given)."""
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter, aggregate or export conversation log segments")
+    parser.add_argument("paths", nargs="*", default=[os.path.join(BACKEND_DIR, "conversation_logs")],
+                        help="segment files or folders (default: Backend/conversation_logs)")
+    parser.add_argument("--persona")
+    parser.add_argument("--model")
+    parser.add_argument("--route")
+    parser.add_argument("--user", help="user_id")
+    parser.add_argument("--outcome", help="comma-separated, e.g. error,degraded")
+    parser.add_argument("--fallback", action="store_true", help="only turns answered from a knowledge base")
+    parser.add_argument("--since", help="epoch seconds or ISO time (UTC)")
+    parser.add_argument("--until", help="epoch seconds or ISO time (UTC)")
+    parser.add_argument("--min-latency-ms", type=float, default=0)
+    parser.add_argument("--contains", help="text or reply contains this (case-insensitive)")
+    parser.add_argument("--by", default="persona",
+                        help="group the summary by these fields, comma-separated (persona, model, outcome, route, "
+                             "fallback, day, hour, ...)")
+    parser.add_argument("--export", help="write the matching turns as JSONL to this file ('-' = stdout) instead")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many matching turns")
+    args = parser.parse_args()
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        sys.exit(f"❌ No conversation log at {', '.join(missing)}")
+
+    outcomes = set(args.outcome.split(",")) if args.outcome else None
+    since = _timestamp(args.since) if args.since else None
+    until = _timestamp(args.until) if args.until else None
+    contains = args.contains.lower() if args.contains else None
+    fields = {"persona": args.persona, "model": args.model, "route": args.route, "user_id": args.user}
+    fields = {name: value for name, value in fields.items() if value}
+
+    def matches(turn: dict) -> bool:
+        if any(turn.get(name) != value for name, value in fields.items()):
+            return False
+        if outcomes is not None and turn.get("outcome") not in outcomes:
+            return False
+        if args.fallback and not turn.get("fallback"):
+            return False
+        ts = turn.get("ts", 0)
+        if (since is not None and ts < since) or (until is not None and ts >= until):
+            return False
+        if (turn.get("latency_ms") or 0) < args.min_latency_ms:
+            return False
+        if contains is not None and contains not in (turn.get("text", "") + "\n" + turn.get("reply", "")).lower():
+            return False
+        return True
+
+    problems = {}
+    group_by = [field.strip() for field in args.by.split(",") if field.strip()]
+    groups = {}
+    total = TurnStats()
+    out = None
+    if args.export:
+        out = sys.stdout if args.export == "-" else open(args.export, "w", encoding="utf-8")
+    started = time.perf_counter()
+    scanned = 0
+    try:
+        for turn in iter_turns(args.paths, problems):
+            scanned += 1
+            if not matches(turn):
+                continue
+            if out is not None:
+                out.write(json.dumps(turn, ensure_ascii=False) + "\n")
+            else:
+                key = tuple(_group_value(turn, field) for field in group_by)
+                groups.setdefault(key, TurnStats()).add(turn)
+            total.add(turn)
+            if args.limit and total.turns >= args.limit:
+                break
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+
+    seconds = time.perf_counter() - started
+    report = sys.stderr if args.export == "-" else sys.stdout
+    print(f"📊 {total.turns} of {scanned} turns matched in {seconds:.1f} s"
+          + (f" ({', '.join(f'{k}={v}' for k, v in problems.items())})" if problems else ""), file=report)
+    if out is not None:
+        print(f"✅ Exported to {args.export}", file=report)
+        return
+    header = " / ".join(group_by) or "all"
+    print(f"{header:40} {'turns':>9} {'fallback':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'prompt tok':>11} {'reply tok':>10}  outcomes")
+    for key, stats in sorted(groups.items(), key=lambda item: -item[1].turns):
+        s = stats.summary()
+        print(f"{' / '.join(key)[:40]:40} {s['turns']:9d} {s['fallback_rate']:9.1%} {s['p50_ms']:8d} {s['p95_ms']:8d} "
+              f"{s['p99_ms']:8d} {s['prompt_tokens']:11d} {s['completion_tokens']:10d}  {s['outcomes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from tokens import estimate_message_tokens, estimate_tokens
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _span_id(turns: list, end: int) -> str:
+    """
+    Id of the two turns before position end (a single reply can repeat, a user+reply pair
+    rarely does). Stable across processes, so any worker can check a stored summary.
+    """
+    span = [(t["role"], t["content"]) for t in turns[max(0, end - 2):end]]
+    return hashlib.sha1(json.dumps(span, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+class HistoryCompactor:
+    """
+    Keeps the conversation sent to Ollama inside the model's context window.
+
+    The persona system prompt and the most recent turns are always sent. When the history
+    is over max_tokens (or max_messages), older turns are left out of the prompt and folded
+    into a rolling per-session summary, which is sent as a system message right after the
+    persona prompt. Summaries are written by summarize(persona, previous_summary, turns)
+    in a background task, so a turn never waits for one; until it is ready the older turns
+    are simply left out.
+
+    Summaries are kept with the session in the session store (store.summary /
+    set_summary), so every worker sees them and clearing or expiring a session drops its
+    summary too. A summary is only used while the turns it ends with are still in the
+    history; otherwise it belongs to an older conversation and is deleted.
+    """
+
+    def __init__(self, store, summarize=None, keep_recent: int = 4, summary_tokens: int = 200,
+                 enabled: bool = True):
+        self.store = store
+        self.summarize = summarize
+        self.keep_recent = keep_recent
+        self.summary_tokens = summary_tokens
+        self.enabled = enabled
+        self._running = set()
+        self._tasks = set()
+        self._stale = set()       # cleared while a summary was being written
+        self.counters = {
+            "compacted_turns": 0,
+            "summaries_made": 0,
+            "summaries_dropped": 0,
+            "summary_errors": 0,
+            "turns_folded": 0,
+        }
+
+    @classmethod
+    def from_env(cls, store, summarize=None) -> "HistoryCompactor":
+        """HISTORY_COMPACTION (on), HISTORY_SUMMARY (on), HISTORY_KEEP_RECENT, HISTORY_SUMMARY_TOKENS."""
+        def flag(name):
+            return os.getenv(name, "1").strip().lower() not in ("0", "false", "no")
+
+        return cls(
+            store,
+            summarize=summarize if flag("HISTORY_SUMMARY") else None,
+            keep_recent=_env_int("HISTORY_KEEP_RECENT", 4),
+            summary_tokens=_env_int("HISTORY_SUMMARY_TOKENS", 200),
+            enabled=flag("HISTORY_COMPACTION"),
+        )
+
+    async def compact(self, persona: str, user_id: str, messages: list, max_tokens: int,
+                      max_messages: int = None) -> list:
+        """
+        messages = [persona system prompt, *turns]. Returns the messages to send: system
+        prompt, summary (if any), and the newest turns that fit max_tokens / max_messages.
+        """
+        if not self.enabled or len(messages) < 2:
+            return messages
+        system, turns = messages[0], messages[1:]
+        summary = await self.store.summary(persona, user_id) if self.summarize is not None else None
+
+        # Turns up to the one the summary ends with are already in the summary
+        start = 0
+        if summary is not None:
+            start = next((end for end in range(1, len(turns) + 1) if _span_id(turns, end) == summary[1]), 0)
+            if start == 0:
+                # Not a summary of this history (cleared, expired, or written from older turns)
+                await self.store.drop_summary(persona, user_id)
+                self.counters["summaries_dropped"] += 1
+                summary = None
+        if summary is not None:
+            summary_msg = {"role": "system", "content": f"Summary of the earlier conversation: {summary[0]}"}
+            budget = max_tokens - estimate_message_tokens([summary_msg])
+        else:
+            budget = max_tokens
+
+        # Newest turns first, while they fit (the last keep_recent are always kept)
+        keep = 0
+        used = 0
+        limit = max_messages or len(turns)
+        for turn in reversed(turns[start:]):
+            cost = estimate_tokens(turn["content"]) + 4
+            if keep >= self.keep_recent and (used + cost > budget or keep >= limit):
+                break
+            keep += 1
+            used += cost
+        first_kept = len(turns) - keep
+        # Don't start the kept history with an assistant reply
+        while first_kept < len(turns) - self.keep_recent and turns[first_kept]["role"] == "assistant":
+            first_kept += 1
+
+        left_out = turns[start:first_kept]
+        if left_out:
+            self.counters["compacted_turns"] += 1
+            self._fold_later(persona, user_id, left_out)
+
+        result = [system]
+        if summary is not None:
+            result.append(summary_msg)
+        return result + turns[first_kept:]
+
+    async def close(self):
+        """Cancel summaries still being written (called before the Ollama client closes)."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def clear(self, persona: str, user_id: str):
+        """The session was cleared (which deleted its summary): drop a summary still being written."""
+        key = (persona, user_id)
+        if key in self._running:
+            self._stale.add(key)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "summarizing": len(self._running),
+            **self.counters,
+        }
+
+    # ---- internals ----
+
+    def _fold_later(self, persona: str, user_id: str, turns: list):
+        key = (persona, user_id)
+        if self.summarize is None or key in self._running:
+            return
+        self._running.add(key)
+        task = asyncio.create_task(self._fold(key, list(turns)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, key: tuple, turns: list):
+        try:
+            previous = await self.store.summary(*key)
+            text = await self.summarize(key[0], previous[0] if previous else "", turns)
+            if text and key not in self._stale:
+                # Keep the summary within its budget even if the model ran long
+                await self.store.set_summary(*key, text.strip()[: self.summary_tokens * 4], _span_id(turns, len(turns)))
+                self.counters["summaries_made"] += 1
+                self.counters["turns_folded"] += len(turns)
+        except Exception as e:
+            self.counters["summary_errors"] += 1
+            print(f"❌ History summary failed: {e}")
+        finally:
+            self._running.discard(key)
+            self._stale.discard(key)
@@ -0,0 +1,236 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+
+from tokens import estimate_tokens
+
+# Same output budget as the original linear-scan search
+MAX_SECTIONS = 5
+MAX_CHARS = 2500
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Version of the saved index artifacts (load_or_build); bump when the index layout,
+# split_sections() or tokenize() changes so old artifacts are rebuilt
+INDEX_FORMAT = 1
+
+
+def split_sections(text: str) -> list:
+    """Split KB text into sections on blank lines, dropping ==== separator blocks."""
+    raw = text.replace("\r\n", "\n")
+    sections = []
+    for block in raw.split("\n\n"):
+        block = block.strip()
+        if block and not block.startswith("=" * 20):
+            sections.append(block)
+    return sections
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens (2+ chars) with a light plural strip, so 'meals' matches 'meal'."""
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if len(tok) < 2:
+            continue
+        if len(tok) > 4 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+class KnowledgeBaseIndex:
+    """
+    Sections of one knowledge base file, tokenized once into an inverted index
+    and ranked with BM25. Built at startup instead of re-splitting the KB per query.
+
+    With section vectors (use_vectors, kb_vectors.py) sections can instead be ranked by
+    cosine similarity ("semantic") or by both ("hybrid": weighted sum of the cosine and
+    the BM25 score relative to the best one).
+    """
+
+    def __init__(self, text: str, k1: float = 1.5, b: float = 0.75):
+        self.text = text
+        # Missing files are stored as "(... not found.)" placeholders
+        self.available = bool(text) and not text.startswith("(")
+        self.sections = split_sections(text) if self.available else []
+        self.k1 = k1
+        self.b = b
+
+        counts = [Counter(tokenize(sec)) for sec in self.sections]
+        self.lengths = [sum(c.values()) for c in counts]
+        n = len(self.sections)
+        self.avg_length = (sum(self.lengths) / n) if n else 0.0
+
+        # term -> list of (section index, BM25 weight). The weight only depends on the
+        # term and the section, so it is computed here once instead of per query.
+        self.postings = {}
+        avg = self.avg_length or 1.0
+        for idx, c in enumerate(counts):
+            norm = k1 * (1 - b + b * self.lengths[idx] / avg)
+            for term, tf in c.items():
+                self.postings.setdefault(term, []).append((idx, tf * (k1 + 1) / (tf + norm)))
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+        self.retrieval = "bm25"
+        self.vectors = None
+        self.source = "built"   # or "disk" (load_or_build)
+        self.build_ms = 0.0
+
+    # Everything __init__ derives from the text: what an index artifact holds
+    _ARTIFACT_FIELDS = ("available", "sections", "k1", "b", "lengths", "avg_length", "postings", "idf")
+
+    @classmethod
+    def load_or_build(cls, text: str, cache_path: str = "", k1: float = 1.5, b: float = 0.75) -> "KnowledgeBaseIndex":
+        """
+        Index of text, read from the artifact at cache_path (JSON, so a tampered file can
+        only give a wrong index, never run code) if it was built from the same text,
+        INDEX_FORMAT and BM25 parameters; otherwise built and saved there.
+        """
+        started = time.perf_counter()
+        key = hashlib.sha1(f"{INDEX_FORMAT}:{k1}:{b}:".encode("utf-8") + text.encode("utf-8")).hexdigest()
+        if cache_path and os.path.isfile(cache_path):
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    saved = json.load(f)
+                if saved["key"] == key:
+                    index = cls.__new__(cls)
+                    # postings are lists of [section index, weight] pairs here, used the same way
+                    index.__dict__.update({name: saved["index"][name] for name in cls._ARTIFACT_FIELDS})
+                    index.text = text
+                    index.retrieval = "bm25"
+                    index.vectors = None
+                    index.source = "disk"
+                    index.build_ms = (time.perf_counter() - started) * 1000
+                    return index
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Ignoring unreadable KB index {cache_path}: {e}")
+        index = cls(text, k1, b)
+        if cache_path and index.available:
+            tmp_path = cache_path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    state = {name: getattr(index, name) for name in cls._ARTIFACT_FIELDS}
+                    json.dump({"key": key, "index": state}, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"⚠️ Could not save KB index to {cache_path}: {e}")
+        index.build_ms = (time.perf_counter() - started) * 1000
+        return index
+
+    def use_vectors(self, vectors, retrieval: str, hybrid_weight: float = 0.5, min_similarity: float = 0.12):
+        """
+        Rank with section vectors: retrieval "semantic" or "hybrid". A section counts as a
+        match if its cosine similarity is at least min_similarity (or, in hybrid, if it
+        also matches by BM25). hybrid_weight is the share of the cosine in hybrid scores.
+        """
+        self.vectors = vectors
+        self.retrieval = retrieval
+        self.hybrid_weight = hybrid_weight
+        self.min_similarity = min_similarity
+
+    def rank(self, query: str, top_k: int = None, min_score: float = 0.0) -> list:
+        """
+        Return [(score, section index)] for sections matching the query, best first.
+        min_score: lowest BM25 score that counts as a match.
+        """
+        if self.retrieval != "bm25" and self.sections:
+            return self._rank_vectors(query, top_k, min_score)
+        return [(score, idx) for score, idx in self._rank_bm25(query, top_k) if score >= min_score]
+
+    def _bm25_scores(self, query: str) -> dict:
+        """{section index: BM25 score} for sections sharing a term with the query."""
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            get = scores.get
+            for idx, weight in plist:
+                scores[idx] = get(idx, 0.0) + idf * weight
+        return scores
+
+    def _rank_bm25(self, query: str, top_k: int = None) -> list:
+        scores = self._bm25_scores(query)
+        key = lambda x: (-x[0], x[1])
+        items = ((score, idx) for idx, score in scores.items())
+        if top_k is not None:
+            return heapq.nsmallest(top_k, items, key=key)
+        return sorted(items, key=key)
+
+    def _rank_vectors(self, query: str, top_k: int, min_score: float) -> list:
+        import numpy as np  # only semantic / hybrid retrieval needs it (kb_vectors.py)
+        similarity = self.vectors.similarities(query)
+        matches = similarity >= self.min_similarity
+        scores = similarity
+        if self.retrieval == "hybrid":
+            lexical = np.zeros(len(self.sections), dtype=np.float32)
+            bm25 = self._bm25_scores(query)
+            if bm25:
+                lexical[np.fromiter(bm25.keys(), dtype=np.int64, count=len(bm25))] = list(bm25.values())
+            best = lexical.max()
+            if best > 0:
+                matches |= lexical >= max(min_score, 1e-9)
+                lexical /= best
+            scores = self.hybrid_weight * similarity + (1 - self.hybrid_weight) * lexical
+        candidates = np.flatnonzero(matches)
+        if top_k is not None and len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        # Best first; equal scores keep KB order
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(float(scores[idx]), int(idx)) for idx in candidates]
+
+    def search(self, query: str, max_sections: int = MAX_SECTIONS, max_chars: int = MAX_CHARS) -> str:
+        """
+        Relevant sections for the query (top 5, max ~2500 chars), the first few sections
+        if the query is generic or nothing matches, or "" if the KB file is missing.
+        """
+        if not self.available:
+            return ""
+        if not self.sections:
+            return self.text[:2000]
+        if not tokenize(query):
+            return "\n\n".join(self.sections[:8])  # First few sections
+        ranked = self.rank(query, top_k=max_sections)
+        if not ranked:
+            # No match: return first few sections as general info
+            return "\n\n".join(self.sections[:6])
+        result = []
+        total = 0
+        for _, idx in ranked:
+            sec = self.sections[idx]
+            if total + len(sec) > max_chars:
+                result.append(sec[: max_chars - total])
+                break
+            result.append(sec)
+            total += len(sec)
+        return "\n\n".join(result)
+
+    def top_sections(self, query: str, top_k: int, max_tokens: int, min_score: float = 0.0) -> list:
+        """
+        Best-matching sections for the query, for retrieval-augmented prompts.
+        Stops at top_k sections or max_tokens (estimated); sections scoring below
+        min_score are dropped so small talk does not pull in random KB text.
+        """
+        if not self.available or not self.sections:
+            return []
+        picked = []
+        used = 0
+        for _, idx in self.rank(query, top_k=top_k, min_score=min_score):
+            sec = self.sections[idx]
+            cost = estimate_tokens(sec)
+            if used + cost > max_tokens:
+                if not picked:
+                    # Always give the model the best section, trimmed to the budget
+                    picked.append(sec[: max_tokens * 4])
+                break
+            picked.append(sec)
+            used += cost
+        return picked
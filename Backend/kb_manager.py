@@ -0,0 +1,330 @@
+import asyncio
+import os
+import threading
+import time
+
+from kb_index import KnowledgeBaseIndex
+
+
+def read_kb_file(path: str) -> str:
+    """Text of a KB file, with Windows line endings normalized."""
+    with open(path, encoding="utf-8") as f:
+        return f.read().replace("\r\n", "\n").strip()
+
+
+class KnowledgeBaseUnavailable(RuntimeError):
+    """The background load (KBManager.start_loading) failed and nothing has been loaded since."""
+
+
+def _stat(path: str) -> tuple:
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (None, None)
+
+
+class KnowledgeBase:
+    """
+    One loaded KB file: text + BM25 index (+ section vectors for semantic / hybrid
+    retrieval). Never changed after it is built; a reload builds a new KnowledgeBase
+    and swaps it in.
+
+    cache_path: prefix of the saved artifacts (<prefix>.index.json, <prefix>.vectors.npz),
+    reused while the file's text is the same; "" = always build.
+    """
+
+    def __init__(self, name: str, path: str, text: str, fingerprint: tuple, retrieval: dict = None,
+                 cache_path: str = ""):
+        self.name = name
+        self.path = path
+        self.fingerprint = fingerprint
+        self.index = KnowledgeBaseIndex.load_or_build(text, cache_path + ".index.json" if cache_path else "")
+        if retrieval and self.index.sections:
+            from kb_vectors import SectionVectors
+            vectors = SectionVectors.load_or_build(self.index.sections, retrieval["embedder"],
+                                                   cache_path + ".vectors.npz" if cache_path else "")
+            self.index.use_vectors(vectors, retrieval["mode"], retrieval["hybrid_weight"], retrieval["min_similarity"])
+        self.loaded_at = time.time()
+
+    @property
+    def text(self) -> str:
+        return self.index.text
+
+    @property
+    def available(self) -> bool:
+        return self.index.available
+
+
+class KBManager:
+    """
+    Knowledge base files, loaded on first use (not at import) and reloaded without a restart.
+
+    - Files are watched by mtime/size every watch_interval seconds (0 = no watcher);
+      reload() can also be triggered by hand (POST /admin/reload_kb).
+    - Sections and indexes are rebuilt in a worker thread, then the whole set is swapped
+      in one assignment. A request that took snapshot() keeps using the same KB versions
+      until it finishes.
+    - on_reload(snapshot) callbacks run on the event loop after every (re)load, e.g. to
+      rebuild system prompts or clear the response cache.
+    - Index (and vector) artifacts are saved per file, keyed by a hash of its text, in
+      cache_dir (default: next to the file), so a restart or a new worker loads them
+      instead of re-indexing. `python kb_manager.py` builds them ahead of time.
+    - start_loading() loads in the background; `ready` is set once every file is loaded
+      and the callbacks ran. ready_snapshot() waits for that.
+    """
+
+    def __init__(self, watch_interval: float = 2.0, retrieval: str = "bm25", embedder: str = "auto",
+                 embed_model: str = "", embed_dim: int = 1024, hybrid_weight: float = 0.5,
+                 min_similarity: float = None, cache_dir: str = ""):
+        self.watch_interval = watch_interval
+        self.cache_dir = cache_dir
+        self.retrieval = retrieval
+        self._embedder_config = (embedder, embed_model, embed_dim)
+        self._embedder = None    # loaded with the first KB that needs it
+        self.hybrid_weight = hybrid_weight
+        self.min_similarity = min_similarity
+        self.files = {}          # name -> (path, text used when the file is missing)
+        self._kbs = {}           # name -> KnowledgeBase; replaced as a whole, never mutated
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._failed = {}        # name -> fingerprint of a version that could not be loaded
+        self._watch_task = None
+        self._start_task = None
+        self.ready = False
+        self.load_seconds = None
+        self.ready_at = None     # time.perf_counter() when the first load finished
+        self.load_error = ""
+        self.counters = {"reloads": 0, "reload_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "KBManager":
+        """
+        KB_WATCH_INTERVAL: seconds between file checks (0 turns the watcher off).
+        KB_RETRIEVAL (bm25 / semantic / hybrid), KB_EMBEDDER, KB_EMBED_MODEL, KB_EMBED_DIM,
+        KB_HYBRID_WEIGHT, KB_MIN_SIMILARITY: see kb_vectors.py.
+        KB_CACHE_DIR: folder for the index / vector artifacts (default: next to each KB file).
+        """
+        return cls(
+            watch_interval=float(os.getenv("KB_WATCH_INTERVAL", "2")),
+            retrieval=os.getenv("KB_RETRIEVAL", "bm25").strip().lower(),
+            embedder=os.getenv("KB_EMBEDDER", "auto"),
+            embed_model=os.getenv("KB_EMBED_MODEL", ""),
+            embed_dim=int(os.getenv("KB_EMBED_DIM", "1024")),
+            hybrid_weight=float(os.getenv("KB_HYBRID_WEIGHT", "0.5")),
+            min_similarity=float(os.environ["KB_MIN_SIMILARITY"]) if os.getenv("KB_MIN_SIMILARITY") else None,
+            cache_dir=os.getenv("KB_CACHE_DIR", ""),
+        )
+
+    def add(self, name: str, path: str, missing_text: str):
+        """Register a KB file. missing_text is used (as an unavailable KB) if the file does not exist."""
+        self.files[name] = (path, missing_text)
+
+    def on_reload(self, callback):
+        self._callbacks.append(callback)
+
+    @property
+    def paths(self) -> list:
+        return [path for path, _ in self.files.values()]
+
+    def snapshot(self) -> dict:
+        """Current {name: KnowledgeBase}. Loads the files on first use."""
+        if len(self._kbs) < len(self.files):
+            self._reload(force=False)
+        return self._kbs
+
+    def get(self, name: str) -> KnowledgeBase:
+        return self.snapshot()[name]
+
+    async def ready_snapshot(self) -> dict:
+        """
+        snapshot(), after waiting for the background load (start_loading) if it is still
+        running. Raises KnowledgeBaseUnavailable if that load failed, instead of retrying
+        it on the event loop; a successful reload (POST /admin/reload_kb) clears this.
+        """
+        task = self._start_task
+        if task is not None:
+            if not task.done():
+                await asyncio.wait([task])   # a cancelled request does not cancel the load
+            failed = not task.cancelled() and task.exception() is not None
+            if failed and len(self._kbs) < len(self.files):
+                raise KnowledgeBaseUnavailable(self.load_error)
+        return self.snapshot()
+
+    async def start(self):
+        """Load every file in a worker thread, run the callbacks, then start watching."""
+        started = time.perf_counter()
+        await asyncio.to_thread(self.snapshot)
+        self._notify()
+        self.ready_at = time.perf_counter()
+        self.load_seconds = self.ready_at - started
+        self.ready = True
+        if self.watch_interval > 0:
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    def start_loading(self):
+        """start() as a background task, so the server can answer (liveness) while the KB loads."""
+        async def load():
+            try:
+                await self.start()
+            except Exception as e:
+                self.load_error = str(e) or type(e).__name__
+                print(f"❌ Could not load the knowledge base: {self.load_error}")
+                raise
+        self._start_task = asyncio.create_task(load())
+
+    async def close(self):
+        self.ready = False
+        if self._start_task is not None:
+            self._start_task.cancel()
+            await asyncio.gather(self._start_task, return_exceptions=True)
+            self._start_task = None
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def reload(self, force: bool = True) -> list:
+        """
+        Rebuild changed files (every file if force) off the event loop and swap them in.
+        Returns the names that were reloaded.
+        """
+        reloaded = await asyncio.to_thread(self._reload, force)
+        if reloaded:
+            self._notify()
+        return reloaded
+
+    def changed(self) -> list:
+        """Names of files whose mtime/size differs from the loaded version."""
+        kbs = self._kbs
+        changed = []
+        for name, (path, _) in self.files.items():
+            fingerprint = _stat(path)
+            if name not in kbs or (kbs[name].fingerprint != fingerprint and self._failed.get(name) != fingerprint):
+                changed.append(name)
+        return changed
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "watch_interval": self.watch_interval,
+            "retrieval": self.retrieval,
+            **self.counters,
+            "files": {
+                name: {
+                    "path": os.path.basename(kb.path),
+                    "available": kb.available,
+                    "chars": len(kb.text) if kb.available else 0,
+                    "sections": len(kb.index.sections),
+                    "loaded_at": round(kb.loaded_at),
+                    "index": {"source": kb.index.source, "build_ms": round(kb.index.build_ms, 1)},
+                    **({"vectors": kb.index.vectors.stats()} if kb.index.vectors is not None else {}),
+                }
+                for name, kb in self._kbs.items()
+            },
+        }
+
+    # ---- internals ----
+
+    def _retrieval(self):
+        """Settings for KnowledgeBase, or None for plain BM25 (also if no embedder can be loaded)."""
+        if self.retrieval not in ("semantic", "hybrid"):
+            if self.retrieval != "bm25":
+                print(f"⚠️ Unknown KB_RETRIEVAL: {self.retrieval}; using bm25")
+                self.retrieval = "bm25"
+            return None
+        if self._embedder is None:
+            from kb_vectors import load_embedder  # numpy (and the embedding model) only when used
+            self._embedder = load_embedder(*self._embedder_config)
+            if self._embedder is None:
+                self.retrieval = "bm25"
+                return None
+            print(f"🧭 KB retrieval: {self.retrieval} ({self._embedder.name})")
+        min_similarity = self.min_similarity if self.min_similarity is not None else self._embedder.min_similarity
+        return {"mode": self.retrieval, "embedder": self._embedder, "hybrid_weight": self.hybrid_weight,
+                "min_similarity": min_similarity}
+
+    def _cache_path(self, path: str) -> str:
+        """
+        Prefix of a KB file's artifacts: in cache_dir, or next to the file if cache_dir is
+        not set; "" = do not save them (cache_dir cannot be created).
+        """
+        if not self.cache_dir:
+            return path
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError as e:
+            print(f"⚠️ Cannot use KB_CACHE_DIR {self.cache_dir}: {e}")
+            return ""
+        return os.path.join(self.cache_dir, os.path.basename(path))
+
+    def _notify(self):
+        snapshot = self._kbs
+        for callback in self._callbacks:
+            callback(snapshot)
+
+    def _reload(self, force: bool) -> list:
+        with self._lock:
+            names = list(self.files) if force else self.changed()
+            if not names:
+                return []
+            new_kbs = dict(self._kbs)
+            reloaded = []
+            retrieval = self._retrieval()
+            for name in names:
+                path, missing_text = self.files[name]
+                fingerprint = _stat(path)
+                try:
+                    text = read_kb_file(path) if os.path.isfile(path) else missing_text
+                    new_kbs[name] = KnowledgeBase(name, path, text, fingerprint, retrieval, self._cache_path(path))
+                    self._failed.pop(name, None)
+                    reloaded.append(name)
+                except (OSError, UnicodeDecodeError) as e:
+                    # Keep serving the previous version (or none); retried on the next change
+                    self.counters["reload_errors"] += 1
+                    self._failed[name] = fingerprint
+                    print(f"❌ Could not load knowledge base {path}: {e}")
+                    if name not in new_kbs:
+                        new_kbs[name] = KnowledgeBase(name, path, missing_text, fingerprint)
+            if self._kbs and reloaded:
+                self.counters["reloads"] += 1
+                print(f"♻️ Knowledge base reloaded: {', '.join(reloaded)}")
+            self._kbs = new_kbs
+            return reloaded
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                if self.changed():
+                    await self.reload(force=False)
+            except Exception as e:
+                print(f"❌ Knowledge base watcher error: {e}")
+
+
+def main():
+    """Build the index / vector artifacts of every persona KB ahead of time (e.g. in an image build)."""
+    from dotenv import load_dotenv
+    from personas import KB_FILES
+
+    load_dotenv()
+    kb_dir = os.getenv("KB_DIR") or os.path.dirname(os.path.abspath(__file__))
+    manager = KBManager.from_env()
+    for name, (file_name, missing_text) in KB_FILES.items():
+        manager.add(name, os.path.join(kb_dir, file_name), missing_text)
+    manager.snapshot()
+    for name, info in manager.stats()["files"].items():
+        if not info["available"]:
+            print(f"⚠️ {name}: {info['path']} not found")
+            continue
+        vectors = f", vectors {info['vectors']['source']}" if "vectors" in info else ""
+        print(f"📚 {name}: {info['sections']} sections, index {info['index']['source']} "
+              f"in {info['index']['build_ms']} ms{vectors}")
+
+
+if __name__ == "__main__":
+    main()
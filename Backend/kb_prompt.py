@@ -0,0 +1,40 @@
+from tokens import estimate_message_tokens
+
+
+def with_kb_context(messages: list, index, query: str, title: str, top_k: int, max_tokens: int,
+                    min_score: float) -> tuple:
+    """
+    Retrieval mode: add only the KB sections relevant to this turn as a system message
+    right before the latest user message. The stored history and the persona system
+    prompt are left untouched, so the retrieved text is never re-sent on later turns.
+    Returns (messages to send, number of KB sections added).
+    """
+    sections = index.top_sections(query, top_k=top_k, max_tokens=max_tokens, min_score=min_score)
+    if not sections:
+        return messages, 0
+    context = {
+        "role": "system",
+        "content": f"--- {title} (use this to answer) ---\n" + "\n\n".join(sections) + "\n--- END ---",
+    }
+    return messages[:-1] + [context, messages[-1]], len(sections)
+
+
+def log_prompt_stats(label: str, messages: list, kb_sections: int, ollama_data: dict = None,
+                     tokens_before: int = None):
+    """
+    Print prompt size for this turn (and before history compaction, if given) and, once
+    Ollama answered, its prompt token count and prefill time.
+    """
+    chars = sum(len(m.get("content", "")) for m in messages)
+    tokens = estimate_message_tokens(messages)
+    before = f"~{tokens_before} before compaction, " if tokens_before is not None else ""
+    line = (
+        f"📏 {label} prompt: ~{tokens} tokens "
+        f"({before}{chars} chars, {len(messages)} messages, {kb_sections} KB sections)"
+    )
+    if ollama_data:
+        # prompt_eval_count is missing when Ollama reused its cached prompt
+        prompt_tokens = ollama_data.get("prompt_eval_count", 0)
+        prefill_ms = ollama_data.get("prompt_eval_duration", 0) / 1e6
+        line += f" | Ollama prompt_eval_count={prompt_tokens} prefill={prefill_ms:.0f} ms"
+    print(line)
@@ -0,0 +1,168 @@
+"""
+Section vectors for semantic KB retrieval (KB_RETRIEVAL=semantic or hybrid, see kb_index.py).
+
+Embedders (KB_EMBEDDER):
+    fastembed  pip install fastembed; KB_EMBED_MODEL (default BAAI/bge-small-en-v1.5), CPU ONNX
+    hashing    no model: words and character n-grams hashed into KB_EMBED_DIM buckets,
+               weighted by how rare they are in the KB. Catches "meal" ~ "meals",
+               "dastarkhwan" ~ "dastarkhwans" and word overlap, not synonyms
+    auto       fastembed if it is installed, else hashing (default)
+
+Needs numpy. Vectors are L2-normalized float32, so a query is one matrix-vector product.
+They are saved next to the KB file (<file>.vectors.npz) together with a hash of the
+sections and the embedder, and only rebuilt when either changes.
+"""
+import hashlib
+import os
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from kb_index import tokenize
+
+_NGRAM_SIZES = (3, 4)
+_NGRAM_WEIGHT = 0.5
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words + character n-grams, idf-weighted per KB."""
+
+    # Cosine of a query with a section that answers it is ~0.2; small talk stays under ~0.1
+    min_similarity = 0.12
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        self._word_cache = {}   # word -> (buckets, signed weights) of the word and its n-grams
+
+    def _word(self, word: str) -> tuple:
+        cached = self._word_cache.get(word)
+        if cached is None:
+            padded = f"<{word}>"
+            features = [(word, 1.0)] + [(padded[i:i + n], _NGRAM_WEIGHT)
+                                        for n in _NGRAM_SIZES for i in range(len(padded) - n + 1)]
+            buckets, weights = [], []
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                buckets.append(h % self.dim)
+                weights.append(weight if h & 0x80000000 else -weight)
+            cached = (buckets, weights)
+            if len(self._word_cache) < 200000:
+                self._word_cache[word] = cached
+        return cached
+
+    def _counts(self, text: str):
+        buckets, weights = [], []
+        for word in tokenize(text):
+            word_buckets, word_weights = self._word(word)
+            buckets += word_buckets
+            weights += word_weights
+        vector = np.zeros(self.dim, dtype=np.float32)
+        np.add.at(vector, np.array(buckets, dtype=np.int64), np.array(weights, dtype=np.float32))
+        return vector
+
+    def fit(self, sections: list):
+        """(section matrix, bucket weights). Buckets used by many sections weigh less."""
+        counts = np.stack([self._counts(sec) for sec in sections]) if sections else np.zeros((0, self.dim), np.float32)
+        document_frequency = np.count_nonzero(counts, axis=0)
+        weights = np.log((1 + len(sections)) / (1 + document_frequency)).astype(np.float32) + 1.0
+        return counts * weights, weights
+
+    def embed_query(self, text: str, weights):
+        return self._counts(text) * weights
+
+
+class FastEmbedEmbedder:
+    """Small local sentence-embedding model (ONNX on CPU) through fastembed."""
+
+    # Sentence embeddings score even unrelated text around 0.4-0.5
+    min_similarity = 0.6
+
+    def __init__(self, model_name: str):
+        from fastembed import TextEmbedding
+        self.model = TextEmbedding(model_name)
+        self.name = f"fastembed-{model_name}"
+
+    def fit(self, sections: list):
+        vectors = np.array(list(self.model.embed(sections)), dtype=np.float32)
+        return vectors, np.ones(vectors.shape[1], dtype=np.float32)
+
+    def embed_query(self, text: str, weights):
+        return np.array(next(iter(self.model.query_embed(text))), dtype=np.float32)
+
+
+def load_embedder(name: str, model: str = "", dim: int = 1024):
+    """Embedder for KB_EMBEDDER / KB_EMBED_MODEL, or None if numpy is missing."""
+    if np is None:
+        print("⚠️ Semantic KB retrieval needs numpy (pip install numpy); using BM25 only")
+        return None
+    name = (name or "auto").strip().lower()
+    model = model or "BAAI/bge-small-en-v1.5"
+    if name in ("fastembed", "auto"):
+        try:
+            return FastEmbedEmbedder(model)
+        except ImportError:
+            if name == "fastembed":
+                print("⚠️ KB_EMBEDDER=fastembed but fastembed is not installed (pip install fastembed)")
+        except Exception as e:
+            print(f"❌ Could not load embedding model {model}: {e}; using the hashing embedder")
+    elif name != "hashing":
+        print(f"⚠️ Unknown KB_EMBEDDER: {name}")
+    return HashingEmbedder(dim)
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class SectionVectors:
+    """Normalized section vectors of one KB; similarities(query) -> cosine per section."""
+
+    def __init__(self, embedder, vectors, weights, source: str, build_ms: float):
+        self.embedder = embedder
+        self.vectors = vectors
+        self.weights = weights
+        self.source = source        # "disk" or "built"
+        self.build_ms = build_ms
+
+    @classmethod
+    def load_or_build(cls, sections: list, embedder, cache_path: str = "") -> "SectionVectors":
+        started = time.perf_counter()
+        key = hashlib.sha1("\0".join([embedder.name] + sections).encode("utf-8")).hexdigest()
+        if cache_path and os.path.isfile(cache_path):
+            try:
+                with np.load(cache_path) as saved:
+                    if str(saved["key"]) == key:
+                        return cls(embedder, saved["vectors"], saved["weights"], "disk",
+                                   (time.perf_counter() - started) * 1000)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Ignoring unreadable KB vectors {cache_path}: {e}")
+        vectors, weights = embedder.fit(sections)
+        vectors = _normalize(vectors).astype(np.float32)
+        weights = weights.astype(np.float32)
+        if cache_path:
+            tmp_path = cache_path + ".tmp.npz"
+            try:
+                np.savez(tmp_path, vectors=vectors, weights=weights, key=np.array(key))
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"⚠️ Could not save KB vectors to {cache_path}: {e}")
+        return cls(embedder, vectors, weights, "built", (time.perf_counter() - started) * 1000)
+
+    def similarities(self, query: str):
+        query_vector = _normalize(self.embedder.embed_query(query, self.weights).astype(np.float32))
+        return self.vectors @ query_vector
+
+    def stats(self) -> dict:
+        return {
+            "embedder": self.embedder.name,
+            "dim": int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0,
+            "source": self.source,
+            "build_ms": round(self.build_ms, 1),
+            "mb": round(self.vectors.nbytes / 1024 / 1024, 2),
+        }
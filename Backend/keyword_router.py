@@ -0,0 +1,112 @@
+"""
+Multi-pattern keyword matching (Aho–Corasick): every keyword of every topic is compiled
+into one automaton, so a text is classified against all topic lists in a single pass,
+however many keywords there are.
+
+    router = KeywordRouter({"saylani": ("saylani", "charity"), "career": ("job*", "degree")})
+    router.topics("Any jobs at Saylani?")   -> ["saylani", "career"]
+
+Keywords match whole words only ("trust" does not fire on "trustworthy"); a keyword
+ending in "*" also matches longer words ("job*" -> "job", "jobs", "jobless").
+Matching is case-insensitive.
+"""
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordRouter:
+    def __init__(self, topics: dict, word_boundary: bool = True):
+        """topics: topic name -> iterable of keywords / phrases."""
+        self.names = list(topics)
+        self.word_boundary = word_boundary
+        # State 0 is the root. _delta[state]: char -> next state, with failure links already
+        # followed (a char missing from the dict goes back to the root).
+        self._delta = [{}]
+        # _out[state]: (keyword length, topic number, prefix keyword) of every keyword ending here
+        self._out = [[]]
+        for topic, keywords in enumerate(topics.values()):
+            for keyword in keywords:
+                prefix = keyword.endswith("*")
+                keyword = keyword.rstrip("*").lower().strip()
+                if keyword:
+                    self._add(keyword, topic, prefix)
+        self._build()
+
+    def __len__(self) -> int:
+        """Number of automaton states."""
+        return len(self._delta)
+
+    def topics(self, text: str) -> list:
+        """Names of the topics with at least one keyword in text, in definition order."""
+        found = self._scan(text, stop_at_first=False)
+        return [name for i, name in enumerate(self.names) if i in found]
+
+    def matches(self, text: str) -> bool:
+        """True if any keyword of any topic is in text (stops at the first hit)."""
+        return bool(self._scan(text, stop_at_first=True))
+
+    # ---- internals ----
+
+    def _add(self, keyword: str, topic: int, prefix: bool):
+        state = 0
+        for ch in keyword:
+            nxt = self._delta[state].get(ch)
+            if nxt is None:
+                nxt = len(self._delta)
+                self._delta.append({})
+                self._out.append([])
+                self._delta[state][ch] = nxt
+            state = nxt
+        self._out[state].append((len(keyword), topic, prefix))
+
+    def _build(self):
+        """Breadth-first: failure links, inherited outputs, then the full transition table."""
+        goto = [dict(d) for d in self._delta]
+        fail = [0] * len(goto)
+        order = []
+        queue = list(goto[0].values())
+        while queue:
+            order.extend(queue)
+            next_queue = []
+            for state in queue:
+                for ch, child in goto[state].items():
+                    f = fail[state]
+                    while f and ch not in goto[f]:
+                        f = fail[f]
+                    fail[child] = goto[f].get(ch, 0)
+                    self._out[child] = self._out[child] + self._out[fail[child]]
+                    next_queue.append(child)
+            queue = next_queue
+        # Parents come before children in `order`, so the failure state's table is complete
+        for state in order:
+            delta = dict(self._delta[fail[state]])
+            delta.update(goto[state])
+            self._delta[state] = delta
+        self._out = [tuple(out) for out in self._out]
+
+    def _scan(self, text: str, stop_at_first: bool) -> set:
+        text = text.lower()
+        n = len(text)
+        delta, out = self._delta, self._out
+        word_boundary = self.word_boundary
+        found = set()
+        state = 0
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if not out[state]:
+                continue
+            for length, topic, prefix in out[state]:
+                if topic in found:
+                    continue
+                if word_boundary:
+                    start = i - length + 1
+                    if start > 0 and _is_word_char(text[start - 1]):
+                        continue
+                    if not prefix and i + 1 < n and _is_word_char(text[i + 1]):
+                        continue
+                found.add(topic)
+                if stop_at_first or len(found) == len(self.names):
+                    return found
+        return found
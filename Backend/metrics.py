@@ -0,0 +1,304 @@
+"""
+Prometheus text-format metrics and per-request stage timing, without extra dependencies.
+
+    REGISTRY.render()          -> text for GET /metrics
+    trace = RequestTrace(...)  -> one chat turn; `with trace.span("kb_search"): ...`
+    on_turn_finished(cb)       -> cb(trace, outcome, seconds) for every finished turn
+    RequestIdMiddleware        -> X-Request-ID on every response (taken from the request if sent)
+"""
+import contextvars
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+# Seconds; covers fast cache hits up to slow CPU generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+
+def _labels_text(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self, **labels) -> float:
+        """Sum of the series with these label values (all series if none are given)."""
+        wanted = [(self.labelnames.index(name), str(value)) for name, value in labels.items()]
+        return sum(value for key, value in self._values.items() if all(key[i] == v for i, v in wanted))
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._values = {}   # label values -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, le)} {bucket_count}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics of this process. Besides counters/histograms, collectors are functions called
+    at scrape time that return [(name, type, help, [(labels dict, value), ...])], used to
+    export gauges and the counters other components already keep in their stats().
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"❌ Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_labels_text(names, tuple(labels[n] for n in names))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    "qyrix_chat_requests_total", "Chat turns by persona, route and outcome "
+    "(ok, fallback, cached, degraded, busy, error, cancelled, kb_race)", ("persona", "route", "outcome"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "qyrix_chat_request_duration_seconds", "Chat turn latency, request to reply", ("persona", "route"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "qyrix_chat_stage_duration_seconds", "Time spent per pipeline stage of a chat turn", ("persona", "stage"))
+OLLAMA_SECONDS = REGISTRY.histogram(
+    "qyrix_ollama_duration_seconds", "Ollama timings: ttft (measured), prompt_eval / eval / total "
+    "(reported by Ollama)", ("model", "phase"))
+OLLAMA_TOKENS = REGISTRY.counter(
+    "qyrix_ollama_tokens_total", "Tokens processed by Ollama", ("model", "kind"))
+FIRST_TURN_SECONDS = REGISTRY.histogram(
+    "qyrix_first_turn_prefill_seconds", "Ollama model load + prompt processing on the first turn of a "
+    "session, by start: cold (model loaded), prefill (full prompt processed), warm (cached prefix reused)",
+    ("persona", "start"))
+KB_RACES = REGISTRY.counter(
+    "qyrix_kb_race_total", "KB-routed streamed turns by who answered: model (first sentence in time), "
+    "kb (deadline missed, KB answer sent), no_kb_answer", ("persona", "winner"))
+FALLBACKS = REGISTRY.counter(
+    "qyrix_fallback_total", "Replies replaced by a knowledge base answer", ("persona",))
+ERRORS = REGISTRY.counter(
+    "qyrix_errors_total", "Failed Ollama calls by error class", ("persona", "error_class"))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "qyrix_response_cache_total", "Response cache results (HIT, MISS, BYPASS, SKIP)", ("persona", "result"))
+
+
+class ActivityTracker:
+    """Sessions (persona, user_id) that chatted within the last `window` seconds in this process."""
+
+    def __init__(self, window: float = 300.0, max_entries: int = 100000):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+
+    def touch(self, key):
+        self._seen[key] = time.monotonic()
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def count(self) -> int:
+        cutoff = time.monotonic() - self.window
+        while self._seen:
+            key, seen = next(iter(self._seen.items()))
+            if seen >= cutoff:
+                break
+            del self._seen[key]
+        return len(self._seen)
+
+
+ACTIVE_SESSIONS = ActivityTracker()
+
+SLOW_TURN_SECONDS = float(os.getenv("SLOW_TURN_SECONDS", "5"))
+
+_turn_listeners = []
+
+
+def on_turn_finished(callback):
+    """callback(trace, outcome, seconds) after every finished turn, e.g. the conversation log."""
+    _turn_listeners.append(callback)
+
+
+class _Span:
+    __slots__ = ("trace", "stage", "started")
+
+    def __init__(self, trace, stage: str):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class RequestTrace:
+    """Stage timings of one chat turn; finish() records them and logs the turn if it was slow."""
+
+    def __init__(self, persona: str, route: str, user_id: str, text: str = ""):
+        self.persona = persona
+        self.route = route
+        self.user_id = user_id
+        self.text = text
+        self.request_id = request_id_var.get()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.done = False
+        self.first_turn = False   # first turn of the session (set while building the prompt)
+        # What the turn did, for on_turn_finished listeners
+        self.reply = ""
+        self.model = ""
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.kb_sections = 0
+        self.fallback = False     # a knowledge base answer was used
+        ACTIVE_SESSIONS.touch((persona, user_id))
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, persona=self.persona, stage=stage)
+
+    def ollama_stats(self, model: str, data: dict):
+        """Durations and token counts from Ollama's final response / done chunk (nanoseconds)."""
+        for phase in ("prompt_eval", "eval", "load", "total"):
+            ns = data.get(f"{phase}_duration")
+            if ns:
+                OLLAMA_SECONDS.observe(ns / 1e9, model=model, phase=phase)
+        self.model = model
+        self.prompt_tokens = data.get("prompt_eval_count", 0)
+        self.completion_tokens = data.get("eval_count", 0)
+        OLLAMA_TOKENS.inc(self.prompt_tokens, model=model, kind="prompt")
+        OLLAMA_TOKENS.inc(self.completion_tokens, model=model, kind="completion")
+
+    def first_token(self, model: str, since: float):
+        OLLAMA_SECONDS.observe(time.perf_counter() - since, model=model, phase="ttft")
+
+    def error(self, error_class: str):
+        ERRORS.inc(persona=self.persona, error_class=error_class)
+
+    def finish(self, outcome: str, reply: str = ""):
+        if self.done:
+            return
+        self.done = True
+        self.reply = reply
+        total = time.perf_counter() - self.started
+        REQUESTS.inc(persona=self.persona, route=self.route, outcome=outcome)
+        REQUEST_SECONDS.observe(total, persona=self.persona, route=self.route)
+        if total >= SLOW_TURN_SECONDS:
+            stages = " ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in self.stages.items())
+            print(f"🐢 Slow turn {self.request_id} ({self.persona} {self.route}, {outcome}): {total:.1f} s | {stages}")
+        for callback in _turn_listeners:
+            callback(self, outcome, total)
+
+
+class RequestIdMiddleware:
+    """Tag every request with an id (client's X-Request-ID or a new one), echoed in the X-Request-ID header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = ""
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,99 @@
+import os
+
+import httpx
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class OllamaClient:
+    """
+    One shared, keep-alive, connection-pooled async client for the Ollama HTTP API.
+    Created once per app and opened/closed from the FastAPI lifespan, so chat turns
+    reuse TCP connections instead of opening a new one per request.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 300.0,
+        pool_timeout: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # Separate connect and read timeouts: a dead Ollama fails in seconds,
+        # while a slow generation still gets the full read budget.
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=connect_timeout,
+            pool=pool_timeout,
+        )
+        self._client = None
+
+    @classmethod
+    def from_env(cls, base_url: str) -> "OllamaClient":
+        """Build a client with pool limits and timeouts from OLLAMA_* environment variables."""
+        return cls(
+            base_url,
+            max_connections=_env_int("OLLAMA_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("OLLAMA_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float("OLLAMA_KEEPALIVE_EXPIRY", 30.0),
+            connect_timeout=_env_float("OLLAMA_CONNECT_TIMEOUT", 10.0),
+            read_timeout=_env_float("OLLAMA_READ_TIMEOUT", 300.0),
+            pool_timeout=_env_float("OLLAMA_POOL_TIMEOUT", 30.0),
+        )
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, limits=self.limits, timeout=self.timeout
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("OllamaClient is not started (app lifespan did not run)")
+        return self._client
+
+    async def chat(self, payload: dict) -> httpx.Response:
+        """POST /api/chat and return the full (non-streamed) response."""
+        return await self.client.post("/api/chat", json=payload)
+
+    def stream_chat(self, payload: dict):
+        """POST /api/chat as a stream; use with `async with`."""
+        return self.client.stream("POST", "/api/chat", json=payload)
+
+    async def tags(self, timeout: float = 5.0) -> httpx.Response:
+        """GET /api/tags (list of pulled models)."""
+        return await self.client.get("/api/tags", timeout=timeout)
+
+
+def is_connect_error(error: Exception) -> bool:
+    """Ollama could not be reached at all (refused / DNS / connect timeout)."""
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def is_timeout_error(error: Exception) -> bool:
+    """Ollama was reached but did not answer in time."""
+    return isinstance(error, httpx.TimeoutException) and not is_connect_error(error)
@@ -0,0 +1,252 @@
+"""
+A pool of Ollama servers behind one client interface (OLLAMA_BASE_URL can list several,
+comma-separated). Each request goes to a node that has the model pulled:
+
+- Conversations are sticky: the same key (persona + user) goes to the same node while it
+  is up and not much busier than the others, so Ollama can reuse that conversation's
+  cached prompt prefix (KV cache) there.
+- Otherwise the node with the fewest requests in flight is used.
+- Every OLLAMA_HEALTH_INTERVAL seconds each node is asked for /api/tags, which tells if it
+  is up and which models it has. A node that refuses a connection is taken out right away
+  and the request is retried on another node; it comes back with its next good check.
+- models() is the merged model list from those checks, without asking Ollama again.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from ollama_client import OllamaClient, is_connect_error
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _model_name(name: str) -> str:
+    """Ollama treats "llama3.2" and "llama3.2:latest" as the same model."""
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaNode:
+    """One Ollama server: its client, health and requests in flight."""
+
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.url = client.base_url
+        self.healthy = True      # until a check or a request says otherwise
+        self.models = None       # set of pulled models; None = not known yet
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def has(self, model: str) -> bool:
+        return self.models is None or _model_name(model) in self.models
+
+    def mark_down(self, error: Exception):
+        self.errors += 1
+        self.last_error = str(error) or type(error).__name__
+        if self.healthy:
+            print(f"❌ Ollama node {self.url} is down: {self.last_error}")
+        self.healthy = False
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "models": sorted(self.models) if self.models is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    """
+    Same calls as OllamaClient (start, close, chat, stream_chat), spread over several
+    nodes. chat / stream_chat take an optional sticky `key`.
+    """
+
+    def __init__(self, clients: list, health_interval: float = 10.0, health_timeout: float = 3.0,
+                 sticky_slack: int = 2, max_sticky_keys: int = 10000):
+        self.nodes = [OllamaNode(client) for client in clients]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.sticky_slack = sticky_slack
+        self.max_sticky_keys = max_sticky_keys
+        self._sticky = OrderedDict()   # key -> node url, least recently used first
+        self._health_task = None
+        self._on_node_up = []
+        self.counters = {"sticky_hits": 0, "sticky_moves": 0, "failovers": 0}
+
+    @classmethod
+    def from_env(cls, base_urls: str) -> "OllamaPool":
+        """
+        base_urls: comma-separated Ollama URLs; each node gets a client from OLLAMA_* pool
+        settings. OLLAMA_HEALTH_INTERVAL, OLLAMA_HEALTH_TIMEOUT, OLLAMA_STICKY_SLACK.
+        """
+        urls = [url.strip() for url in base_urls.split(",") if url.strip()]
+        return cls(
+            [OllamaClient.from_env(url) for url in dict.fromkeys(urls)],
+            health_interval=_env_float("OLLAMA_HEALTH_INTERVAL", 10.0),
+            health_timeout=_env_float("OLLAMA_HEALTH_TIMEOUT", 3.0),
+            sticky_slack=_env_int("OLLAMA_STICKY_SLACK", 2),
+        )
+
+    def on_node_up(self, callback):
+        """callback(node) when a node that was down answers its health check again."""
+        self._on_node_up.append(callback)
+
+    async def start(self):
+        """Open the clients. The first health check runs in the background (a down node must not hold up startup)."""
+        for node in self.nodes:
+            await node.client.start()
+        if self.health_interval <= 0:
+            await self.refresh()
+        elif self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for node in self.nodes:
+            await node.client.close()
+
+    def nodes_for(self, model: str) -> list:
+        """Healthy nodes that have the model (or, if none does, every healthy node)."""
+        up = [node for node in self.nodes if node.healthy]
+        return [node for node in up if node.has(model)] or up
+
+    async def chat(self, payload: dict, key: str = "", node: OllamaNode = None):
+        """POST /api/chat (not streamed) on the chosen node, or on `node`."""
+        if node is not None:
+            return await self._send(node, node.client.chat(payload))
+        tried = []
+        while True:
+            node = self._pick(payload["model"], key, tried)
+            try:
+                return await self._send(node, node.client.chat(payload))
+            except Exception as e:
+                if not self._failover(node, e, tried, payload["model"]):
+                    raise
+
+    @asynccontextmanager
+    async def stream_chat(self, payload: dict, key: str = ""):
+        """POST /api/chat as a stream; use with `async with`."""
+        tried = []
+        while True:
+            node = self._pick(payload["model"], key, tried)
+            node.outstanding += 1
+            node.requests += 1
+            try:
+                try:
+                    stream = node.client.stream_chat(payload)
+                    response = await stream.__aenter__()
+                except Exception as e:
+                    if self._failover(node, e, tried, payload["model"]):
+                        continue
+                    raise
+                try:
+                    yield response
+                except BaseException as e:
+                    if not await stream.__aexit__(type(e), e, e.__traceback__):
+                        raise
+                else:
+                    await stream.__aexit__(None, None, None)
+                return
+            finally:
+                node.outstanding -= 1
+
+    async def models(self) -> list:
+        """Models pulled on any node, from the last health checks."""
+        if all(node.models is None for node in self.nodes):
+            await self.refresh()
+        names = set()
+        for node in self.nodes:
+            names |= node.models or set()
+        return sorted(names)
+
+    async def refresh(self):
+        """Check every node now (GET /api/tags)."""
+        await asyncio.gather(*(self._check(node) for node in self.nodes))
+
+    def stats(self) -> dict:
+        return {
+            "nodes": {node.url: node.stats() for node in self.nodes},
+            "healthy": sum(node.healthy for node in self.nodes),
+            "sticky_keys": len(self._sticky),
+            **self.counters,
+        }
+
+    # ---- internals ----
+
+    def _pick(self, model: str, key: str, tried: list) -> OllamaNode:
+        candidates = [node for node in self.nodes_for(model) if node not in tried]
+        if not candidates:
+            # Every node is down: try one anyway, the error tells the caller (and the breaker)
+            candidates = [node for node in self.nodes if node not in tried] or self.nodes
+        least = min(candidates, key=lambda node: (node.outstanding, node.requests))
+        if not key:
+            return least
+        url = self._sticky.get(key)
+        sticky = next((node for node in candidates if node.url == url), None)
+        if sticky is not None and sticky.outstanding <= least.outstanding + self.sticky_slack:
+            self._sticky.move_to_end(key)
+            self.counters["sticky_hits"] += 1
+            return sticky
+        if url is not None:
+            self.counters["sticky_moves"] += 1
+        self._sticky[key] = least.url
+        self._sticky.move_to_end(key)
+        while len(self._sticky) > self.max_sticky_keys:
+            self._sticky.popitem(last=False)
+        return least
+
+    async def _send(self, node: OllamaNode, request):
+        node.outstanding += 1
+        node.requests += 1
+        try:
+            return await request
+        finally:
+            node.outstanding -= 1
+
+    def _failover(self, node: OllamaNode, error: Exception, tried: list, model: str) -> bool:
+        """True if the request should be retried on another node (this one could not be reached)."""
+        if not is_connect_error(error):
+            return False
+        node.mark_down(error)
+        tried.append(node)
+        if not any(other not in tried for other in self.nodes_for(model)):
+            return False
+        self.counters["failovers"] += 1
+        return True
+
+    async def _check(self, node: OllamaNode):
+        was_healthy = node.healthy
+        try:
+            response = await node.client.tags(timeout=self.health_timeout)
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/tags answered {response.status_code}")
+            node.models = {_model_name(m.get("name", "")) for m in response.json().get("models", [])}
+        except Exception as e:
+            node.mark_down(e)
+            return
+        node.healthy = True
+        if not was_healthy:
+            print(f"✅ Ollama node {node.url} is up ({len(node.models)} models)")
+            for callback in self._on_node_up:
+                callback(node)
+
+    async def _health_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.health_interval)
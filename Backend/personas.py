@@ -0,0 +1,209 @@
+"""
+Persona registry: everything that differs between the bots lives here as config.
+chat_app.create_app turns each Persona into its own routes; KB indexes, the Ollama client,
+sessions and the response cache are shared. Adding a bot = adding a Persona below.
+"""
+from dataclasses import dataclass, field
+
+from keyword_router import KeywordRouter
+
+# Knowledge base files (in the Backend folder), shared by every persona that uses them:
+# name -> (file name, text used when the file is missing)
+KB_FILES = {
+    "saylani": ("Saylani_Welfare_Knowledge_Base.txt", "(Saylani knowledge base file not found.)"),
+    "career": ("AshuAI_Complete_Training_Data.txt", "(AshuAI career training data file not found.)"),
+}
+
+DEFAULT_OPTIONS = {
+    "temperature": 0.7,
+    "num_predict": 256,   # Shorter reply = faster (was 1024)
+    "num_ctx": 2048,      # Less context = slightly faster on slow PCs
+}
+
+
+@dataclass(frozen=True)
+class KBRoute:
+    """
+    Questions containing one of the keywords are answered from this KB if the model has no answer.
+    Keywords match whole words; "word*" also matches longer words (see keyword_router.py).
+    """
+    kb: str
+    keywords: tuple
+    reply_prefix: str
+
+    def __post_init__(self):
+        object.__setattr__(self, "_router", KeywordRouter({self.kb: self.keywords}))
+
+    def matches(self, query: str) -> bool:
+        return self._router.matches(query)
+
+
+@dataclass
+class Persona:
+    key: str                    # session / response cache namespace
+    name: str                   # used in logs and "Sorry, <name> did not respond."
+    chat_route: str             # POST route; also <chat_route>_stream, _voice, _batch and the _ws WebSocket
+    system_prompt: str
+    context_kb: str             # KB whose relevant sections are sent with each turn
+    context_title: str
+    # Appended to the system prompt per KB_PROMPT_MODE ("full" also appends the whole KB text)
+    kb_instructions: dict = field(default_factory=dict)
+    kb_instructions_need_kb: bool = False   # skip the instructions when the KB file is missing
+    kb_routes: tuple = ()       # keyword routers for KB fallback answers, first match wins
+    user_suffix: str = ""       # appended to every user message
+    # Wraps the KB answer sent when the model misses KB_RACE_DEADLINE ({name}, {reply}); "" = as is
+    race_template: str = ""
+    model: str = ""             # "" = OLLAMA_MODEL
+    options: dict = field(default_factory=lambda: dict(DEFAULT_OPTIONS))
+    status: str = ""
+    note: str = "Make sure Ollama is running locally"
+
+    def __post_init__(self):
+        # Every route's keywords in one automaton: one pass over the query finds all routes
+        self._router = KeywordRouter({i: route.keywords for i, route in enumerate(self.kb_routes)})
+
+    @property
+    def stream_route(self) -> str:
+        return self.chat_route + "_stream"
+
+    @property
+    def voice_route(self) -> str:
+        return self.chat_route + "_voice"
+
+    @property
+    def ws_route(self) -> str:
+        return self.chat_route + "_ws"
+
+    @property
+    def batch_route(self) -> str:
+        return self.chat_route + "_batch"
+
+    @property
+    def kb_names(self) -> set:
+        return {self.context_kb} | {route.kb for route in self.kb_routes}
+
+    def build_system_prompt(self, kbs: dict, mode: str) -> str:
+        kb = kbs[self.context_kb]
+        if self.kb_instructions_need_kb and not kb.available:
+            return self.system_prompt
+        prompt = self.system_prompt + self.kb_instructions.get(mode, "")
+        if mode == "full":
+            prompt += f"\n\n--- {self.context_title} (use this to answer) ---\n{kb.text}\n--- END ---"
+        return prompt
+
+    def match_routes(self, query: str) -> list:
+        """KB routes whose keywords are in the query, in kb_routes order."""
+        return [self.kb_routes[i] for i in self._router.topics(query)]
+
+    def race_reply(self, kb_reply: str) -> str:
+        """KB answer in the persona's voice, for replies that skip the model (KB_RACE_DEADLINE)."""
+        return self.race_template.format(name=self.name, reply=kb_reply) if self.race_template else kb_reply
+
+    def fallback_reply(self, query: str, kbs: dict, routes: list = None) -> str:
+        """
+        KB answer for the first matching route, or empty string if none applies.
+        Pass routes (from match_routes) to skip matching the query again.
+        """
+        for route in self.match_routes(query) if routes is None else routes:
+            answer = kbs[route.kb].index.search(query.strip())
+            if answer:
+                return route.reply_prefix + answer
+        return ""
+
+
+# Keywords that indicate user is asking about Saylani / charity
+SAYLANI_ROUTE = KBRoute(
+    kb="saylani",
+    keywords=(
+        "saylani", "welfare", "charity", "charitable", "trust", "maulana", "bashir",
+        "farooqui", "dastarkhwan*", "ration", "rations", "smit", "mass it", "pakistan", "non-profit",
+        "free food", "free education", "free medical", "thali", "koi bhooka"
+    ),
+    reply_prefix="Here is the information from Saylani Welfare knowledge base:\n\n",
+)
+
+# Keywords that indicate user is asking about career / degree / jobs / software houses
+CAREER_ROUTE = KBRoute(
+    kb="career",
+    keywords=(
+        "career*", "degree*", "job", "jobs", "software house*", "internship*",
+        "bscs", "bsit", "bsse", "bba", "computer science", "information technology",
+        "karachi", "lahore", "hyderabad", "sindh", "pakistan", "developer*", "engineer*",
+        "what can i do", "which job", "where to work", "company", "companies", "skill*"
+    ),
+    reply_prefix="Here's some guidance from my career data 🌸\n\n",
+)
+
+
+AHMED = Persona(
+    key="ahmed",
+    name="Ahmed",
+    chat_route="/chat",
+    system_prompt=(
+        "You are Ahmed, a cute and friendly KID assistant. Your name is Ahmed (not Qyrix). Talk like a sweet, cheerful child (around 6–8 years old). "
+        "Use simple, short words. Be excited and happy! You can use words like 'wow', 'yay', 'cool', 'super', 'awesome'. "
+        "ONLY ENGLISH. Reply in English only. No Hindi. No Urdu. Keep sentences short and easy to understand.\n\n"
+    ),
+    context_kb="saylani",
+    context_title="INFORMATION ABOUT SAYLANI WELFARE",
+    kb_instructions={
+        "full": (
+            "SAYLANI WELFARE: You HAVE the following information. Saylani Welfare is a REAL charity in Pakistan. "
+            "When the user asks about Saylani, charity, or Pakistan help, answer using ONLY the text below in your kid-friendly way. "
+            "Do NOT say you don't have information. Use the info here and explain it like a kind kid would!"
+        ),
+        # Retrieval mode: the relevant KB sections are added per turn
+        "retrieval": (
+            "SAYLANI WELFARE: Saylani Welfare is a REAL charity in Pakistan. "
+            "When the user asks about Saylani, charity, or Pakistan help, you will be given INFORMATION ABOUT SAYLANI WELFARE. "
+            "Answer using ONLY that information in your kid-friendly way. "
+            "Do NOT say you don't have information. Use the info and explain it like a kind kid would!"
+        ),
+    },
+    kb_routes=(SAYLANI_ROUTE,),
+    race_template="Ooh, I know this one! {reply}",
+    # Force English reply (reminder on every turn)
+    user_suffix="\n\n[Reply in English only. Do not use Hindi or Urdu.]",
+    status="Ahmed Ollama backend is live 🚀",
+)
+
+
+_CAREER_GUIDANCE = (
+    "\n\nCAREER GUIDANCE (use this when user asks about degree, jobs, software houses, cities):\n"
+    "You also guide students for career in Pakistan. When they ask about degree (BSCS, BSIT, BSSE, BBA), "
+    "jobs, software houses, or cities (Karachi, Lahore, Hyderabad), use ONLY {source}. "
+    "Be supportive, motivating, and friendly. Follow the flow: ask degree → city → interest → suggest roles "
+    "and software houses → suggest skills. Stay warm and encouraging."
+)
+
+# Aasho persona: flirty, confident, HR-style + career guidance (AshuAI training data)
+AASHO = Persona(
+    key="aasho",
+    name="Aasho",
+    chat_route="/aasho_chat",
+    system_prompt=(
+        "You are Aasho, a stunning, confident woman with a flirty and playful personality. You talk like a fun HR or that attractive friend everyone loves—warm, a bit cheeky, and full of charm. Reply ONLY in English. No Hindi, No Urdu.\n\n"
+        "RULES:\n"
+        "- Be flirty but classy. Use light teasing, compliments, and playful banter.\n"
+        "- Call the user things like \"handsome\", \"sweetie\", \"you\" in a warm way. Make them feel special.\n"
+        "- Keep replies short and punchy (1–3 sentences usually). Sound natural, like texting a crush.\n"
+        "- Be confident and a little sassy. Add winks ;) or light emojis when it fits.\n"
+        "- If they ask something serious (e.g. career, degree, jobs), answer helpfully using the career data and still keep your charming tone.\n"
+        "- Never be rude or vulgar. Stay fun and engaging so talking to you is a mood booster."
+    ),
+    context_kb="career",
+    context_title="ASHUAI CAREER & INSTITUTIONAL GUIDANCE DATA",
+    kb_instructions={
+        "full": _CAREER_GUIDANCE.format(source="the following information"),
+        "retrieval": _CAREER_GUIDANCE.format(source="the ASHUAI CAREER & INSTITUTIONAL GUIDANCE DATA you are given"),
+    },
+    kb_instructions_need_kb=True,
+    # Saylani knowledge base wins when a question matches both
+    kb_routes=(SAYLANI_ROUTE, CAREER_ROUTE),
+    race_template="Quick answer for you, sweetie ;) {reply}",
+    status="Aasho Bot backend is live 🚀",
+    note="Aashobot.html connects to this server on port 8002",
+)
+
+
+PERSONAS = {p.key: p for p in (AHMED, AASHO)}
@@ -0,0 +1,181 @@
+import os
+import re
+import time
+from collections import OrderedDict
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+# A cached reply is only reused for a similar question with the same numbers and the same
+# negations ("t" is what is left of "don't" / "can't" after normalize_query)
+NEGATIONS = frozenset(("no", "not", "never", "nor", "none", "nothing", "without", "t"))
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace: 'What is Saylani?' -> 'what is saylani'."""
+    return " ".join(_PUNCT_RE.sub(" ", text.lower()).split())
+
+
+def query_tokens(norm: str) -> frozenset:
+    """Words of a normalized query for the similarity tier; unlike kb_index.tokenize, digits and short words are kept."""
+    return frozenset(norm.split())
+
+
+def _must_match(tokens: frozenset) -> frozenset:
+    """Numbers and negation words: questions that differ in these are never "similar"."""
+    return frozenset(tok for tok in tokens if tok in NEGATIONS or any(ch.isdigit() for ch in tok))
+
+
+class ResponseCache:
+    """
+    Cache of replies to first-turn / KB-routed questions, keyed by persona, model and
+    normalized query text.
+
+    - Exact tier: same normalized text.
+    - Similarity tier (optional): token-set Jaccard similarity >= similarity_threshold
+      against cached questions of the same persona/model ("saylani free food?" ~ "free food saylani"),
+      only if both have the same numbers and negation words ("i am 8" !~ "i am 9").
+    - Entries expire after ttl seconds; the least recently used go first beyond max_entries.
+    - Everything is dropped by clear(), which the KB manager's reload callback calls
+      whenever a KB file changes (chat_app._on_kb_reload).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0,
+                 similarity_threshold: float = 0.8, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled
+        self._entries = OrderedDict()   # key -> (reply, tokens, expires_at)
+        self._token_index = {}          # (persona, model, token) -> set of keys
+        self.counters = {
+            "hits_exact": 0,
+            "hits_similar": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stored": 0,
+            "evicted": 0,
+            "expired": 0,
+            "invalidations": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Build a cache configured from RESPONSE_CACHE_* environment variables."""
+        return cls(
+            max_entries=int(_env_float("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+            ttl=_env_float("RESPONSE_CACHE_TTL", 3600),
+            similarity_threshold=_env_float("RESPONSE_CACHE_SIMILARITY", 0.8),
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no"),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, persona: str, model: str, query: str):
+        """Cached reply for the query, or None."""
+        if not self.enabled:
+            return None
+        norm = normalize_query(query)
+        key = (persona, model, norm)
+        reply = self._lookup(key)
+        if reply is not None:
+            self.counters["hits_exact"] += 1
+            return reply
+        if self.similarity_threshold > 0:
+            similar = self._most_similar(persona, model, query_tokens(norm))
+            if similar is not None:
+                reply = self._lookup(similar)
+                if reply is not None:
+                    self.counters["hits_similar"] += 1
+                    return reply
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, persona: str, model: str, query: str, reply: str):
+        if not self.enabled:
+            return
+        norm = normalize_query(query)
+        key = (persona, model, norm)
+        if key in self._entries:
+            self._remove(key)
+        tokens = query_tokens(norm)
+        self._entries[key] = (reply, tokens, time.monotonic() + self.ttl)
+        for tok in tokens:
+            self._token_index.setdefault((persona, model, tok), set()).add(key)
+        self.counters["stored"] += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.counters["evicted"] += 1
+
+    def record_bypass(self):
+        self.counters["bypassed"] += 1
+
+    def clear(self):
+        """Drop every reply (a KB file changed, so they may be outdated)."""
+        if self._entries:
+            print("♻️ Knowledge base changed, response cache cleared")
+            self.counters["invalidations"] += 1
+        self._entries.clear()
+        self._token_index.clear()
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits_exact"] + self.counters["hits_similar"] + self.counters["misses"]
+        hits = self.counters["hits_exact"] + self.counters["hits_similar"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            **self.counters,
+        }
+
+    # ---- internals ----
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() > entry[2]:
+            self._remove(key)
+            self.counters["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _most_similar(self, persona: str, model: str, tokens: frozenset):
+        if not tokens:
+            return None
+        candidates = set()
+        for tok in tokens:
+            candidates |= self._token_index.get((persona, model, tok), set())
+        must_match = _must_match(tokens)
+        best, best_score = None, 0.0
+        for key in candidates:
+            other = self._entries[key][1]
+            if _must_match(other) != must_match:
+                continue
+            score = len(tokens & other) / len(tokens | other)
+            if score > best_score:
+                best, best_score = key, score
+        return best if best_score >= self.similarity_threshold else None
+
+    def _remove(self, key):
+        _, tokens, _ = self._entries.pop(key)
+        persona, model, _ = key
+        for tok in tokens:
+            keys = self._token_index.get((persona, model, tok))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._token_index[(persona, model, tok)]
+
+
+def cache_bypassed(headers) -> bool:
+    """Client asked to skip the cache with X-Cache-Bypass: 1 or Cache-Control: no-cache."""
+    if headers.get("x-cache-bypass", "").strip().lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in headers.get("cache-control", "").lower()
@@ -0,0 +1,77 @@
+import json
+import re
+
+# A sentence ends at . ! ? (optionally followed by closing quotes or brackets)
+# when whitespace follows, or at a line break.
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s)|\n+")
+
+# Common abbreviations that end with a dot but do not end a sentence
+_ABBREVIATIONS = ("dr.", "mr.", "mrs.", "ms.", "st.", "e.g.", "i.e.", "etc.", "vs.", "no.")
+
+
+class SentenceChunker:
+    """
+    Collects streamed text deltas from Ollama and cuts them at sentence boundaries,
+    so the frontend can start speaking the first sentence while the rest is generating.
+    """
+
+    def __init__(self, max_chars: int = 220):
+        # Very long run-on sentences are cut at the last comma/space after max_chars
+        # so TTS is never blocked waiting for a full stop.
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> list:
+        """Add a text delta and return any complete sentences."""
+        self._buffer += delta
+        sentences = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            sentence = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:].lstrip()
+            if sentence:
+                sentences.append(sentence)
+        return sentences
+
+    def flush(self) -> str:
+        """Return whatever text is left once the stream has finished."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return rest
+
+    def _find_cut(self):
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[: match.end()]
+            last_word = candidate.strip().rsplit(None, 1)[-1].lower() if candidate.strip() else ""
+            if last_word in _ABBREVIATIONS:
+                continue
+            return match.end()
+        if len(self._buffer) > self.max_chars:
+            head = self._buffer[: self.max_chars]
+            pos = max(head.rfind(", "), head.rfind("; "))
+            if pos <= 0:
+                pos = head.rfind(" ")
+            if pos > 0:
+                return pos + 1
+        return None
+
+
+def ndjson_event(event: dict) -> str:
+    """Serialize one streaming event as a line of newline-delimited JSON."""
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
+async def aiter_ollama_deltas(response):
+    """
+    Yield (content, chunk) pairs from a streamed Ollama /api/chat response.
+    The last chunk has done=True and carries the timing/eval counters.
+    """
+    async for line in response.aiter_lines():
+        if not line:
+            continue
+        chunk = json.loads(line)
+        if chunk.get("error"):
+            raise RuntimeError(chunk["error"])
+        yield chunk.get("message", {}).get("content", ""), chunk
@@ -0,0 +1,17 @@
+"""
+Qyrix backend with every persona from personas.py in one process: /chat (Ahmed),
+/aasho_chat (Aasho), ... sharing one Ollama client, KB indexes and session store.
+
+Run from the Backend folder:
+    uvicorn server:app --port 8001
+"""
+from chat_app import create_app
+from personas import PERSONAS
+
+app = create_app(list(PERSONAS.values()))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    print("🌐 Qyrix backend (all personas): http://127.0.0.1:8001")
+    uvicorn.run(app, host="127.0.0.1", port=8001)
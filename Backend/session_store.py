@@ -0,0 +1,558 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tokens import estimate_tokens
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _limits_from_env() -> dict:
+    return {
+        "idle_ttl": _env_int("SESSION_IDLE_TTL", 3600),
+        "max_turns": _env_int("SESSION_MAX_TURNS", 20),
+        "max_session_tokens": _env_int("SESSION_MAX_TOKENS", 1500),
+    }
+
+
+def trim_turns(turns: list, max_turns: int, max_tokens: int) -> int:
+    """
+    Drop the oldest turns (in place) until the list fits max_turns and max_tokens.
+    The latest message is always kept, and history never starts with an assistant reply.
+    Returns how many messages were dropped.
+    """
+    tokens = sum(estimate_tokens(t["content"]) for t in turns)
+    dropped = 0
+    while len(turns) > 1 and (len(turns) > max_turns or tokens > max_tokens):
+        tokens -= estimate_tokens(turns.pop(0)["content"])
+        dropped += 1
+    while len(turns) > 1 and turns[0]["role"] == "assistant":
+        turns.pop(0)
+        dropped += 1
+    return dropped
+
+
+class SessionStore:
+    """
+    Conversation store interface. Sessions are keyed by (persona, user_id); the persona
+    system prompt is registered once and prepended by messages(), never stored per user.
+
+    Backends (SESSION_BACKEND): "memory" (default, this process only), "sqlite" (WAL file
+    shared by all uvicorn workers on one host) and "redis" (any Redis-protocol server).
+    """
+
+    backend = ""
+
+    def __init__(self, idle_ttl: float = 3600.0, max_turns: int = 20, max_session_tokens: int = 1500):
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self.max_session_tokens = max_session_tokens
+        self.system_prompts = {}
+        self.counters = {"cleared": 0, "turns_trimmed": 0}
+
+    def register_persona(self, persona: str, system_prompt: str):
+        self.system_prompts[persona] = system_prompt
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def messages(self, persona: str, user_id: str) -> list:
+        """System prompt + the session's turns, ready to send to Ollama."""
+        system = [{"role": "system", "content": self.system_prompts[persona]}]
+        return system + await self.turns(persona, user_id)
+
+    async def turns(self, persona: str, user_id: str) -> list:
+        raise NotImplementedError
+
+    async def append(self, persona: str, user_id: str, role: str, content: str):
+        raise NotImplementedError
+
+    async def clear(self, persona: str, user_id: str) -> bool:
+        raise NotImplementedError
+
+    async def summary(self, persona: str, user_id: str):
+        """(text, span id) of the session's rolling history summary (history_compactor.py), or None."""
+        raise NotImplementedError
+
+    async def set_summary(self, persona: str, user_id: str, text: str, span: str):
+        """Store the summary with the session; ignored if the session is gone (cleared or expired)."""
+        raise NotImplementedError
+
+    async def drop_summary(self, persona: str, user_id: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, **self.counters}
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Bounded in-process store: LRU order, idle-TTL expiry, per-session turn/token limits
+    and a global memory cap (least recently used sessions go first).
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_sessions: int = 5000, max_total_chars: int = 64 * 1024 * 1024, **limits):
+        super().__init__(**limits)
+        self.max_sessions = max_sessions
+        self.max_total_chars = max_total_chars
+        self._sessions = OrderedDict()   # key -> [turns, chars, last_access, (summary, span) or None]
+        self._total_chars = 0
+        self.counters.update(created=0, evicted_lru=0, evicted_idle=0, evicted_memory=0)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def turns(self, persona: str, user_id: str) -> list:
+        session = self._touch((persona, user_id))
+        return list(session[0]) if session else []
+
+    async def append(self, persona: str, user_id: str, role: str, content: str):
+        """Add a message. A user message starts a new session if needed."""
+        key = (persona, user_id)
+        self._expire_idle()
+        session = self._touch(key)
+        if session is None:
+            if role != "user":
+                # Session was evicted while the reply was generating; nothing to attach it to
+                return
+            session = self._create(key)
+        session[0].append({"role": role, "content": content})
+        self._total_chars -= session[1]
+        self.counters["turns_trimmed"] += trim_turns(session[0], self.max_turns, self.max_session_tokens)
+        session[1] = sum(len(t["content"]) for t in session[0])
+        self._total_chars += session[1]
+        self._enforce_memory_cap(keep=key)
+
+    async def clear(self, persona: str, user_id: str) -> bool:
+        session = self._sessions.pop((persona, user_id), None)
+        if session is None:
+            return False
+        self._total_chars -= session[1]
+        self.counters["cleared"] += 1
+        return True
+
+    async def summary(self, persona: str, user_id: str):
+        session = self._touch((persona, user_id))
+        return session[3] if session else None
+
+    async def set_summary(self, persona: str, user_id: str, text: str, span: str):
+        session = self._sessions.get((persona, user_id))
+        if session is not None:
+            session[3] = (text, span)
+
+    async def drop_summary(self, persona: str, user_id: str):
+        session = self._sessions.get((persona, user_id))
+        if session is not None:
+            session[3] = None
+
+    def stats(self) -> dict:
+        return {**super().stats(), "sessions": len(self._sessions), "total_chars": self._total_chars}
+
+    def _touch(self, key):
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        if time.monotonic() - session[2] > self.idle_ttl:
+            self._evict(key, "evicted_idle")
+            return None
+        session[2] = time.monotonic()
+        self._sessions.move_to_end(key)
+        return session
+
+    def _create(self, key):
+        while len(self._sessions) >= self.max_sessions:
+            self._evict(next(iter(self._sessions)), "evicted_lru")
+        session = [[], 0, time.monotonic(), None]
+        self._sessions[key] = session
+        self.counters["created"] += 1
+        return session
+
+    def _evict(self, key, reason: str):
+        session = self._sessions.pop(key)
+        self._total_chars -= session[1]
+        self.counters[reason] += 1
+
+    def _expire_idle(self):
+        # LRU order == last-access order, so idle sessions are at the front
+        now = time.monotonic()
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session[2] <= self.idle_ttl:
+                break
+            self._evict(key, "evicted_idle")
+
+    def _enforce_memory_cap(self, keep):
+        while self._total_chars > self.max_total_chars and len(self._sessions) > 1:
+            key = next(iter(self._sessions))
+            if key == keep:
+                break
+            self._evict(key, "evicted_memory")
+
+
+class _BatchedSessionStore(SessionStore):
+    """
+    Base for shared backends. append() only queues the message; a background task writes
+    queued messages in one batch every flush_interval seconds, so a chat turn never waits
+    for disk or network. Reads merge the stored turns with this worker's queued ones.
+    """
+
+    def __init__(self, flush_interval: float = 0.05, max_batch: int = 500, **limits):
+        super().__init__(**limits)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = []            # [(key, message dict, timestamp)]
+        self._lock = asyncio.Lock()   # a flush and a read never interleave
+        self._wake = asyncio.Event()
+        self._task = None
+        self.counters.update(flushes=0, flushed_messages=0, flush_errors=0)
+
+    async def start(self):
+        await self._open()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self._close()
+
+    async def turns(self, persona: str, user_id: str) -> list:
+        key = (persona, user_id)
+        async with self._lock:
+            turns = await self._load(key)
+            turns += [msg for k, msg, _ in self._pending if k == key]
+        self.counters["turns_trimmed"] += trim_turns(turns, self.max_turns, self.max_session_tokens)
+        return turns
+
+    async def append(self, persona: str, user_id: str, role: str, content: str):
+        self._pending.append(((persona, user_id), {"role": role, "content": content}, time.time()))
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    async def clear(self, persona: str, user_id: str) -> bool:
+        # Not batched: other workers must stop seeing the history right away
+        key = (persona, user_id)
+        async with self._lock:
+            self._pending = [op for op in self._pending if op[0] != key]
+            existed = await self._delete(key)
+        if existed:
+            self.counters["cleared"] += 1
+        return existed
+
+    async def summary(self, persona: str, user_id: str):
+        # Not batched either: summaries are written rarely, in the background
+        return await self._load_summary((persona, user_id))
+
+    async def set_summary(self, persona: str, user_id: str, text: str, span: str):
+        await self._store_summary((persona, user_id), (text, span))
+
+    async def drop_summary(self, persona: str, user_id: str):
+        await self._store_summary((persona, user_id), None)
+
+    async def flush(self):
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                await self._write(batch)
+            except Exception as e:
+                # Keep the messages for the next attempt instead of losing the turns
+                self._pending = batch + self._pending
+                self.counters["flush_errors"] += 1
+                print(f"❌ Session store flush failed: {e}")
+                return
+        self.counters["flushes"] += 1
+        self.counters["flushed_messages"] += len(batch)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "pending": len(self._pending)}
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    # Backend hooks
+    async def _open(self):
+        raise NotImplementedError
+
+    async def _close(self):
+        raise NotImplementedError
+
+    async def _load(self, key) -> list:
+        raise NotImplementedError
+
+    async def _write(self, batch: list):
+        raise NotImplementedError
+
+    async def _delete(self, key) -> bool:
+        raise NotImplementedError
+
+    async def _load_summary(self, key):
+        raise NotImplementedError
+
+    async def _store_summary(self, key, summary):
+        raise NotImplementedError
+
+
+class SQLiteSessionStore(_BatchedSessionStore):
+    """
+    Sessions in a SQLite file in WAL mode, shared by every uvicorn worker on the host and
+    kept across restarts. All SQLite calls run on one dedicated thread; a batch is one
+    transaction with synchronous=NORMAL, so there is no fsync per chat turn.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-sqlite")
+        self._db = None
+        self._last_sweep = 0.0
+        self.counters.update(evicted_idle=0)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _open(self):
+        await self._run(self._open_sync)
+
+    def _open_sync(self):
+        self._db = sqlite3.connect(self.path, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                persona TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (persona, user_id)
+            );
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                persona TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS turns_by_session ON turns (persona, user_id, id);
+            CREATE TABLE IF NOT EXISTS summaries (
+                persona TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                span TEXT NOT NULL,
+                PRIMARY KEY (persona, user_id)
+            );
+            """
+        )
+        self._db.commit()
+
+    async def _close(self):
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=True)
+
+    async def _load(self, key) -> list:
+        return await self._run(self._load_sync, key)
+
+    def _load_sync(self, key) -> list:
+        row = self._db.execute(
+            "SELECT last_access FROM sessions WHERE persona = ? AND user_id = ?", key
+        ).fetchone()
+        if row is None or time.time() - row[0] > self.idle_ttl:
+            return []
+        rows = self._db.execute(
+            "SELECT role, content FROM turns WHERE persona = ? AND user_id = ? ORDER BY id DESC LIMIT ?",
+            (*key, self.max_turns),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    async def _write(self, batch: list):
+        await self._run(self._write_sync, batch)
+
+    def _write_sync(self, batch: list):
+        touched = {}
+        with self._db:
+            for key, msg, ts in batch:
+                self._db.execute(
+                    "INSERT INTO turns (persona, user_id, role, content) VALUES (?, ?, ?, ?)",
+                    (*key, msg["role"], msg["content"]),
+                )
+                touched[key] = ts
+            for key, ts in touched.items():
+                self._db.execute(
+                    "INSERT INTO sessions (persona, user_id, last_access) VALUES (?, ?, ?) "
+                    "ON CONFLICT (persona, user_id) DO UPDATE SET last_access = excluded.last_access",
+                    (*key, ts),
+                )
+                # Keep only the newest max_turns rows per session on disk
+                self._db.execute(
+                    "DELETE FROM turns WHERE persona = ? AND user_id = ? AND id NOT IN ("
+                    "SELECT id FROM turns WHERE persona = ? AND user_id = ? ORDER BY id DESC LIMIT ?)",
+                    (*key, *key, self.max_turns),
+                )
+            if time.time() - self._last_sweep > 60:
+                self._sweep_idle_sync()
+
+    def _sweep_idle_sync(self):
+        cutoff = time.time() - self.idle_ttl
+        expired = self._db.execute("SELECT persona, user_id FROM sessions WHERE last_access < ?", (cutoff,)).fetchall()
+        for key in expired:
+            self._db.execute("DELETE FROM turns WHERE persona = ? AND user_id = ?", key)
+            self._db.execute("DELETE FROM summaries WHERE persona = ? AND user_id = ?", key)
+            self._db.execute("DELETE FROM sessions WHERE persona = ? AND user_id = ?", key)
+        self.counters["evicted_idle"] += len(expired)
+        self._last_sweep = time.time()
+
+    async def _delete(self, key) -> bool:
+        return await self._run(self._delete_sync, key)
+
+    def _delete_sync(self, key) -> bool:
+        with self._db:
+            self._db.execute("DELETE FROM turns WHERE persona = ? AND user_id = ?", key)
+            self._db.execute("DELETE FROM summaries WHERE persona = ? AND user_id = ?", key)
+            cur = self._db.execute("DELETE FROM sessions WHERE persona = ? AND user_id = ?", key)
+        return cur.rowcount > 0
+
+    async def _load_summary(self, key):
+        return await self._run(self._load_summary_sync, key)
+
+    def _load_summary_sync(self, key):
+        row = self._db.execute(
+            "SELECT text, span, last_access FROM summaries JOIN sessions USING (persona, user_id) "
+            "WHERE persona = ? AND user_id = ?", key
+        ).fetchone()
+        if row is None or time.time() - row[2] > self.idle_ttl:
+            return None
+        return row[0], row[1]
+
+    async def _store_summary(self, key, summary):
+        await self._run(self._store_summary_sync, key, summary)
+
+    def _store_summary_sync(self, key, summary):
+        with self._db:
+            if summary is None:
+                self._db.execute("DELETE FROM summaries WHERE persona = ? AND user_id = ?", key)
+                return
+            self._db.execute(
+                "INSERT INTO summaries (persona, user_id, text, span) "
+                "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM sessions WHERE persona = ? AND user_id = ?) "
+                "ON CONFLICT (persona, user_id) DO UPDATE SET text = excluded.text, span = excluded.span",
+                (*key, *summary, *key),
+            )
+
+
+class RedisSessionStore(_BatchedSessionStore):
+    """
+    Sessions as Redis lists (one JSON message per element), shared by every worker and
+    replica. Works with any Redis-protocol server (Redis, Valkey, KeyDB, or a local
+    stand-in such as fakeredis). Each batch is one pipelined round trip; lists are
+    trimmed to max_turns and expire after idle_ttl.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "qyrix:session:", client=None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+
+    def _key(self, key) -> str:
+        persona, user_id = key
+        return f"{self.prefix}{persona}:{user_id}"
+
+    def _summary_key(self, key) -> str:
+        persona, user_id = key
+        return f"{self.prefix}summary:{persona}:{user_id}"
+
+    async def _open(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as aioredis  # only needed for SESSION_BACKEND=redis
+            except ImportError:
+                raise RuntimeError("SESSION_BACKEND=redis needs the 'redis' package: pip install redis")
+            self._client = aioredis.from_url(self.url)
+        await self._client.ping()
+
+    async def _close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _load(self, key) -> list:
+        raw = await self._client.lrange(self._key(key), -self.max_turns, -1)
+        return [json.loads(item) for item in raw]
+
+    async def _write(self, batch: list):
+        pipe = self._client.pipeline(transaction=False)
+        touched = set()
+        for key, msg, _ in batch:
+            pipe.rpush(self._key(key), json.dumps(msg, ensure_ascii=False))
+            touched.add(key)
+        for key in touched:
+            pipe.ltrim(self._key(key), -self.max_turns, -1)
+            pipe.expire(self._key(key), int(self.idle_ttl))
+            pipe.expire(self._summary_key(key), int(self.idle_ttl))   # the summary lives as long as its session
+        await pipe.execute()
+
+    async def _delete(self, key) -> bool:
+        return bool(await self._client.delete(self._key(key), self._summary_key(key)))
+
+    async def _load_summary(self, key):
+        raw = await self._client.get(self._summary_key(key))
+        return tuple(json.loads(raw)) if raw else None
+
+    async def _store_summary(self, key, summary):
+        if summary is None:
+            await self._client.delete(self._summary_key(key))
+        elif await self._client.exists(self._key(key)):
+            await self._client.set(self._summary_key(key), json.dumps(summary, ensure_ascii=False),
+                                   ex=int(self.idle_ttl))
+
+
+def create_session_store() -> SessionStore:
+    """Build the store selected by SESSION_BACKEND (memory / sqlite / redis) from SESSION_* env vars."""
+    backend = os.getenv("SESSION_BACKEND", "memory").strip().lower()
+    limits = _limits_from_env()
+    if backend == "memory":
+        return MemorySessionStore(
+            max_sessions=_env_int("SESSION_MAX_SESSIONS", 5000),
+            max_total_chars=_env_int("SESSION_MAX_TOTAL_MB", 64) * 1024 * 1024,
+            **limits,
+        )
+    batching = {
+        "flush_interval": _env_int("SESSION_FLUSH_MS", 50) / 1000,
+        "max_batch": _env_int("SESSION_MAX_BATCH", 500),
+    }
+    if backend == "sqlite":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.db")
+        return SQLiteSessionStore(os.getenv("SESSION_SQLITE_PATH", default_path), **batching, **limits)
+    if backend == "redis":
+        return RedisSessionStore(os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"), **batching, **limits)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (use memory, sqlite or redis)")
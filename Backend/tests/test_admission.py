@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+MODEL = "llama3.2:1b"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_the_limit_then_queues():
+    async def main():
+        admission = AdmissionController(max_concurrent=2, max_per_user=4)
+        await admission.acquire(MODEL, "a")
+        await admission.acquire(MODEL, "b")
+        waiter = asyncio.create_task(admission.acquire(MODEL, "c"))
+        await asyncio.sleep(0)
+        assert admission.stats()["models"][MODEL] == {"limit": 2, "active": 2, "queued": 1}
+        admission.release(MODEL, "a")
+        await waiter
+        assert admission.stats()["models"][MODEL] == {"limit": 2, "active": 2, "queued": 0}
+        assert admission.counters["admitted"] == 3 and admission.counters["queued"] == 1
+
+    run(main())
+
+
+def test_per_user_cap_is_429():
+    async def main():
+        admission = AdmissionController(max_concurrent=1, max_per_user=2)
+        await admission.acquire(MODEL, "a")
+        waiter = asyncio.create_task(admission.acquire(MODEL, "a"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire(MODEL, "a")
+        assert rejected.value.status_code == 429
+        assert rejected.value.retry_after >= 1
+        admission.check(MODEL, "b")   # other users are not affected
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    run(main())
+
+
+def test_full_queue_is_503():
+    async def main():
+        admission = AdmissionController(max_concurrent=1, max_queue=1, max_per_user=4)
+        await admission.acquire(MODEL, "a")
+        waiter = asyncio.create_task(admission.acquire(MODEL, "b"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            admission.check(MODEL, "c")
+        assert rejected.value.status_code == 503
+        assert admission.counters["rejected_queue_full"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    run(main())
+
+
+def test_models_have_their_own_limits():
+    async def main():
+        admission = AdmissionController(max_concurrent=1, model_limits={"big": 1})
+        await admission.acquire(MODEL, "a")
+        await admission.acquire("big", "b")   # not queued behind MODEL
+        assert admission.stats()["models"]["big"]["active"] == 1
+
+    run(main())
+
+
+def test_waiting_users_are_served_round_robin():
+    async def main():
+        admission = AdmissionController(max_concurrent=1, max_per_user=4)
+        await admission.acquire(MODEL, "holder")
+        order = []
+
+        async def ask(user):
+            await admission.acquire(MODEL, user)
+            order.append(user)
+
+        tasks = [asyncio.create_task(ask(user)) for user in ("a", "a", "a", "b", "c")]
+        await asyncio.sleep(0)
+        admission.release(MODEL, "holder")
+        for granted in range(1, len(tasks) + 1):
+            while len(order) < granted:
+                await asyncio.sleep(0)
+            admission.release(MODEL, order[-1])
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c", "a", "a"]
+
+    run(main())
+
+
+def test_queue_timeout_is_503_and_frees_the_user():
+    async def main():
+        admission = AdmissionController(max_concurrent=1, queue_timeout=0.01)
+        await admission.acquire(MODEL, "a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire(MODEL, "b")
+        assert rejected.value.status_code == 503
+        assert admission.counters["queue_timeouts"] == 1
+        assert admission.stats()["models"][MODEL]["queued"] == 0
+        assert "b" not in admission._per_user
+
+    run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        admission = AdmissionController(max_concurrent=1)
+        await admission.acquire(MODEL, "a")
+        gone = asyncio.create_task(admission.acquire(MODEL, "b"))
+        stays = asyncio.create_task(admission.acquire(MODEL, "c"))
+        await asyncio.sleep(0)
+        gone.cancel()
+        await asyncio.gather(gone, return_exceptions=True)
+        admission.release(MODEL, "a")
+        await stays
+        assert admission.stats()["models"][MODEL] == {"limit": 1, "active": 1, "queued": 0}
+        assert admission._per_user == {"c": 1}
+
+    run(main())
+
+
+def test_slot_granted_as_the_waiter_gives_up_is_not_lost():
+    async def main():
+        admission = AdmissionController(max_concurrent=1)
+        await admission.acquire(MODEL, "a")
+        first = asyncio.create_task(admission.acquire(MODEL, "b"))
+        second = asyncio.create_task(admission.acquire(MODEL, "c"))
+        await asyncio.sleep(0)
+        admission.release(MODEL, "a")   # grants b's slot ...
+        first.cancel()                  # ... but b gives up before it runs
+        results = await asyncio.gather(first, asyncio.wait_for(asyncio.shield(second), 0.1),
+                                       return_exceptions=True)
+        # Either b kept the slot or it was handed on to c; never both, never neither
+        holders = [user for user, result in zip("bc", results) if result is None]
+        assert len(holders) == 1
+        assert admission.stats()["models"][MODEL]["active"] == 1
+        admission.release(MODEL, holders[0])
+        if not second.done():
+            await second
+            admission.release(MODEL, "c")
+        assert admission.stats()["models"][MODEL] == {"limit": 1, "active": 0, "queued": 0}
+        assert admission._per_user == {}
+
+    run(main())
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from batch import item_index, parse_lines
+
+
+def lines(*items) -> bytes:
+    return "\n".join(item if isinstance(item, str) else json.dumps(item) for item in items).encode("utf-8")
+
+
+def test_index_defaults_to_line_position():
+    parsed = parse_lines(lines({"text": "a"}, "", {"text": "b", "index": 7}))
+    assert [(index, error) for index, _, error in parsed] == [(0, ""), (7, "")]
+
+
+@pytest.mark.parametrize("raw", ['{"text": "a", "index": 1e999}', '{"text": "a", "index": Infinity}',
+                                 '{"text": "a", "index": NaN}', '{"text": "a", "index": true}',
+                                 '{"text": "a", "index": 1.5}', '{"text": "a", "index": null}',
+                                 '{"text": "a", "index": [1]}', '{"text": "a", "index": "x"}'])
+def test_bad_index_rejects_only_that_line(raw):
+    parsed = parse_lines(lines(raw, {"text": "b"}))
+    assert parsed[0][1] is None and parsed[0][2].startswith("Invalid line")
+    assert parsed[1] == (1, {"text": "b"}, "")
+
+
+def test_bad_lines():
+    parsed = parse_lines(lines("not json", [1, 2], {"text": "  "}))
+    assert all(item is None and error for _, item, error in parsed)
+
+
+def test_item_index_accepts_whole_numbers():
+    assert item_index(3) == 3
+    assert item_index(3.0) == 3
+    assert item_index("12") == 12
@@ -0,0 +1,92 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time.monotonic for the breaker: clock.now += seconds moves time on."""
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: Clock.now)
+    return Clock
+
+
+def opened(clock, **kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=30, **kwargs)
+    breaker.record_failure("HTTP 500")
+    breaker.record_failure("HTTP 500")
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_after_failures_in_a_row(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success(0.5)   # resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.counters["opened"] == 1
+
+
+def test_slow_answers_count_as_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, latency_slo=10)
+    breaker.record_success(11)
+    breaker.record_success(12)
+    assert breaker.state == OPEN
+    assert breaker.counters["slow_calls"] == 2
+
+
+def test_open_short_circuits_until_open_seconds(clock):
+    breaker = opened(clock)
+    assert not breaker.allow()
+    assert breaker.retry_after == 30
+    clock.now += 20
+    assert not breaker.allow()
+    assert breaker.retry_after == 10
+    assert breaker.counters["short_circuited"] == 2
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = opened(clock)
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()   # probes=1: the rest wait for the probe
+    breaker.record_success(1.0)
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_opens_again(clock):
+    breaker = opened(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.counters["opened"] == 2
+
+
+def test_lost_probe_frees_its_slot(clock):
+    breaker = opened(clock, probes=2)
+    clock.now += 30
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    clock.now += 30              # neither probe reported back
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+
+def test_disabled_breaker_never_opens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, enabled=False)
+    breaker.record_failure()
+    breaker.record_success(999)
+    assert breaker.state == CLOSED and breaker.allow()
+    assert breaker.stats()["failures_in_a_row"] == 2
@@ -0,0 +1,81 @@
+import random
+import re
+
+from keyword_router import KeywordRouter
+
+
+def regex_topics(topics: dict, text: str) -> list:
+    """The same matching, one regex per keyword: the reference the automaton must agree with."""
+    found = []
+    for name, keywords in topics.items():
+        for keyword in keywords:
+            word = re.escape(keyword.rstrip("*").lower().strip())
+            pattern = rf"(?<!\w){word}" + ("" if keyword.endswith("*") else r"(?!\w)")
+            if word and re.search(pattern, text.lower()):
+                found.append(name)
+                break
+    return found
+
+
+def test_whole_words_only():
+    router = KeywordRouter({"saylani": ("trust", "saylani")})
+    assert router.topics("Saylani Welfare Trust") == ["saylani"]
+    assert router.topics("a trustworthy person") == []
+    assert router.topics("entrust it") == []
+    assert router.topics("trust_fund") == []
+
+
+def test_prefix_keywords():
+    router = KeywordRouter({"career": ("job*",)})
+    assert router.matches("Jobs in Lahore?")
+    assert router.matches("jobless")
+    assert not router.matches("a blowjob")   # the word must start with the keyword
+
+
+def test_phrases_and_case():
+    router = KeywordRouter({"food": ("free food", "dastarkhwan")})
+    assert router.matches("Where is the FREE FOOD?")
+    assert not router.matches("free foods")
+    assert not router.matches("food free")
+
+
+def test_overlapping_keywords_and_topic_order():
+    topics = {"a": ("she",), "b": ("he", "hers"), "c": ("is her",)}
+    router = KeywordRouter(topics)
+    assert router.topics("ushers") == []
+    assert router.topics("this is hers") == ["b"]        # "is her" is not a whole word here
+    assert router.topics("this is her hat, hers") == ["b", "c"]
+    assert router.topics("she said he") == ["a", "b"]
+    assert router.topics("he and she") == ["a", "b"]
+
+
+def test_keyword_inside_a_longer_keyword():
+    # "trust" has to be found through the failure link of "saylani trustee"
+    router = KeywordRouter({"x": ("saylani trustee",), "y": ("trust",)})
+    assert router.topics("saylani trust") == ["y"]
+    assert router.topics("saylani trustee") == ["x"]
+
+
+def test_without_word_boundary():
+    router = KeywordRouter({"x": ("trust",)}, word_boundary=False)
+    assert router.matches("trustworthy")
+
+
+def test_empty_keywords_are_ignored():
+    router = KeywordRouter({"x": ("", "*", "  ")})
+    assert router.topics("anything") == []
+
+
+def test_agrees_with_regex_reference():
+    rng = random.Random(3)
+    words = ["job", "jobs", "saylani", "trust", "he", "she", "hers", "free", "food", "smit", "it", "is"]
+    topics = {
+        "saylani": ("saylani", "trust", "free food"),
+        "career": ("job*", "smit", "it"),
+        "pronoun": ("he", "she*", "hers"),
+    }
+    router = KeywordRouter(topics)
+    for _ in range(500):
+        text = rng.choice((" ", ", ", "")).join(rng.choice(words) for _ in range(rng.randrange(1, 8)))
+        assert router.topics(text) == regex_topics(topics, text), text
+        assert router.matches(text) == bool(regex_topics(topics, text)), text
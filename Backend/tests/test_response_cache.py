@@ -0,0 +1,47 @@
+from response_cache import ResponseCache, normalize_query
+
+
+def cache_with(question: str, reply: str) -> ResponseCache:
+    cache = ResponseCache()
+    cache.put("ahmed", "llama3.2:1b", question, reply)
+    return cache
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = cache_with("What is Saylani?", "A welfare trust.")
+    assert cache.get("ahmed", "llama3.2:1b", "what is saylani") == "A welfare trust."
+    assert normalize_query("  What   is SAYLANI?? ") == "what is saylani"
+
+
+def test_similar_hit_for_reordered_words():
+    cache = cache_with("saylani free food kahan milta hai", "At every dastarkhwan.")
+    assert cache.get("ahmed", "llama3.2:1b", "kahan milta hai saylani free food") == "At every dastarkhwan."
+    assert cache.counters["hits_similar"] == 1
+
+
+def test_different_numbers_are_not_similar():
+    cache = cache_with("what is 1+1", "Two!")
+    assert cache.get("ahmed", "llama3.2:1b", "what is 7+8") is None
+    cache = cache_with("I am 8 years old", "Nice!")
+    assert cache.get("ahmed", "llama3.2:1b", "I am 9 years old") is None
+
+
+def test_negation_is_not_similar():
+    cache = cache_with("should I donate to saylani welfare trust", "Yes!")
+    assert cache.get("ahmed", "llama3.2:1b", "should I not donate to saylani welfare trust") is None
+    assert cache.get("ahmed", "llama3.2:1b", "should I don't donate to saylani welfare trust") is None
+
+
+def test_persona_and_model_are_separate():
+    cache = cache_with("what is saylani", "A welfare trust.")
+    assert cache.get("aasho", "llama3.2:1b", "what is saylani") is None
+    assert cache.get("ahmed", "llama3.2", "what is saylani") is None
+
+
+def test_clear_and_disabled():
+    cache = cache_with("what is saylani", "A welfare trust.")
+    cache.clear()
+    assert cache.get("ahmed", "llama3.2:1b", "what is saylani") is None
+    off = ResponseCache(enabled=False)
+    off.put("ahmed", "llama3.2:1b", "what is saylani", "A welfare trust.")
+    assert off.get("ahmed", "llama3.2:1b", "what is saylani") is None
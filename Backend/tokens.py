@@ -0,0 +1,52 @@
+import functools
+import math
+import os
+import re
+
+# Pre-tokenizer split used by GPT/Llama-3 style BPE tokenizers: contractions, words with
+# their leading space, numbers in groups of up to 3 digits, punctuation runs, whitespace.
+_PIECE_RE = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+|\S", re.IGNORECASE)
+
+
+def _load_tokenizer():
+    """Exact counts with a tokenizer.json (TOKENIZER_PATH) if the tokenizers package is installed."""
+    path = os.getenv("TOKENIZER_PATH")
+    if not path:
+        return None
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        print("⚠️ TOKENIZER_PATH is set but tokenizers is not installed (pip install tokenizers), using the built-in estimate")
+        return None
+    return Tokenizer.from_file(path)
+
+
+_tokenizer = _load_tokenizer()
+
+
+def _piece_tokens(piece: str) -> int:
+    word = piece.strip()
+    if not word:
+        return 1  # run of whitespace / newlines
+    if not word.isascii():
+        return math.ceil(len(word) / 2)  # Urdu/Hindi script and emoji split into small pieces
+    if word[0].isalpha():
+        # Common words are a single token, long/rare words a few
+        return 1 if len(word) <= 7 else math.ceil(len(word) / 4)
+    return math.ceil(len(word) / 2)
+
+
+@functools.lru_cache(maxsize=16384)
+def estimate_tokens(text: str) -> int:
+    """
+    Token count of text: exact with TOKENIZER_PATH, otherwise a local BPE-style estimate
+    (split like the Llama tokenizer, count words/numbers/punctuation pieces).
+    """
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+    return sum(_piece_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+
+def estimate_message_tokens(messages: list) -> int:
+    """Token count of a chat message list, including a few tokens of per-message overhead."""
+    return sum(estimate_tokens(m.get("content", "")) + 4 for m in messages)
@@ -0,0 +1,236 @@
+"""
+Offline text-to-speech for the voice routes. Sentences are synthesized in a small worker
+pool while the reply is still streaming, and short phrases (fallback headers, greetings,
+repeated answers) are kept in an in-memory cache.
+
+Engines (TTS_ENGINE):
+    piper   pip install piper-tts, TTS_VOICE=path/to/voice.onnx (CPU ONNX voice)
+    espeak  espeak-ng on PATH, TTS_VOICE=voice name (default en-us)
+    auto    piper if TTS_VOICE is an .onnx file and piper is installed, else espeak (default)
+    off     no server-side TTS; the frontends use the browser's speechSynthesis
+"""
+import asyncio
+import io
+import os
+import re
+import shutil
+import subprocess
+import time
+import unicodedata
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Markdown markers the model likes to use; spoken they are noise
+_MARKUP_RE = re.compile(r"[*_#`~>|]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def speakable(text: str) -> str:
+    """Text as it should be spoken: no emoji, symbols or markdown."""
+    text = "".join(ch for ch in text if unicodedata.category(ch) not in ("So", "Sk", "Cs", "Co"))
+    return _SPACE_RE.sub(" ", _MARKUP_RE.sub(" ", text)).strip()
+
+
+def wav_duration(data: bytes) -> float:
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.getnframes() / float(wav.getframerate() or 1)
+
+
+class PiperEngine:
+    name = "piper"
+
+    def __init__(self, model_path: str):
+        from piper.voice import PiperVoice
+        self.voice = PiperVoice.load(model_path)
+        # piper-tts 1.3 renamed synthesize(text, wav) to synthesize_wav
+        self._synthesize = getattr(self.voice, "synthesize_wav", None) or self.voice.synthesize
+
+    def synthesize(self, text: str) -> bytes:
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            self._synthesize(text, wav)
+        return buffer.getvalue()
+
+
+class EspeakEngine:
+    name = "espeak"
+
+    def __init__(self, binary: str, voice: str = "en-us", speed: int = 160):
+        self.binary = binary
+        self.voice = voice
+        self.speed = speed
+
+    def synthesize(self, text: str) -> bytes:
+        # Text on stdin, so a sentence starting with "-" is not read as an option
+        result = subprocess.run(
+            [self.binary, "--stdout", "-v", self.voice, "-s", str(self.speed)],
+            input=text.encode("utf-8"), capture_output=True, check=True, timeout=30,
+        )
+        return result.stdout
+
+
+def load_engine(name: str, voice: str = ""):
+    """TTS engine for TTS_ENGINE / TTS_VOICE, or None if none is available."""
+    name = (name or "auto").strip().lower()
+    if name in ("off", "0", "none", ""):
+        return None
+    if name in ("piper", "auto") and voice.endswith(".onnx"):
+        try:
+            return PiperEngine(voice)
+        except ImportError:
+            if name == "piper":
+                print("⚠️ TTS_ENGINE=piper but piper-tts is not installed (pip install piper-tts)")
+                return None
+        except Exception as e:
+            print(f"❌ Could not load Piper voice {voice}: {e}")
+            if name == "piper":
+                return None
+    if name in ("espeak", "auto"):
+        binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if binary:
+            return EspeakEngine(binary, voice=voice if voice and not voice.endswith(".onnx") else "en-us",
+                                speed=_env_int("TTS_SPEED", 160))
+        if name == "espeak":
+            print("⚠️ TTS_ENGINE=espeak but espeak-ng is not installed")
+    elif name != "piper":
+        print(f"⚠️ Unknown TTS_ENGINE: {name}")
+    return None
+
+
+class TTSService:
+    """
+    Async front for a blocking TTS engine: synthesize() runs in a thread pool of
+    `workers`, so several sentences of a reply are synthesized at once without blocking
+    the event loop. WAV results for phrases up to cache_max_chars are cached (LRU,
+    cache_bytes in total); the same phrase requested twice at once is synthesized once.
+    """
+
+    def __init__(self, engine=None, workers: int = 2, cache_bytes: int = 32 * 1024 * 1024,
+                 cache_max_chars: int = 200):
+        self.engine = engine
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self.cache_max_chars = cache_max_chars
+        self._cache = OrderedDict()   # speakable text -> (wav bytes, duration)
+        self._cached_bytes = 0
+        self._pending = {}            # speakable text -> task, while being synthesized
+        self._executor = None
+        self.counters = {
+            "synthesized": 0,
+            "cache_hits": 0,
+            "errors": 0,
+            "synth_ms_total": 0.0,
+            "audio_s_total": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "TTSService":
+        """TTS_ENGINE, TTS_VOICE, TTS_WORKERS, TTS_CACHE_MB, TTS_CACHE_MAX_CHARS."""
+        return cls(
+            engine=load_engine(os.getenv("TTS_ENGINE", "auto"), os.getenv("TTS_VOICE", "")),
+            workers=_env_int("TTS_WORKERS", 2),
+            cache_bytes=_env_int("TTS_CACHE_MB", 32) * 1024 * 1024,
+            cache_max_chars=_env_int("TTS_CACHE_MAX_CHARS", 200),
+        )
+
+    @property
+    def available(self) -> bool:
+        return self.engine is not None
+
+    def start(self):
+        if self.available and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tts")
+            print(f"🔊 Server-side TTS: {self.engine.name}, {self.workers} workers")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def synthesize(self, text: str) -> tuple:
+        """(WAV bytes, duration in seconds) for text; (b"", 0.0) if there is nothing to say."""
+        text = speakable(text)
+        if not text:
+            return b"", 0.0
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self.counters["cache_hits"] += 1
+            return cached
+        task = self._pending.get(text)
+        if task is not None:
+            self.counters["cache_hits"] += 1
+        else:
+            # Its own task, so a caller that is cancelled (barge-in, client gone) does not
+            # take the audio away from the others waiting for the same sentence
+            task = asyncio.ensure_future(self._synthesize(text))
+            self._pending[text] = task
+            task.add_done_callback(lambda done: self._synthesized(text, done))
+        return await asyncio.shield(task)
+
+    async def _synthesize(self, text: str) -> tuple:
+        result = await self._run(text)
+        if len(text) <= self.cache_max_chars:
+            self._store(text, result)
+        return result
+
+    def _synthesized(self, text: str, task: asyncio.Task):
+        del self._pending[text]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller was cancelled meanwhile
+
+    async def warm(self, phrases):
+        """Pre-synthesize phrases that are spoken often (called in the background at startup)."""
+        for phrase in phrases:
+            try:
+                await self.synthesize(phrase)
+            except Exception as e:
+                print(f"❌ TTS warm-up failed for {phrase!r}: {e}")
+                return
+
+    def stats(self) -> dict:
+        synthesized = self.counters["synthesized"]
+        return {
+            "engine": self.engine.name if self.engine else "off",
+            "workers": self.workers,
+            "cached_phrases": len(self._cache),
+            "cache_mb": round(self._cached_bytes / 1024 / 1024, 1),
+            **{k: round(v, 1) if isinstance(v, float) else v for k, v in self.counters.items()},
+            # < 1 means sentences are synthesized faster than they are spoken
+            "real_time_factor": round(self.counters["synth_ms_total"] / 1000 / self.counters["audio_s_total"], 3)
+            if synthesized and self.counters["audio_s_total"] else 0.0,
+        }
+
+    # ---- internals ----
+
+    async def _run(self, text: str) -> tuple:
+        if self._executor is None:
+            raise RuntimeError("TTS is not available")
+        started = time.perf_counter()
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(self._executor, self.engine.synthesize, text)
+            duration = wav_duration(data)
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        self.counters["synthesized"] += 1
+        self.counters["synth_ms_total"] += (time.perf_counter() - started) * 1000
+        self.counters["audio_s_total"] += duration
+        return data, duration
+
+    def _store(self, text: str, result: tuple):
+        size = len(result[0])
+        if size > self.cache_bytes:
+            return
+        self._cache[text] = result
+        self._cached_bytes += size
+        while self._cached_bytes > self.cache_bytes:
+            _, (data, _) = self._cache.popitem(last=False)
+            self._cached_bytes -= len(data)
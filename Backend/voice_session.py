@@ -0,0 +1,201 @@
+"""
+WebSocket voice sessions (<chat_route>_ws): one connection per user for a whole
+conversation instead of a POST per utterance. Replies are streamed back token by token
+and sentence by sentence, and a reply can be cancelled mid-way (barge-in): the upstream
+Ollama stream is closed right away, so the model slot is freed, and the part of the reply
+that was already sent is kept in the conversation history.
+
+Messages are JSON text frames:
+
+    client -> server
+        {"type": "turn", "text": "...", "id": "t1"}   new user turn (id optional); cancels a reply still running
+        {"type": "cancel"}                            stop the current reply
+        {"type": "ping"} / {"type": "pong"}
+
+    server -> client
+        {"type": "ready", "user_id", "heartbeat", "idle_timeout", "voice"}
+        chat stream events ("token", "sentence", "audio", "done", "error", ...) with "turn": id
+        {"type": "cancelled", "turn", "reply"}        reply = the sentences sent before the cancel
+        {"type": "ping"} / {"type": "pong"}
+
+The server pings every `heartbeat` seconds; a connection that sends nothing (not even a
+pong) for two heartbeats is closed. A connection without a turn for `idle_timeout`
+seconds is closed too. A new connection for the same persona + user replaces the old one,
+if the client chose its user_id (a connection without one never replaces another).
+"""
+import asyncio
+import json
+import os
+import time
+
+from starlette.websockets import WebSocketDisconnect
+
+HEARTBEAT_SECONDS = float(os.getenv("VOICE_WS_HEARTBEAT", "20"))
+IDLE_TIMEOUT = float(os.getenv("VOICE_WS_IDLE_TIMEOUT", "300"))
+
+# Close codes (4000-4999 are free for applications)
+CLOSE_IDLE = 4000
+CLOSE_NO_HEARTBEAT = 4001
+CLOSE_REPLACED = 4002
+
+# Open sessions: (persona key, user_id) -> VoiceSession; sessions without a user_id of
+# their own (replace=False) share an id, so they are only counted
+_open = {}
+_unnamed = set()
+counters = {"opened": 0, "turns": 0, "cancelled": 0, "closed_idle": 0, "closed_no_heartbeat": 0, "replaced": 0}
+
+
+def stats() -> dict:
+    return {"open": len(_open) + len(_unnamed), "heartbeat_s": HEARTBEAT_SECONDS, "idle_timeout_s": IDLE_TIMEOUT, **counters}
+
+
+class VoiceSession:
+    """
+    One WebSocket conversation. start_turn(text) returns the turn's chat stream events
+    (an async generator of dicts, as served by the _stream / _voice routes).
+    replace=False: the client did not choose user_id, so an older session with the same
+    id belongs to someone else and is left open.
+    """
+
+    def __init__(self, websocket, persona_key: str, user_id: str, start_turn, voice: bool = False,
+                 heartbeat: float = HEARTBEAT_SECONDS, idle_timeout: float = IDLE_TIMEOUT, replace: bool = True):
+        self.websocket = websocket
+        self.key = (persona_key, user_id)
+        self.user_id = user_id
+        self.start_turn = start_turn
+        self.voice = voice
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.replace = replace
+        self._send_lock = asyncio.Lock()
+        self._turn = None        # task streaming the current reply
+        self._turn_id = None
+        self._said = []          # sentences of the current reply sent so far
+        self._last_seen = self._last_turn = time.monotonic()
+        self._close_code = None
+
+    async def run(self):
+        """Serve the connection until the client leaves or it is closed for idling / no heartbeat."""
+        await self.websocket.accept()
+        previous = None
+        if self.replace:
+            previous = _open.get(self.key)
+            _open[self.key] = self
+        else:
+            _unnamed.add(self)
+        counters["opened"] += 1
+        if previous is not None:
+            counters["replaced"] += 1
+            await previous.close(CLOSE_REPLACED)
+        await self.send({"type": "ready", "user_id": self.user_id, "heartbeat": self.heartbeat,
+                         "idle_timeout": self.idle_timeout, "voice": self.voice})
+        reader = asyncio.create_task(self._read())
+        watchdog = asyncio.create_task(self._watchdog())
+        try:
+            await asyncio.wait([reader, watchdog], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (reader, watchdog):
+                task.cancel()
+            await asyncio.gather(reader, watchdog, return_exceptions=True)
+            await self.cancel_turn(notify=False)
+            if _open.get(self.key) is self:
+                del _open[self.key]
+            _unnamed.discard(self)
+            if self._close_code is not None:
+                try:
+                    await self.websocket.close(self._close_code)
+                except Exception:
+                    pass
+
+    async def send(self, message: dict):
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+
+    async def close(self, code: int):
+        """Close from the server side (also called on the session a new connection replaces)."""
+        self._close_code = code
+        await self.cancel_turn(notify=False)
+        try:
+            await self.websocket.close(code)
+        except Exception:
+            pass
+
+    async def cancel_turn(self, notify: bool = True):
+        """Stop the running reply. Closing its event stream closes the Ollama request."""
+        turn = self._turn
+        if turn is None or turn.done():
+            return
+        turn.cancel()
+        await asyncio.gather(turn, return_exceptions=True)
+        counters["cancelled"] += 1
+        if notify:
+            await self.send({"type": "cancelled", "turn": self._turn_id, "reply": " ".join(self._said)})
+
+    # ---- internals ----
+
+    async def _read(self):
+        while True:
+            try:
+                text = await self.websocket.receive_text()
+            except (WebSocketDisconnect, RuntimeError):
+                return  # client went away (or the socket was closed by close())
+            self._last_seen = time.monotonic()
+            try:
+                message = json.loads(text)
+                kind = message.get("type")
+            except (ValueError, AttributeError):
+                await self.send({"type": "error", "reply": "Messages must be JSON objects with a type"})
+                continue
+            if kind == "turn":
+                await self._new_turn(str(message.get("text", "")), message.get("id"))
+            elif kind == "cancel":
+                await self.cancel_turn()
+            elif kind == "ping":
+                await self.send({"type": "pong"})
+            elif kind != "pong":
+                await self.send({"type": "error", "reply": f"Unknown message type: {kind}"})
+
+    async def _new_turn(self, text: str, turn_id):
+        # Barge-in: the user spoke again, the old reply is not wanted anymore
+        await self.cancel_turn()
+        if not text.strip():
+            await self.send({"type": "error", "turn": turn_id, "reply": "Empty message"})
+            return
+        counters["turns"] += 1
+        self._last_turn = time.monotonic()
+        self._turn_id = turn_id if turn_id is not None else counters["turns"]
+        self._said = []
+        self._turn = asyncio.create_task(self._stream(self._turn_id, text))
+
+    async def _stream(self, turn_id, text: str):
+        events = await self.start_turn(text)
+        try:
+            async for event in events:
+                if event["type"] == "sentence":
+                    self._said.append(event["text"])
+                await self.send({**event, "turn": turn_id})
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # client went away mid-reply; run() cleans up
+        finally:
+            await events.aclose()
+            self._last_turn = time.monotonic()
+
+    async def _watchdog(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            now = time.monotonic()
+            if now - self._last_seen > 2 * self.heartbeat:
+                counters["closed_no_heartbeat"] += 1
+                print(f"💔 Voice session {self.user_id}: no heartbeat for {now - self._last_seen:.0f} s, closing")
+                self._close_code = CLOSE_NO_HEARTBEAT
+                return
+            replying = self._turn is not None and not self._turn.done()
+            if not replying and now - self._last_turn > self.idle_timeout:
+                counters["closed_idle"] += 1
+                print(f"💤 Voice session {self.user_id}: idle for {now - self._last_turn:.0f} s, closing")
+                self._close_code = CLOSE_IDLE
+                return
+            try:
+                await self.send({"type": "ping"})
+            except Exception:
+                return
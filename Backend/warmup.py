@@ -0,0 +1,147 @@
+"""
+Keeps each persona's model loaded in Ollama with its system prompt already prefilled,
+so the first turn of a new session pays neither for loading the model nor for
+processing a system prompt of a few thousand tokens.
+
+- Every request carries keep_alive (OLLAMA_KEEP_ALIVE), so Ollama does not unload the
+  model after its default 5 idle minutes.
+- At startup, after every KB reload and when an Ollama node comes back up, one tiny
+  request per persona and node (the system prompt, 1 output token) loads the model and
+  leaves the system prompt in Ollama's prompt cache. Turns start with the same system
+  message, byte for byte, so Ollama only has to process what comes after it.
+- First turns of new sessions are timed by what Ollama had to do (load + prefill):
+  cold (model was loaded), prefill (model loaded, prompt processed in full) or warm
+  (cached prefix reused).
+"""
+import asyncio
+import os
+import time
+
+from metrics import FIRST_TURN_SECONDS
+from tokens import estimate_message_tokens
+
+# A load_duration above this means Ollama had to load the model for the request
+COLD_LOAD_SECONDS = 0.5
+# Fewer prompt tokens evaluated than this share of the prompt = a cached prefix was reused
+PREFIX_REUSE_RATIO = 0.5
+
+
+def first_turn_start(data: dict, prompt_tokens: int) -> str:
+    """cold / prefill / warm, from Ollama's final response of a first turn."""
+    if data.get("load_duration", 0) / 1e9 >= COLD_LOAD_SECONDS:
+        return "cold"
+    if data.get("prompt_eval_count", prompt_tokens) < prompt_tokens * PREFIX_REUSE_RATIO:
+        return "warm"
+    return "prefill"
+
+
+class PrefixWarmer:
+    """
+    warm(targets) primes every Ollama node that has the model for
+    [(persona key, model, system message, options)].
+    acquire / release wrap each priming request (the admission slots of chat turns).
+    """
+
+    def __init__(self, ollama, keep_alive: str = "30m", enabled: bool = True, acquire=None, release=None):
+        self.ollama = ollama
+        self.keep_alive = keep_alive
+        self.enabled = enabled
+        self._acquire = acquire
+        self._release = release
+        self._task = None
+        self._started = False
+        self._pending = None
+        self._targets = None
+        self.last_warm_ms = {}   # persona key -> latency of its last priming request
+        self.counters = {"warmups": 0, "warmup_errors": 0, "first_turn_cold": 0,
+                         "first_turn_prefill": 0, "first_turn_warm": 0}
+
+    @classmethod
+    def from_env(cls, ollama, acquire=None, release=None) -> "PrefixWarmer":
+        """OLLAMA_KEEP_ALIVE (Ollama duration, -1 = never unload), OLLAMA_WARMUP."""
+        return cls(
+            ollama,
+            keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+            enabled=os.getenv("OLLAMA_WARMUP", "1").strip().lower() not in ("0", "false", "no"),
+            acquire=acquire,
+            release=release,
+        )
+
+    def start(self):
+        """Called once the Ollama client is open; runs a warm-up scheduled before that."""
+        self._started = True
+        if self._pending is not None:
+            self.schedule(self._pending)
+
+    def schedule(self, targets: list):
+        """Prime in the background (replaces a warm-up still running)."""
+        if not self.enabled:
+            return
+        self._targets = targets
+        if not self._started:
+            self._pending = targets
+            return
+        self._pending = None
+        if self._task is not None:
+            self._task.cancel()
+        self._task = asyncio.create_task(self.warm(targets))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def warm(self, targets: list):
+        for key, model, system_message, options in targets:
+            payload = {
+                "model": model,
+                "messages": [system_message],
+                "stream": False,
+                "options": {**options, "num_predict": 1},
+                "keep_alive": self.keep_alive,
+            }
+            # Every node that may serve the persona (conversations are spread over the pool)
+            for node in self.ollama.nodes_for(model):
+                started = time.perf_counter()
+                try:
+                    if self._acquire is not None:
+                        await self._acquire(model, "__warmup__")
+                    try:
+                        response = await self.ollama.chat(payload, node=node)
+                    finally:
+                        if self._release is not None:
+                            self._release(model, "__warmup__")
+                    if response.status_code != 200:
+                        raise RuntimeError(f"Ollama API error: {response.status_code}")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.counters["warmup_errors"] += 1
+                    print(f"❌ Warm-up of {key} ({model}) on {node.url} failed: {e}")
+                    continue
+                elapsed = (time.perf_counter() - started) * 1000
+                self.counters["warmups"] += 1
+                self.last_warm_ms[key] = round(elapsed)
+                tokens = estimate_message_tokens([system_message])
+                print(f"🔥 Warmed {key} ({model}) on {node.url}: ~{tokens} system prompt tokens cached in {elapsed:.0f} ms")
+
+    def rewarm(self):
+        """Prime again with the last targets (e.g. an Ollama node came back up)."""
+        if self._targets:
+            self.schedule(self._targets)
+
+    def record_first_turn(self, persona: str, data: dict, messages: list):
+        """Time Ollama spent before answering the first turn of a session (load + prefill)."""
+        start = first_turn_start(data, estimate_message_tokens(messages))
+        seconds = (data.get("load_duration", 0) + data.get("prompt_eval_duration", 0)) / 1e9
+        FIRST_TURN_SECONDS.observe(seconds, persona=persona, start=start)
+        self.counters[f"first_turn_{start}"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "keep_alive": self.keep_alive,
+            "last_warm_ms": dict(self.last_warm_ms),
+            **self.counters,
+        }